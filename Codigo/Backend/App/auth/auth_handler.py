@@ -3,6 +3,7 @@ from app.auth.password_handler import (
     get_current_user, 
     get_current_admin_user,
     get_current_active_user,
+    require_permissions,
     get_password_hash,
     verify_password,
     decode_token,
@@ -16,6 +17,7 @@ __all__ = [
     'get_current_user', 
     'get_current_admin_user',
     'get_current_active_user',
+    'require_permissions',
     'get_password_hash',
     'verify_password',
     'decode_token',
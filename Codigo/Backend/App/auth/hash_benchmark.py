@@ -0,0 +1,44 @@
+"""
+Mide el costo de hash en el hardware actual para ajustar BCRYPT_ROUNDS y los
+parámetros de argon2id. Uso: python -m app.auth.hash_benchmark
+"""
+import time
+from app.auth.password_handler import build_crypt_context
+
+PASSWORD = "Benchmark123!"
+
+
+def medir(context, repeticiones: int = 3) -> float:
+    """Milisegundos promedio de una verificación"""
+    hashed = context.hash(PASSWORD)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        context.verify(PASSWORD, hashed)
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    print("bcrypt")
+    for rounds in (10, 11, 12, 13):
+        ms = medir(build_crypt_context(scheme="bcrypt", bcrypt_rounds=rounds))
+        print(f"  rounds={rounds:<2}  {ms:8.1f} ms")
+
+    print("argon2id")
+    for memory_cost in (19456, 65536, 131072):
+        for time_cost in (2, 3, 4):
+            try:
+                context = build_crypt_context(
+                    scheme="argon2",
+                    argon2_time_cost=time_cost,
+                    argon2_memory_cost=memory_cost,
+                    argon2_parallelism=2,
+                )
+                ms = medir(context)
+            except Exception as e:
+                print(f"  no disponible: {e}")
+                return
+            print(f"  memory={memory_cost // 1024:>3} MiB  time={time_cost}  {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
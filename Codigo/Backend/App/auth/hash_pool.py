@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from fastapi import HTTPException, status
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HashWorkerPool:
+    """
+    Pool acotado de hilos para bcrypt. El hash tarda cientos de milisegundos
+    de CPU (bcrypt libera el GIL), así que se saca del event loop y, si la
+    cola ya está llena, se rechaza de inmediato en lugar de acumular espera.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hash")
+        # Se activa cada vez que termina una tarea (para run(..., wait=True))
+        self._slot_freed = asyncio.Event()
+
+        # Métricas
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., Any], *args, wait: bool = False) -> Any:
+        """
+        Ejecutar func(*args) en el pool o responder 503 si está saturado. Con
+        wait=True se espera a que se libere un lugar en la cola.
+        """
+        while wait and self.pending >= self.max_pending:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Pool de hash saturado ({self.pending} pendientes), solicitud rechazada")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado, intenta de nuevo en unos segundos",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._slot_freed.set()
+
+    def metrics(self) -> Dict[str, int]:
+        """Profundidad de cola y contadores del pool"""
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "queued": max(self.pending - self.max_workers, 0),
+            "max_pending": self.max_pending,
+            "max_pending_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+hash_pool = HashWorkerPool(
+    max_workers=settings.HASH_POOL_WORKERS,
+    max_pending=settings.HASH_POOL_MAX_PENDING,
+)
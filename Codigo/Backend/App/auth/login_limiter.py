@@ -0,0 +1,134 @@
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+import redis.asyncio as aioredis
+from fastapi import HTTPException, status
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryWindowStore:
+    """
+    Ventanas deslizantes en memoria: clave -> (ventana, marcas de tiempo de los
+    intentos). Cada clave guarda su propia ventana para que la limpieza no
+    descarte historiales de cuenta (15 min) con la ventana de IP (1 min).
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._hits: Dict[str, Tuple[int, Deque[float]]] = {}
+
+    async def count(self, key: str, window: int) -> Tuple[int, float]:
+        """Intentos dentro de la ventana y marca del más antiguo"""
+        entry = self._hits.get(key)
+        if not entry:
+            return 0, 0.0
+        hits = entry[1]
+        limit = time.time() - window
+        while hits and hits[0] <= limit:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return 0, 0.0
+        return len(hits), hits[0]
+
+    async def add(self, key: str, window: int):
+        entry = self._hits.get(key)
+        if entry is None or entry[0] != window:
+            entry = self._hits[key] = (window, entry[1] if entry else deque())
+        entry[1].append(time.time())
+        if len(self._hits) > self.MAX_KEYS:
+            self._sweep()
+
+    async def reset(self, key: str):
+        self._hits.pop(key, None)
+
+    def _sweep(self):
+        """Descartar claves sin intentos dentro de su propia ventana para acotar la memoria"""
+        now = time.time()
+        for key in [k for k, (window, hits) in self._hits.items() if not hits or hits[-1] <= now - window]:
+            del self._hits[key]
+
+
+class RedisWindowStore:
+    """Ventanas deslizantes compartidas entre workers con conjuntos ordenados de Redis"""
+
+    def __init__(self, redis_url: str):
+        self.client = aioredis.from_url(redis_url)
+
+    async def count(self, key: str, window: int) -> Tuple[int, float]:
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, "-inf", now - window)
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        _, total, oldest = await pipe.execute()
+        return total, (oldest[0][1] if oldest else 0.0)
+
+    async def add(self, key: str, window: int):
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {uuid.uuid4().hex: now})
+        pipe.expire(key, window)
+        await pipe.execute()
+
+    async def reset(self, key: str):
+        await self.client.delete(key)
+
+
+class LoginLimiter:
+    """
+    Limitador de intentos de login por IP (todos los intentos) y por cuenta
+    (solo fallidos). Se consulta antes de tocar la base de datos o bcrypt.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.store = RedisWindowStore(redis_url) if redis_url else MemoryWindowStore()
+
+    async def check(self, client_ip: Optional[str], correo: str):
+        """Lanza 429 si la IP o la cuenta superaron su límite"""
+        checks = [(f"login:account:{correo.lower()}", settings.LOGIN_ACCOUNT_LIMIT, settings.LOGIN_ACCOUNT_WINDOW)]
+        if client_ip:
+            checks.insert(0, (f"login:ip:{client_ip}", settings.LOGIN_IP_LIMIT, settings.LOGIN_IP_WINDOW))
+
+        for key, limit, window in checks:
+            try:
+                total, oldest = await self.store.count(key, window)
+            except Exception as e:
+                logger.error(f"Error consultando limitador de login: {e}")
+                continue
+
+            if total >= limit:
+                retry_after = max(1, int(oldest + window - time.time()) + 1)
+                logger.warning(f"Login bloqueado temporalmente ({key})")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Demasiados intentos de inicio de sesión, intenta más tarde",
+                    headers={"Retry-After": str(retry_after)},
+                )
+
+    async def register_attempt(self, client_ip: Optional[str]):
+        if client_ip:
+            await self._add(f"login:ip:{client_ip}", settings.LOGIN_IP_WINDOW)
+
+    async def register_failure(self, correo: str):
+        await self._add(f"login:account:{correo.lower()}", settings.LOGIN_ACCOUNT_WINDOW)
+
+    async def register_success(self, correo: str):
+        try:
+            await self.store.reset(f"login:account:{correo.lower()}")
+        except Exception as e:
+            logger.error(f"Error reiniciando limitador de login: {e}")
+
+    async def _add(self, key: str, window: int):
+        try:
+            await self.store.add(key, window)
+        except Exception as e:
+            logger.error(f"Error registrando intento de login: {e}")
+
+
+login_limiter = LoginLimiter(redis_url=settings.REDIS_URL or None)
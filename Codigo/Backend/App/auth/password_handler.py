@@ -1,5 +1,9 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Union
+import hashlib
+import time
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import re
@@ -7,12 +11,46 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
 from fastapi import Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
-from app.database import get_db
+from app.database import get_async_db
+from app.auth.hash_pool import hash_pool
+from app.auth.principal_cache import principal_cache, UserSnapshot
+from app.auth.revocation import revocation_list
+
+def build_crypt_context(
+    scheme: str = settings.PASSWORD_SCHEME,
+    bcrypt_rounds: int = settings.BCRYPT_ROUNDS,
+    argon2_time_cost: int = settings.ARGON2_TIME_COST,
+    argon2_memory_cost: int = settings.ARGON2_MEMORY_COST,
+    argon2_parallelism: int = settings.ARGON2_PARALLELISM,
+) -> CryptContext:
+    """
+    Construye el contexto de cifrado. El esquema configurado cifra los hashes
+    nuevos; bcrypt se mantiene para verificar los existentes. Con deprecated="auto"
+    y los mínimos de costo, needs_update marca los hashes que hay que migrar.
+    """
+    options = {
+        "bcrypt__rounds": bcrypt_rounds,
+        "bcrypt__min_rounds": bcrypt_rounds,
+    }
+    schemes = ["bcrypt"]
+    if scheme == "argon2":
+        schemes.insert(0, "argon2")
+        options.update({
+            "argon2__type": "ID",
+            "argon2__time_cost": argon2_time_cost,
+            "argon2__memory_cost": argon2_memory_cost,
+            "argon2__parallelism": argon2_parallelism,
+        })
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
 
 # Configurar contexto de cifrado para contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = build_crypt_context()
+# Hash de referencia para dummy_verify (se genera en el primer uso)
+_dummy_hash: Optional[str] = None
 
 # Configurar OAuth2 para extraer token del header Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -23,6 +61,9 @@ class AuthHandler:
         self.secret_key = settings.SECRET_KEY
         self.algorithm = settings.ALGORITHM
         self.access_token_expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        # Tokens ya verificados: sha256(token) -> payload, en orden LRU
+        self._verified_tokens: "OrderedDict[bytes, dict]" = OrderedDict()
+        self._verified_tokens_max = settings.TOKEN_CACHE_SIZE
 
     def create_access_token(
         self, data: dict, expires_delta: Optional[timedelta] = None
@@ -45,16 +86,47 @@ class AuthHandler:
         """
         Decodifica y valida un token JWT. 
         Si no es válido, lanza HTTPException 401.
+        Los tokens ya verificados se sirven desde caché mientras no venza su exp.
         """
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
-        except JWTError:
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self._verified_tokens.get(digest)
+        if payload is not None:
+            exp = payload.get("exp")
+            if exp is not None and exp <= time.time():
+                del self._verified_tokens[digest]
+                payload = None
+            else:
+                self._verified_tokens.move_to_end(digest)
+        
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            except JWTError:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token inválido o expirado",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            
+            self._verified_tokens[digest] = payload
+            if len(self._verified_tokens) > self._verified_tokens_max:
+                self._verified_tokens.popitem(last=False)
+        
+        # La revocación se verifica siempre, también para tokens en caché
+        if revocation_list.is_revoked(payload.get("jti")):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido o expirado",
+                detail="Token revocado",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        return dict(payload)
+    
+    async def revoke_token(self, token: str):
+        """Revoca un token válido hasta su expiración (logout)"""
+        payload = self.verify_token(token)
+        jti = payload.get("jti")
+        if jti:
+            await revocation_list.revoke(jti, payload.get("exp") or time.time())
 
     def get_user_id_from_token(self, token: str) -> int:
         """
@@ -84,15 +156,17 @@ class AuthHandler:
         payload = self.verify_token(token)
         return payload.get("role")
 
-    def create_user_token(self, user_id: int, user_email: str, user_role: str) -> str:
+    def create_user_token(self, user_id: int, user_email: str, user_role: str, permisos: int = 0) -> str:
         """
-        Genera un token JWT para un usuario con id, email y rol.
+        Genera un token JWT para un usuario con id, email, rol y bits de permisos.
         """
         token_data = {
             "sub": str(user_id),
             "email": user_email,
             "role": user_role,
+            "perms": permisos,
             "iat": datetime.now(timezone.utc),
+            "jti": uuid.uuid4().hex,
         }
         return self.create_access_token(token_data)
 
@@ -108,6 +182,36 @@ class PasswordHandler:
         """Verifica una contraseña contra su hash"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    @staticmethod
+    def needs_update(hashed_password: str) -> bool:
+        """Indica si el hash usa un esquema o costo distinto al configurado"""
+        return pwd_context.needs_update(hashed_password)
+    
+    @staticmethod
+    async def hash_password_async(password: str, wait: bool = False) -> str:
+        """
+        Cifra una contraseña en el pool de hash, sin bloquear el event loop.
+        Con wait=True (procesos en lote) espera un hueco si el pool está lleno.
+        """
+        return await hash_pool.run(pwd_context.hash, password, wait=wait)
+    
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """Verifica una contraseña en el pool de hash, sin bloquear el event loop"""
+        return await hash_pool.run(pwd_context.verify, plain_password, hashed_password)
+    
+    @staticmethod
+    async def dummy_verify(plain_password: str) -> bool:
+        """
+        Verificación de costo equivalente para correos inexistentes, de modo que
+        el tiempo de respuesta no revele si la cuenta existe
+        """
+        global _dummy_hash
+        if _dummy_hash is None:
+            _dummy_hash = await hash_pool.run(pwd_context.hash, uuid.uuid4().hex)
+        await hash_pool.run(pwd_context.verify, plain_password, _dummy_hash)
+        return False
+    
     @staticmethod
     def validate_password_strength(password: str) -> tuple[bool, str]:
         """Valida la fortaleza de una contraseña. Retorna (es_valida, mensaje)"""
@@ -137,10 +241,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """
     Obtiene el usuario actual a partir del token JWT.
     Lanza 401 si el token es inválido o usuario no existe.
+    Retorna una copia inmutable (UserSnapshot) cacheada por (usuario, iat).
     """
     from app.models.user import User  # Import aquí para evitar imports circulares
     
@@ -150,17 +255,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+        payload = auth_handler.verify_token(token)
+        user_id = int(payload.get("sub"))
+    except (HTTPException, TypeError, ValueError):
         raise credentials_exception
     
-    user = db.query(User).filter(User.usuario_id == user_id).first()
+    iat = payload.get("iat")
+    cached = principal_cache.get(user_id, iat)
+    if cached is not None:
+        return cached
+    
+    user = await db.scalar(select(User).filter(User.usuario_id == user_id))
     if user is None:
         raise credentials_exception
-    return user
+    
+    snapshot = UserSnapshot.from_model(user)
+    principal_cache.put(user_id, iat, snapshot)
+    return snapshot
 
 
 async def get_current_admin_user(current_user = Depends(get_current_user)):
@@ -177,6 +288,26 @@ async def get_current_admin_user(current_user = Depends(get_current_user)):
     return current_user
 
 
+def require_permissions(*permisos: int):
+    """
+    Dependencia que exige todos los permisos indicados. Es una prueba de bits
+    contra la tabla compilada del rol, sin consultas adicionales.
+    """
+    requeridos = 0
+    for permiso in permisos:
+        requeridos |= permiso
+
+    async def checker(current_user = Depends(get_current_user)):
+        if not current_user.has_permission(requeridos):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permisos para esta operación"
+            )
+        return current_user
+
+    return checker
+
+
 async def get_current_active_user(current_user = Depends(get_current_user)):
     """
     Obtiene el usuario actual y verifica que esté activo.
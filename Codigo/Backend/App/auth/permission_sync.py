@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Optional, Set
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Canal por el que un worker avisa que cambió algún rol
+ROLES_CHANNEL = "auth:roles:changed"
+
+
+class PermissionSync:
+    """
+    Mantiene permission_registry al día en todos los workers. El worker que
+    modifica un rol recarga su tabla y publica un aviso en el broker pub/sub
+    del chat (Redis o InMemoryBroker); los demás la recargan al recibirlo.
+    Una recarga periódica cubre los avisos perdidos y el caso sin broker.
+    """
+
+    def __init__(self, reload_interval: float):
+        self.reload_interval = reload_interval
+        self.instance_id = uuid.uuid4().hex
+        self._loader: Optional[Callable[[], Awaitable[None]]] = None
+        self._broker = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, loader: Callable[[], Awaitable[None]], broker=None):
+        """loader recarga la tabla desde la base de datos; broker es opcional"""
+        self._loader = loader
+        self._broker = broker
+        self._tasks.add(asyncio.create_task(self._reload_loop()))
+        if broker is not None:
+            self._tasks.add(asyncio.create_task(self._listen()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    async def notify_changed(self):
+        """Avisar a los demás workers que deben recargar los permisos"""
+        if self._broker is None:
+            return
+        try:
+            await self._broker.publish(ROLES_CHANNEL, self.instance_id)
+        except Exception as e:
+            logger.error(f"Error publicando cambio de roles: {e}")
+
+    async def reload(self):
+        if self._loader is None:
+            return
+        try:
+            await self._loader()
+        except Exception as e:
+            logger.error(f"Error recargando permisos: {e}")
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    async def _listen(self):
+        while True:
+            pubsub = self._broker.pubsub()
+            try:
+                await pubsub.psubscribe(ROLES_CHANNEL)
+                async for raw in pubsub.listen():
+                    if raw.get("type") not in ("message", "pmessage"):
+                        continue
+                    origin = raw.get("data")
+                    if isinstance(origin, bytes):
+                        origin = origin.decode()
+                    # Quien publicó ya recargó su tabla
+                    if origin != self.instance_id:
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error escuchando cambios de roles: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+
+permission_sync = PermissionSync(reload_interval=settings.PERMISSIONS_RELOAD_SECONDS)
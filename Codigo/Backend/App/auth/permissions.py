@@ -0,0 +1,87 @@
+import logging
+import unicodedata
+from enum import IntFlag
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Permiso(IntFlag):
+    """Permisos del sistema; cada rol se compila a un entero con estos bits"""
+    USUARIOS_GESTIONAR = 1 << 0
+    ROLES_GESTIONAR = 1 << 1
+    VEHICULOS_VER_TODOS = 1 << 2
+    VEHICULOS_VER_INACTIVOS = 1 << 3
+    VEHICULOS_ASIGNAR = 1 << 4
+    VEHICULOS_EDITAR_TODOS = 1 << 5
+    VEHICULOS_CAMBIAR_ESTADO = 1 << 6
+    VEHICULOS_ELIMINAR = 1 << 7
+    PROCESOS_ATENDER = 1 << 8
+
+
+TODOS_LOS_PERMISOS = 0
+for _permiso in Permiso:
+    TODOS_LOS_PERMISOS |= _permiso
+
+# Matriz rol -> permisos, por nombre normalizado (minúsculas y sin tildes)
+PERMISOS_EMPLEADO = (
+    Permiso.VEHICULOS_VER_TODOS
+    | Permiso.VEHICULOS_EDITAR_TODOS
+    | Permiso.VEHICULOS_CAMBIAR_ESTADO
+    | Permiso.PROCESOS_ATENDER
+)
+MATRIZ_PERMISOS: Dict[str, int] = {
+    "admin": TODOS_LOS_PERMISOS,
+    "administrador": TODOS_LOS_PERMISOS,
+    "empleado": PERMISOS_EMPLEADO,
+    "mecanico": PERMISOS_EMPLEADO,
+    "tecnico": PERMISOS_EMPLEADO,
+    "cliente": 0,
+}
+
+
+def normalizar_rol(nombre: str) -> str:
+    """'ADMINISTRADOR', 'Administrador' y 'administrador' son el mismo rol"""
+    sin_tildes = unicodedata.normalize("NFKD", nombre.strip().lower())
+    return "".join(c for c in sin_tildes if not unicodedata.combining(c))
+
+
+def compilar_permisos(nombre: Optional[str]) -> int:
+    if not nombre:
+        return 0
+    return MATRIZ_PERMISOS.get(normalizar_rol(nombre), 0)
+
+
+class PermissionRegistry:
+    """
+    Tabla en memoria rol_id -> bits de permisos, cargada desde la tabla roles
+    al iniciar y recargada cuando un rol cambia. Autorizar es una prueba de
+    bits sin consultas.
+    """
+
+    def __init__(self):
+        self._por_rol: Dict[int, int] = {}
+
+    def load(self, roles: Iterable):
+        self._por_rol = {
+            role.id: compilar_permisos(role.nombre) if role.activo else 0
+            for role in roles
+        }
+        logger.info(f"Permisos compilados para {len(self._por_rol)} roles")
+
+    def permisos_de(self, rol_id: Optional[int], nombre: Optional[str] = None) -> int:
+        """Bits del rol; si aún no está en la tabla se compila por nombre"""
+        bits = self._por_rol.get(rol_id)
+        if bits is None:
+            bits = compilar_permisos(nombre)
+        return bits
+
+    def tiene(self, rol_id: Optional[int], permiso: int, nombre: Optional[str] = None) -> bool:
+        return self.permisos_de(rol_id, nombre) & permiso == permiso
+
+    def roles_con(self, permiso: int) -> List[int]:
+        """IDs de los roles que tienen el permiso (para filtrar usuarios por rol_id)"""
+        return [rol_id for rol_id, bits in self._por_rol.items() if bits & permiso == permiso]
+
+
+permission_registry = PermissionRegistry()
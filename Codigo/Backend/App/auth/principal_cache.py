@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+from app.config import settings
+from app.models.user import EstadoUsuario
+from app.auth.permissions import permission_registry
+
+
+@dataclass(frozen=True)
+class RoleSnapshot:
+    """Copia inmutable del rol del usuario autenticado"""
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    activo: bool = True
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "nombre": self.nombre,
+            "descripcion": self.descripcion,
+            "activo": self.activo
+        }
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Copia inmutable del usuario autenticado con su rol. Expone los mismos
+    atributos y verificaciones (is_admin, is_active) que usan rutas y controladores.
+    """
+    usuario_id: int
+    nombre_completo: str
+    telefono: Optional[str]
+    correo: str
+    tipo_identificacion: str
+    numero_identificacion: str
+    estado: Any
+    rol_id: int
+    foto_perfil: Optional[str]
+    fecha_registro: Optional[datetime]
+    role: Optional[RoleSnapshot]
+
+    @classmethod
+    def from_model(cls, user) -> "UserSnapshot":
+        role = None
+        if user.role:
+            role = RoleSnapshot(
+                id=user.role.id,
+                nombre=user.role.nombre,
+                descripcion=user.role.descripcion,
+                activo=user.role.activo
+            )
+        return cls(
+            usuario_id=user.usuario_id,
+            nombre_completo=user.nombre_completo,
+            telefono=user.telefono,
+            correo=user.correo,
+            tipo_identificacion=user.tipo_identificacion,
+            numero_identificacion=user.numero_identificacion,
+            estado=user.estado,
+            rol_id=user.rol_id,
+            foto_perfil=user.foto_perfil,
+            fecha_registro=user.fecha_registro,
+            role=role
+        )
+
+    def is_admin(self) -> bool:
+        return (
+            (self.role is not None and self.role.nombre.lower() in ["admin", "administrador"]) or
+            (self.rol_id in [1, 4])
+        )
+
+    def is_active(self) -> bool:
+        return self.estado == EstadoUsuario.ACTIVO
+
+    @property
+    def permisos(self) -> int:
+        return permission_registry.permisos_de(self.rol_id, self.role.nombre if self.role else None)
+
+    def has_permission(self, permiso: int) -> bool:
+        return self.permisos & permiso == permiso
+
+
+class PrincipalCache:
+    """
+    Caché TTL + LRU de usuarios autenticados, con clave (user_id, iat del token).
+    Es local a cada proceso: la invalidación explícita cubre el worker que hizo
+    el cambio y el TTL acota la desactualización en los demás.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[int, Any], Tuple[float, UserSnapshot]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[Tuple[int, Any]]] = {}
+
+    def get(self, user_id: int, iat: Any) -> Optional[UserSnapshot]:
+        key = (user_id, iat)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return snapshot
+
+    def put(self, user_id: int, iat: Any, snapshot: UserSnapshot):
+        key = (user_id, iat)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+
+        # Expulsar los menos usados recientemente
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def invalidate_user(self, user_id: int):
+        """Descartar todas las entradas de un usuario (cualquier token)"""
+        for key in self._keys_by_user.pop(user_id, set()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def _remove(self, key: Tuple[int, Any]):
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL
+)
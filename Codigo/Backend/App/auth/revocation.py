@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+import redis.asyncio as aioredis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Conjunto ordenado jti -> exp con los tokens revocados (cuando hay Redis)
+REVOKED_KEY = "auth:revoked_tokens"
+
+
+class TokenRevocationList:
+    """
+    Lista de tokens revocados por jti. Cada proceso mantiene el conjunto local
+    jti -> exp, así la verificación es una búsqueda en un dict y nunca sale a
+    red. Se reconstruye periódicamente desde Redis para incorporar
+    revocaciones de otros workers y olvidar las ya vencidas.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis_url = redis_url
+        self.async_redis_client = aioredis.from_url(redis_url) if redis_url else None
+
+        # Revocaciones vigentes conocidas por este proceso (jti -> exp)
+        self._local: Dict[str, float] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """
+        Verificar un jti contra el conjunto local. Sin E/S: se llama desde
+        verify_token en el event loop. Una revocación hecha en otro worker se
+        ve a más tardar tras REVOCATION_REFRESH_SECONDS.
+        """
+        if not jti:
+            return False
+
+        exp = self._local.get(jti)
+        return exp is not None and exp > time.time()
+
+    async def revoke(self, jti: str, exp: float):
+        """Revocar un token hasta su expiración"""
+        self._local[jti] = exp
+
+        if self.async_redis_client:
+            try:
+                await self.async_redis_client.zadd(REVOKED_KEY, {jti: exp})
+            except Exception as e:
+                logger.error(f"Error registrando revocación en Redis: {e}")
+
+    async def start(self):
+        """Cargar el conjunto inicial e iniciar su reconstrucción periódica"""
+        await self.refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+        if self.async_redis_client:
+            await self.async_redis_client.close()
+
+    async def refresh(self):
+        """Reconstruir el conjunto local con las revocaciones vigentes"""
+        now = time.time()
+        vigentes: Dict[str, float] = {}
+
+        if self.async_redis_client:
+            try:
+                await self.async_redis_client.zremrangebyscore(REVOKED_KEY, "-inf", now)
+                remotos = await self.async_redis_client.zrangebyscore(REVOKED_KEY, now, "+inf", withscores=True)
+                for jti, exp in remotos:
+                    vigentes[jti.decode() if isinstance(jti, bytes) else jti] = exp
+            except Exception as e:
+                logger.error(f"Error cargando revocaciones desde Redis: {e}")
+                return
+
+        # Sin await desde aquí: incluye lo revocado localmente mientras se leía Redis
+        vigentes.update({jti: exp for jti, exp in self._local.items() if exp > now})
+        self._local = vigentes
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(settings.REVOCATION_REFRESH_SECONDS)
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refrescando revocaciones: {e}")
+
+
+revocation_list = TokenRevocationList(redis_url=settings.REDIS_URL or None)
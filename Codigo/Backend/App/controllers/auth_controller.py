@@ -1,32 +1,63 @@
-from sqlalchemy.orm import Session
+import asyncio
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.models.user import User
+from app.models.refresh_token import RefreshToken
 from app.models.role import Role
 from app.schemas.auth import LoginRequest, RegisterRequest, TokenResponse
 from app.auth.password_handler import auth_handler, password_handler
+from app.auth.login_limiter import login_limiter
+from app.auth.permissions import permission_registry
 from app.config import settings
+from app.database import AsyncSessionLocal
+from typing import Optional, Set
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Referencias a las tareas de rehash en curso (evita que el GC las cancele)
+_rehash_tasks: Set[asyncio.Task] = set()
+
 class AuthController:
     
     @staticmethod
-    def authenticate_user(db: Session, login_data: LoginRequest) -> User:
+    async def authenticate_user(db: AsyncSession, login_data: LoginRequest, client_ip: Optional[str] = None) -> User:
         try:
-            user = db.query(User).filter(User.correo == login_data.correo).first()
+            # Límite por IP y por cuenta antes de cualquier consulta o bcrypt
+            await login_limiter.check(client_ip, login_data.correo)
+            await login_limiter.register_attempt(client_ip)
+
+            user = await db.scalar(select(User).filter(User.correo == login_data.correo))
             if not user:
                 logger.warning(f"Email no encontrado: {login_data.correo}")
+                await password_handler.dummy_verify(login_data.password)
+                await login_limiter.register_failure(login_data.correo)
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
 
-            if not password_handler.verify_password(login_data.password, user.password_hash):
+            if not await password_handler.verify_password_async(login_data.password, user.password_hash):
                 logger.warning(f"Contraseña incorrecta para: {login_data.correo}")
+                await login_limiter.register_failure(login_data.correo)
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Credenciales inválidas")
 
+            await login_limiter.register_success(login_data.correo)
+
             if not user.is_active():
                 logger.warning(f"Usuario inactivo: {login_data.correo}")
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuario inactivo")
 
+            # Migrar el hash al esquema/costo actual sin retrasar la respuesta
+            if password_handler.needs_update(user.password_hash):
+                task = asyncio.create_task(
+                    AuthController._rehash_password(user.usuario_id, user.password_hash, login_data.password)
+                )
+                _rehash_tasks.add(task)
+                task.add_done_callback(_rehash_tasks.discard)
+
             logger.info(f"Login exitoso: {user.correo}")
             return user
 
@@ -37,32 +68,109 @@ class AuthController:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
 
     @staticmethod
-    def login_user(db: Session, login_data: LoginRequest) -> TokenResponse:
-        user = AuthController.authenticate_user(db, login_data)
-        return AuthController.create_user_token(user)
+    async def _rehash_password(usuario_id: int, old_hash: str, password: str):
+        """Guardar un hash nuevo si la contraseña no cambió entretanto"""
+        try:
+            new_hash = await password_handler.hash_password_async(password)
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(User)
+                    .where(User.usuario_id == usuario_id, User.password_hash == old_hash)
+                    .values(password_hash=new_hash)
+                )
+                await db.commit()
+            logger.info(f"Hash de contraseña actualizado para usuario {usuario_id}")
+        except Exception as e:
+            logger.warning(f"No se pudo actualizar el hash del usuario {usuario_id}: {e}")
 
     @staticmethod
-    def register_user(db: Session, register_data: RegisterRequest) -> User:
+    async def login_user(db: AsyncSession, login_data: LoginRequest, client_ip: Optional[str] = None) -> TokenResponse:
+        user = await AuthController.authenticate_user(db, login_data, client_ip)
+        refresh_token = await AuthController._issue_refresh_token(db, user.usuario_id)
+        return AuthController.create_user_token(user, refresh_token)
+
+    @staticmethod
+    def _hash_refresh_token(refresh_token: str) -> str:
+        # El token es aleatorio de 256 bits: basta SHA-256, no hace falta bcrypt
+        return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+    @staticmethod
+    async def _issue_refresh_token(db: AsyncSession, usuario_id: int, familia: Optional[str] = None) -> str:
+        """Emitir un token de renovación nuevo (familia nueva en el login)"""
+        refresh_token = secrets.token_urlsafe(32)
+        db.add(RefreshToken(
+            usuario_id=usuario_id,
+            token_hash=AuthController._hash_refresh_token(refresh_token),
+            familia=familia or uuid.uuid4().hex,
+            expira_en=datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        ))
+        await db.commit()
+        return refresh_token
+
+    @staticmethod
+    async def _revoke_family(db: AsyncSession, familia: str):
+        await db.execute(update(RefreshToken).where(RefreshToken.familia == familia).values(revocado=True))
+        await db.commit()
+
+    @staticmethod
+    async def refresh_session(db: AsyncSession, refresh_token: str) -> TokenResponse:
+        """
+        Rotar el token de renovación y emitir un access token nuevo. Cuesta una
+        búsqueda por hash; si el token ya se había usado se revoca toda la familia.
+        """
+        invalid = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de renovación inválido o expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        now = datetime.utcnow()
+        stored = await db.scalar(select(RefreshToken).filter(
+            RefreshToken.token_hash == AuthController._hash_refresh_token(refresh_token)
+        ))
+        if not stored or stored.expira_en <= now:
+            raise invalid
+
+        # Marcar como usado de forma atómica: entre renovaciones concurrentes solo una gana
+        result = await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == stored.id, RefreshToken.usado_en.is_(None), RefreshToken.revocado.is_(False))
+            .values(usado_en=now)
+        )
+        if result.rowcount == 0:
+            logger.warning(f"Reutilización de token de renovación (usuario {stored.usuario_id}), familia revocada")
+            await AuthController._revoke_family(db, stored.familia)
+            raise invalid
+
+        user = await db.scalar(select(User).filter(User.usuario_id == stored.usuario_id))
+        if not user or not user.is_active():
+            await AuthController._revoke_family(db, stored.familia)
+            raise invalid
+
+        new_refresh_token = await AuthController._issue_refresh_token(db, user.usuario_id, stored.familia)
+        return AuthController.create_user_token(user, new_refresh_token)
+
+    @staticmethod
+    async def register_user(db: AsyncSession, register_data: RegisterRequest) -> User:
         try:
             is_valid, message = password_handler.validate_password_strength(register_data.password)
             if not is_valid:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
 
-            if db.query(User).filter(User.correo == register_data.correo).first():
+            if await db.scalar(select(User).filter(User.correo == register_data.correo)):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El email ya está registrado")
 
-            if db.query(User).filter(
+            if await db.scalar(select(User).filter(
                 User.numero_identificacion == register_data.numero_identificacion,
                 User.tipo_identificacion == register_data.tipo_identificacion
-            ).first():
+            )):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Identificación ya registrada")
 
-            default_role = db.query(Role).filter(Role.nombre == "cliente").first()
+            default_role = await db.scalar(select(Role).filter(Role.nombre == "cliente"))
             if not default_role:
                 logger.error("Rol 'cliente' no encontrado")
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error de configuración")
 
-            hashed_password = password_handler.hash_password(register_data.password)
+            hashed_password = await password_handler.hash_password_async(register_data.password)
 
             new_user = User(
                 nombre_completo=register_data.nombre_completo,
@@ -75,8 +183,8 @@ class AuthController:
             )
 
             db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
+            await db.commit()
+            await db.refresh(new_user)
 
             logger.info(f"Usuario registrado: {new_user.correo}")
             return new_user
@@ -84,19 +192,20 @@ class AuthController:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error registrando usuario: {e}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
 
     @staticmethod
-    def create_user_token(user: User) -> TokenResponse:
+    def create_user_token(user: User, refresh_token: Optional[str] = None) -> TokenResponse:
         try:
             role_name = user.role.nombre if user.role else "sin_rol"
 
             token = auth_handler.create_user_token(
                 user_id=user.usuario_id,
                 user_email=user.correo,
-                user_role=role_name
+                user_role=role_name,
+                permisos=permission_registry.permisos_de(user.rol_id, role_name)
             )
 
             user_info = {
@@ -111,7 +220,8 @@ class AuthController:
                 access_token=token,
                 token_type="bearer",
                 expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-                user_info=user_info
+                user_info=user_info,
+                refresh_token=refresh_token
             )
 
         except Exception as e:
@@ -119,10 +229,22 @@ class AuthController:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error generando token")
 
     @staticmethod
-    def get_current_user_from_token(db: Session, token: str) -> User:
+    async def logout_user(token: str, db: Optional[AsyncSession] = None, refresh_token: Optional[str] = None) -> dict:
+        await auth_handler.revoke_token(token)
+        if db is not None and refresh_token:
+            stored = await db.scalar(select(RefreshToken).filter(
+                RefreshToken.token_hash == AuthController._hash_refresh_token(refresh_token)
+            ))
+            if stored:
+                await AuthController._revoke_family(db, stored.familia)
+        logger.info("Token revocado por logout")
+        return {"message": "Sesión cerrada exitosamente"}
+
+    @staticmethod
+    async def get_current_user_from_token(db: AsyncSession, token: str) -> User:
         try:
             user_id = auth_handler.get_user_id_from_token(token)
-            user = db.query(User).filter(User.usuario_id == user_id).first()
+            user = await db.scalar(select(User).filter(User.usuario_id == user_id))
 
             if not user:
                 raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no encontrado")
@@ -1,9 +1,10 @@
 # app/controllers/automovil_controller.py
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy import and_, or_, func, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.automovil import Automovil, EstadoAutomovil
-from app.models.user import User
+from app.models.user import EstadoUsuario, User
+from app.auth.permissions import Permiso
 from app.schemas.automovil import (
     AutomovilCreate, AutomovilUpdate, AutomovilFiltros, 
     CambioEstadoAutomovil, ActualizarKilometraje
@@ -18,13 +19,13 @@ logger = logging.getLogger(__name__)
 class AutomovilController:
     
     @staticmethod
-    def crear_automovil(db: Session, automovil_data: AutomovilCreate, current_user: User) -> Automovil:
+    async def crear_automovil(db: AsyncSession, automovil_data: AutomovilCreate, current_user: User) -> Automovil:
         """Crear un nuevo automóvil"""
         try:
             # Verificar que la placa no exista
-            automovil_existente = db.query(Automovil).filter(
+            automovil_existente = await db.scalar(select(Automovil).filter(
                 Automovil.placa == automovil_data.placa.upper().strip()
-            ).first()
+            ))
             
             if automovil_existente:
                 raise HTTPException(
@@ -34,9 +35,9 @@ class AutomovilController:
             
             # Verificar VIN si se proporciona
             if automovil_data.vin:
-                vin_existente = db.query(Automovil).filter(
+                vin_existente = await db.scalar(select(Automovil).filter(
                     Automovil.vin == automovil_data.vin.upper().strip()
-                ).first()
+                ))
                 
                 if vin_existente:
                     raise HTTPException(
@@ -45,9 +46,9 @@ class AutomovilController:
                     )
             
             # Verificar que el propietario existe y está activo
-            propietario = db.query(User).filter(
-                and_(User.id == automovil_data.propietario_id, User.activo == True)
-            ).first()
+            propietario = await db.scalar(select(User).filter(
+                and_(User.usuario_id == automovil_data.propietario_id, User.estado == EstadoUsuario.ACTIVO)
+            ))
             
             if not propietario:
                 raise HTTPException(
@@ -56,7 +57,7 @@ class AutomovilController:
                 )
             
             # Solo admin puede asignar automóviles a otros usuarios
-            if current_user.rol.nombre != "Administrador" and automovil_data.propietario_id != current_user.id:
+            if not current_user.has_permission(Permiso.VEHICULOS_ASIGNAR) and automovil_data.propietario_id != current_user.usuario_id:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para asignar automóviles a otros usuarios"
@@ -69,16 +70,16 @@ class AutomovilController:
                 nuevo_automovil.vin = nuevo_automovil.vin.upper().strip()
             
             db.add(nuevo_automovil)
-            db.commit()
-            db.refresh(nuevo_automovil)
+            await db.commit()
+            await db.refresh(nuevo_automovil)
             
-            logger.info(f"Automóvil creado: {nuevo_automovil.placa} por usuario {current_user.id}")
+            logger.info(f"Automóvil creado: {nuevo_automovil.placa} por usuario {current_user.usuario_id}")
             return nuevo_automovil
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error al crear automóvil: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -86,8 +87,8 @@ class AutomovilController:
             )
     
     @staticmethod
-    def obtener_automoviles(
-        db: Session, 
+    async def obtener_automoviles(
+        db: AsyncSession, 
         current_user: User,
         filtros: Optional[AutomovilFiltros] = None,
         skip: int = 0, 
@@ -95,12 +96,12 @@ class AutomovilController:
     ) -> tuple[List[Automovil], int]:
         """Obtener lista de automóviles con filtros y paginación"""
         try:
-            query = db.query(Automovil).join(User)
+            query = select(Automovil).join(User)
             
             # Filtrar por rol del usuario
-            if current_user.rol.nombre == "Cliente":
-                query = query.filter(Automovil.propietario_id == current_user.id)
-            elif current_user.rol.nombre == "Empleado":
+            if not current_user.has_permission(Permiso.VEHICULOS_VER_TODOS):
+                query = query.filter(Automovil.propietario_id == current_user.usuario_id)
+            elif not current_user.has_permission(Permiso.VEHICULOS_VER_INACTIVOS):
                 # Los empleados pueden ver todos los automóviles activos
                 query = query.filter(Automovil.estado != EstadoAutomovil.INACTIVO)
             
@@ -126,10 +127,10 @@ class AutomovilController:
                     query = query.filter(Automovil.tipo_transmision == filtros.tipo_transmision)
             
             # Contar total
-            total = query.count()
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
             
             # Aplicar paginación y ordenamiento
-            automoviles = query.order_by(desc(Automovil.created_at)).offset(skip).limit(limit).all()
+            automoviles = (await db.scalars(query.order_by(desc(Automovil.created_at)).offset(skip).limit(limit))).all()
             
             return automoviles, total
             
@@ -141,16 +142,16 @@ class AutomovilController:
             )
     
     @staticmethod
-    def obtener_automovil_por_id(db: Session, automovil_id: int, current_user: User) -> Automovil:
+    async def obtener_automovil_por_id(db: AsyncSession, automovil_id: int, current_user: User) -> Automovil:
         """Obtener un automóvil específico por ID"""
         try:
-            query = db.query(Automovil).filter(Automovil.id == automovil_id)
+            query = select(Automovil).filter(Automovil.id == automovil_id)
             
             # Filtrar por rol del usuario
-            if current_user.rol.nombre == "Cliente":
-                query = query.filter(Automovil.propietario_id == current_user.id)
+            if not current_user.has_permission(Permiso.VEHICULOS_VER_TODOS):
+                query = query.filter(Automovil.propietario_id == current_user.usuario_id)
             
-            automovil = query.first()
+            automovil = await db.scalar(query)
             
             if not automovil:
                 raise HTTPException(
@@ -170,16 +171,16 @@ class AutomovilController:
             )
     
     @staticmethod
-    def obtener_automovil_por_placa(db: Session, placa: str, current_user: User) -> Automovil:
+    async def obtener_automovil_por_placa(db: AsyncSession, placa: str, current_user: User) -> Automovil:
         """Obtener un automóvil por placa"""
         try:
-            query = db.query(Automovil).filter(Automovil.placa == placa.upper().strip())
+            query = select(Automovil).filter(Automovil.placa == placa.upper().strip())
             
             # Filtrar por rol del usuario
-            if current_user.rol.nombre == "Cliente":
-                query = query.filter(Automovil.propietario_id == current_user.id)
+            if not current_user.has_permission(Permiso.VEHICULOS_VER_TODOS):
+                query = query.filter(Automovil.propietario_id == current_user.usuario_id)
             
-            automovil = query.first()
+            automovil = await db.scalar(query)
             
             if not automovil:
                 raise HTTPException(
@@ -199,19 +200,19 @@ class AutomovilController:
             )
     
     @staticmethod
-    def actualizar_automovil(
-        db: Session, 
+    async def actualizar_automovil(
+        db: AsyncSession, 
         automovil_id: int, 
         automovil_data: AutomovilUpdate, 
         current_user: User
     ) -> Automovil:
         """Actualizar un automóvil"""
         try:
-            automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
             
             # Solo admin o el propietario pueden actualizar
-            if (current_user.rol.nombre not in ["Administrador", "Empleado"] and 
-                automovil.propietario_id != current_user.id):
+            if (not current_user.has_permission(Permiso.VEHICULOS_EDITAR_TODOS) and 
+                automovil.propietario_id != current_user.usuario_id):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para actualizar este automóvil"
@@ -219,12 +220,12 @@ class AutomovilController:
             
             # Verificar placa única si se está actualizando
             if automovil_data.placa and automovil_data.placa != automovil.placa:
-                placa_existente = db.query(Automovil).filter(
+                placa_existente = await db.scalar(select(Automovil).filter(
                     and_(
                         Automovil.placa == automovil_data.placa.upper().strip(),
                         Automovil.id != automovil_id
                     )
-                ).first()
+                ))
                 
                 if placa_existente:
                     raise HTTPException(
@@ -234,12 +235,12 @@ class AutomovilController:
             
             # Verificar VIN único si se está actualizando
             if automovil_data.vin and automovil_data.vin != automovil.vin:
-                vin_existente = db.query(Automovil).filter(
+                vin_existente = await db.scalar(select(Automovil).filter(
                     and_(
                         Automovil.vin == automovil_data.vin.upper().strip(),
                         Automovil.id != automovil_id
                     )
-                ).first()
+                ))
                 
                 if vin_existente:
                     raise HTTPException(
@@ -260,16 +261,16 @@ class AutomovilController:
             
             automovil.updated_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(automovil)
+            await db.commit()
+            await db.refresh(automovil)
             
-            logger.info(f"Automóvil actualizado: {automovil.placa} por usuario {current_user.id}")
+            logger.info(f"Automóvil actualizado: {automovil.placa} por usuario {current_user.usuario_id}")
             return automovil
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error al actualizar automóvil: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -277,8 +278,8 @@ class AutomovilController:
             )
     
     @staticmethod
-    def cambiar_estado_automovil(
-        db: Session, 
+    async def cambiar_estado_automovil(
+        db: AsyncSession, 
         automovil_id: int, 
         cambio_estado: CambioEstadoAutomovil, 
         current_user: User
@@ -286,13 +287,13 @@ class AutomovilController:
         """Cambiar el estado de un automóvil"""
         try:
             # Solo admin y empleados pueden cambiar estados
-            if current_user.rol.nombre not in ["Administrador", "Empleado"]:
+            if not current_user.has_permission(Permiso.VEHICULOS_CAMBIAR_ESTADO):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para cambiar el estado del automóvil"
                 )
             
-            automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
             
             estado_anterior = automovil.estado
             automovil.estado = cambio_estado.estado
@@ -304,16 +305,16 @@ class AutomovilController:
             
             automovil.updated_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(automovil)
+            await db.commit()
+            await db.refresh(automovil)
             
-            logger.info(f"Estado del automóvil {automovil.placa} cambiado de {estado_anterior} a {cambio_estado.estado} por usuario {current_user.id}")
+            logger.info(f"Estado del automóvil {automovil.placa} cambiado de {estado_anterior} a {cambio_estado.estado} por usuario {current_user.usuario_id}")
             return automovil
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error al cambiar estado del automóvil: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -321,15 +322,15 @@ class AutomovilController:
             )
     
     @staticmethod
-    def actualizar_kilometraje(
-        db: Session, 
+    async def actualizar_kilometraje(
+        db: AsyncSession, 
         automovil_id: int, 
         datos_kilometraje: ActualizarKilometraje, 
         current_user: User
     ) -> Automovil:
         """Actualizar el kilometraje de un automóvil"""
         try:
-            automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
             
             # Verificar que el nuevo kilometraje sea mayor al actual
             if datos_kilometraje.kilometraje_actual < automovil.kilometraje_actual:
@@ -349,16 +350,16 @@ class AutomovilController:
             
             automovil.updated_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(automovil)
+            await db.commit()
+            await db.refresh(automovil)
             
-            logger.info(f"Kilometraje actualizado para automóvil {automovil.placa}: {kilometraje_anterior} -> {datos_kilometraje.kilometraje_actual} km por usuario {current_user.id}")
+            logger.info(f"Kilometraje actualizado para automóvil {automovil.placa}: {kilometraje_anterior} -> {datos_kilometraje.kilometraje_actual} km por usuario {current_user.usuario_id}")
             return automovil
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error al actualizar kilometraje: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -366,17 +367,17 @@ class AutomovilController:
             )
     
     @staticmethod
-    def eliminar_automovil(db: Session, automovil_id: int, current_user: User) -> bool:
+    async def eliminar_automovil(db: AsyncSession, automovil_id: int, current_user: User) -> bool:
         """Eliminar un automóvil (eliminación lógica)"""
         try:
             # Solo admin puede eliminar automóviles
-            if current_user.rol.nombre != "Administrador":
+            if not current_user.has_permission(Permiso.VEHICULOS_ELIMINAR):
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para eliminar automóviles"
                 )
             
-            automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
             
             # Eliminación lógica: cambiar estado a INACTIVO
             automovil.estado = EstadoAutomovil.INACTIVO
@@ -387,15 +388,15 @@ class AutomovilController:
             nueva_observacion = f"[{datetime.now().strftime('%Y-%m-%d %H:%M')}] Automóvil eliminado por usuario {current_user.nombre_completo}"
             automovil.observaciones = f"{observaciones_actuales}\n{nueva_observacion}".strip()
             
-            db.commit()
+            await db.commit()
             
-            logger.info(f"Automóvil eliminado (lógicamente): {automovil.placa} por usuario {current_user.id}")
+            logger.info(f"Automóvil eliminado (lógicamente): {automovil.placa} por usuario {current_user.usuario_id}")
             return True
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error al eliminar automóvil: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -403,10 +404,11 @@ class AutomovilController:
             )
     
     @staticmethod
-    def obtener_historial_automovil(db: Session, automovil_id: int, current_user: User) -> dict:
+    async def obtener_historial_automovil(db: AsyncSession, automovil_id: int, current_user: User) -> dict:
         """Obtener el historial completo de un automóvil"""
         try:
-            automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+            await db.refresh(automovil, ["propietario"])
             
             # Crear historial desde las observaciones
             historial = []
@@ -443,33 +445,33 @@ class AutomovilController:
             )
     
     @staticmethod
-    def obtener_estadisticas_automoviles(db: Session, current_user: User) -> dict:
+    async def obtener_estadisticas_automoviles(db: AsyncSession, current_user: User) -> dict:
         """Obtener estadísticas de los automóviles"""
         try:
             # Solo admin y empleados pueden ver estadísticas completas
-            if current_user.rol.nombre == "Cliente":
-                query = db.query(Automovil).filter(Automovil.propietario_id == current_user.id)
+            if not current_user.has_permission(Permiso.VEHICULOS_VER_TODOS):
+                query = select(Automovil).filter(Automovil.propietario_id == current_user.usuario_id)
             else:
-                query = db.query(Automovil)
+                query = select(Automovil)
             
             # Contar por estado
-            total_automoviles = query.count()
-            activos = query.filter(Automovil.estado == EstadoAutomovil.ACTIVO).count()
-            en_servicio = query.filter(Automovil.estado == EstadoAutomovil.EN_SERVICIO).count()
-            en_reparacion = query.filter(Automovil.estado == EstadoAutomovil.EN_REPARACION).count()
-            inactivos = query.filter(Automovil.estado == EstadoAutomovil.INACTIVO).count()
+            total_automoviles = await db.scalar(select(func.count()).select_from(query.subquery()))
+            activos = await db.scalar(select(func.count()).select_from(query.filter(Automovil.estado == EstadoAutomovil.ACTIVO).subquery()))
+            en_servicio = await db.scalar(select(func.count()).select_from(query.filter(Automovil.estado == EstadoAutomovil.EN_SERVICIO).subquery()))
+            en_reparacion = await db.scalar(select(func.count()).select_from(query.filter(Automovil.estado == EstadoAutomovil.EN_REPARACION).subquery()))
+            inactivos = await db.scalar(select(func.count()).select_from(query.filter(Automovil.estado == EstadoAutomovil.INACTIVO).subquery()))
             
             # Estadísticas por marca
-            marcas = db.query(
+            marcas = (await db.execute(select(
                 Automovil.marca, 
                 func.count(Automovil.id).label('cantidad')
-            ).group_by(Automovil.marca).all()
+            ).group_by(Automovil.marca))).all()
             
             # Estadísticas por año
-            años = db.query(
+            años = (await db.execute(select(
                 Automovil.año, 
                 func.count(Automovil.id).label('cantidad')
-            ).group_by(Automovil.año).order_by(desc(Automovil.año)).limit(10).all()
+            ).group_by(Automovil.año).order_by(desc(Automovil.año)).limit(10))).all()
             
             return {
                 "total_automoviles": total_automoviles,
@@ -1,12 +1,17 @@
 # app/controllers/chat_controller.py
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc
-from fastapi import HTTPException, status
-from typing import List, Optional, Dict, Any
+from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, or_, func, desc, select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, UploadFile, status
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 
-from app.models.chat import Chat, MensajeChat, ConexionChat, TipoMensaje, EstadoMensaje
+from app.models.chat import Chat, MensajeChat, TipoMensaje, EstadoMensaje
 from app.models.user import Usuario
+from app.services.presence_service import presence_tracker
+from app.services.chat_file_service import chat_file_service
+from app.services.websocket_service import websocket_manager
+from app.auth.permissions import Permiso, permission_registry
 from app.models.proceso import Proceso
 from app.schemas.chat import (
     ChatCreate, ChatUpdate, ChatResponse, ChatFiltros,
@@ -14,15 +19,38 @@ from app.schemas.chat import (
     ConexionChatCreate, ChatEstadisticas, ChatDetalle
 )
 
+def opciones_chat() -> tuple:
+    """
+    Relaciones que _construir_chat_response necesita ya cargadas: en AsyncSession
+    no se permiten lazy loads implícitos. Se construyen en cada consulta porque
+    selectinload configura los mappers, y al importar este módulo aún no están
+    registrados todos los modelos.
+    """
+    return (
+        selectinload(Chat.cliente),
+        selectinload(Chat.mecanico),
+        selectinload(Chat.proceso).selectinload(Proceso.automovil),
+    )
+
+def opciones_mensaje() -> tuple:
+    """Relaciones que _construir_mensaje_response necesita ya cargadas"""
+    return (
+        selectinload(MensajeChat.remitente),
+        selectinload(MensajeChat.mensaje_padre).selectinload(MensajeChat.remitente),
+    )
+
+# Solo se cuentan como respuesta los cambios de remitente dentro de una hora
+MAX_MINUTOS_RESPUESTA = 60
+
 class ChatController:
     """Controlador para gestión de chats y mensajes"""
     
     @staticmethod
-    def crear_chat(db: Session, chat_data: ChatCreate, cliente_id: int) -> ChatResponse:
+    async def crear_chat(db: AsyncSession, chat_data: ChatCreate, cliente_id: int) -> ChatResponse:
         """Crear nuevo chat para un proceso"""
         try:
             # Verificar que el proceso existe
-            proceso = db.query(Proceso).filter(Proceso.id == chat_data.proceso_id).first()
+            proceso = await db.scalar(select(Proceso).filter(Proceso.id == chat_data.proceso_id))
             if not proceso:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -30,12 +58,12 @@ class ChatController:
                 )
             
             # Verificar que no existe un chat activo para este proceso
-            chat_existente = db.query(Chat).filter(
+            chat_existente = await db.scalar(select(Chat).filter(
                 and_(
                     Chat.proceso_id == chat_data.proceso_id,
                     Chat.activo == True
                 )
-            ).first()
+            ))
             
             if chat_existente:
                 raise HTTPException(
@@ -45,12 +73,12 @@ class ChatController:
             
             # Verificar mecánico si se proporciona
             if chat_data.mecanico_id:
-                mecanico = db.query(Usuario).filter(
+                mecanico = await db.scalar(select(Usuario).filter(
                     and_(
-                        Usuario.id == chat_data.mecanico_id,
-                        Usuario.rol.has(nombre="Empleado")
+                        Usuario.usuario_id == chat_data.mecanico_id,
+                        Usuario.rol_id.in_(permission_registry.roles_con(Permiso.PROCESOS_ATENDER))
                     )
-                ).first()
+                ))
                 if not mecanico:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -66,8 +94,8 @@ class ChatController:
             )
             
             db.add(nuevo_chat)
-            db.commit()
-            db.refresh(nuevo_chat)
+            await db.commit()
+            await db.refresh(nuevo_chat)
             
             # Crear mensaje de bienvenida automático
             mensaje_bienvenida = MensajeChat(
@@ -77,22 +105,24 @@ class ChatController:
                 tipo_mensaje=TipoMensaje.NOTIFICACION
             )
             db.add(mensaje_bienvenida)
-            db.commit()
+            ChatController._registrar_mensaje_en_resumen(nuevo_chat, mensaje_bienvenida)
+            await db.commit()
             
-            return ChatController._construir_chat_response(db, nuevo_chat)
+            nuevo_chat = await ChatController._cargar_chat(db, nuevo_chat.id)
+            return ChatController._construir_chat_response(nuevo_chat, cliente_id)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al crear chat: {str(e)}"
             )
     
     @staticmethod
-    def obtener_chats(
-        db: Session, 
+    async def obtener_chats(
+        db: AsyncSession, 
         filtros: ChatFiltros, 
         usuario_id: int,
         es_admin: bool = False,
@@ -101,11 +131,7 @@ class ChatController:
     ) -> Dict[str, Any]:
         """Obtener lista de chats con filtros"""
         try:
-            query = db.query(Chat).options(
-                joinedload(Chat.cliente),
-                joinedload(Chat.mecanico),
-                joinedload(Chat.proceso)
-            )
+            query = select(Chat).options(*opciones_chat())
             
             # Filtros de seguridad: solo mostrar chats donde el usuario participa
             if not es_admin:
@@ -147,14 +173,14 @@ class ChatController:
             query = query.order_by(desc(Chat.updated_at))
             
             # Paginación
-            total = query.count()
-            chats = query.offset((page - 1) * per_page).limit(per_page).all()
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+            chats = (await db.scalars(query.offset((page - 1) * per_page).limit(per_page))).all()
             
-            # Construir respuesta
-            chats_response = []
-            for chat in chats:
-                chat_resp = ChatController._construir_chat_response(db, chat)
-                chats_response.append(chat_resp)
+            # Construir respuesta (los contadores ya vienen en cada fila de chats)
+            chats_response = [
+                ChatController._construir_chat_response(chat, usuario_id)
+                for chat in chats
+            ]
             
             return {
                 "chats": chats_response,
@@ -171,15 +197,10 @@ class ChatController:
             )
     
     @staticmethod
-    def obtener_chat_detalle(db: Session, chat_id: int, usuario_id: int, es_admin: bool = False) -> ChatDetalle:
+    async def obtener_chat_detalle(db: AsyncSession, chat_id: int, usuario_id: int, es_admin: bool = False) -> ChatDetalle:
         """Obtener detalle completo de un chat"""
         try:
-            query = db.query(Chat).options(
-                joinedload(Chat.cliente),
-                joinedload(Chat.mecanico),
-                joinedload(Chat.proceso),
-                joinedload(Chat.mensajes).joinedload(MensajeChat.remitente)
-            )
+            query = select(Chat).options(*opciones_chat())
             
             # Verificar acceso
             if not es_admin:
@@ -195,7 +216,7 @@ class ChatController:
             else:
                 query = query.filter(Chat.id == chat_id)
             
-            chat = query.first()
+            chat = await db.scalar(query)
             if not chat:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -203,14 +224,16 @@ class ChatController:
                 )
             
             # Construir respuesta detallada
-            chat_response = ChatController._construir_chat_response(db, chat)
+            chat_response = ChatController._construir_chat_response(chat, usuario_id)
             
-            # Obtener mensajes recientes (últimos 50)
-            mensajes_recientes = db.query(MensajeChat).filter(
-                MensajeChat.chat_id == chat_id
-            ).options(
-                joinedload(MensajeChat.remitente)
-            ).order_by(desc(MensajeChat.created_at)).limit(50).all()
+            # Obtener mensajes recientes (últimos 50) por el índice (chat_id, id)
+            mensajes_recientes = (await db.scalars(
+                select(MensajeChat).filter(
+                    MensajeChat.chat_id == chat_id
+                ).options(
+                    *opciones_mensaje()
+                ).order_by(desc(MensajeChat.id)).limit(50)
+            )).all()
             
             mensajes_resp = []
             for mensaje in reversed(mensajes_recientes):  # Ordenar cronológicamente
@@ -218,7 +241,7 @@ class ChatController:
                 mensajes_resp.append(mensaje_resp)
             
             # Obtener participantes activos
-            participantes = ChatController._obtener_participantes_activos(db, chat_id)
+            participantes = await ChatController._obtener_participantes_activos(db, chat_id)
             
             return ChatDetalle(
                 **chat_response.dict(),
@@ -235,11 +258,11 @@ class ChatController:
             )
     
     @staticmethod
-    def actualizar_chat(db: Session, chat_id: int, chat_data: ChatUpdate, usuario_id: int, es_admin: bool = False) -> ChatResponse:
+    async def actualizar_chat(db: AsyncSession, chat_id: int, chat_data: ChatUpdate, usuario_id: int, es_admin: bool = False) -> ChatResponse:
         """Actualizar información del chat"""
         try:
             # Buscar el chat
-            query = db.query(Chat)
+            query = select(Chat)
             if not es_admin:
                 query = query.filter(
                     or_(
@@ -248,7 +271,7 @@ class ChatController:
                     )
                 )
             
-            chat = query.filter(Chat.id == chat_id).first()
+            chat = await db.scalar(query.filter(Chat.id == chat_id))
             if not chat:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -262,12 +285,12 @@ class ChatController:
             if chat_data.mecanico_id is not None:
                 # Verificar que el mecánico existe
                 if chat_data.mecanico_id > 0:
-                    mecanico = db.query(Usuario).filter(
+                    mecanico = await db.scalar(select(Usuario).filter(
                         and_(
-                            Usuario.id == chat_data.mecanico_id,
-                            Usuario.rol.has(nombre="Empleado")
+                            Usuario.usuario_id == chat_data.mecanico_id,
+                            Usuario.rol_id.in_(permission_registry.roles_con(Permiso.PROCESOS_ATENDER))
                         )
-                    ).first()
+                    ))
                     if not mecanico:
                         raise HTTPException(
                             status_code=status.HTTP_404_NOT_FOUND,
@@ -279,29 +302,29 @@ class ChatController:
                 chat.activo = chat_data.activo
             
             chat.updated_at = datetime.now()
-            db.commit()
-            db.refresh(chat)
+            await db.commit()
             
-            return ChatController._construir_chat_response(db, chat)
+            chat = await ChatController._cargar_chat(db, chat.id)
+            return ChatController._construir_chat_response(chat, usuario_id)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al actualizar chat: {str(e)}"
             )
     
     @staticmethod
-    def eliminar_chat(db: Session, chat_id: int, usuario_id: int, es_admin: bool = False) -> bool:
+    async def eliminar_chat(db: AsyncSession, chat_id: int, usuario_id: int, es_admin: bool = False) -> bool:
         """Eliminar chat (soft delete)"""
         try:
-            query = db.query(Chat)
+            query = select(Chat)
             if not es_admin:
                 query = query.filter(Chat.cliente_id == usuario_id)
             
-            chat = query.filter(Chat.id == chat_id).first()
+            chat = await db.scalar(query.filter(Chat.id == chat_id))
             if not chat:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -311,14 +334,14 @@ class ChatController:
             # Soft delete
             chat.activo = False
             chat.updated_at = datetime.now()
-            db.commit()
+            await db.commit()
             
             return True
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al eliminar chat: {str(e)}"
@@ -326,11 +349,11 @@ class ChatController:
     
     # Métodos para mensajes
     @staticmethod
-    def enviar_mensaje(db: Session, mensaje_data: MensajeChatCreate, remitente_id: int) -> MensajeChatResponse:
+    async def enviar_mensaje(db: AsyncSession, mensaje_data: MensajeChatCreate, remitente_id: int) -> MensajeChatResponse:
         """Enviar nuevo mensaje en el chat"""
         try:
             # Verificar que el chat existe y el usuario tiene acceso
-            chat = db.query(Chat).filter(
+            chat = await db.scalar(select(Chat).filter(
                 and_(
                     Chat.id == mensaje_data.chat_id,
                     Chat.activo == True,
@@ -339,7 +362,7 @@ class ChatController:
                         Chat.mecanico_id == remitente_id
                     )
                 )
-            ).first()
+            ))
             
             if not chat:
                 raise HTTPException(
@@ -347,6 +370,14 @@ class ChatController:
                     detail="Chat no encontrado o sin acceso"
                 )
             
+            # Los archivos del chat solo se adjuntan subiéndolos (enviar_archivo):
+            # una URL escrita a mano daría acceso a un archivo sin referencia
+            if chat_file_service.es_url_de_archivo(mensaje_data.archivo_url):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Los archivos se adjuntan con la subida de archivos del chat"
+                )
+            
             # Crear el mensaje
             nuevo_mensaje = MensajeChat(
                 chat_id=mensaje_data.chat_id,
@@ -359,36 +390,96 @@ class ChatController:
             
             db.add(nuevo_mensaje)
             
-            # Actualizar timestamp del chat
+            # Actualizar contadores y timestamp del chat en la misma transacción
+            ChatController._registrar_mensaje_en_resumen(chat, nuevo_mensaje)
             chat.updated_at = datetime.now()
             
-            db.commit()
-            db.refresh(nuevo_mensaje)
+            await db.commit()
+            nuevo_mensaje = await ChatController._cargar_mensaje(db, nuevo_mensaje.id)
             
             return ChatController._construir_mensaje_response(nuevo_mensaje)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al enviar mensaje: {str(e)}"
             )
     
     @staticmethod
-    def obtener_mensajes(
-        db: Session, 
+    async def enviar_archivo(db: AsyncSession, chat_id: int, file: UploadFile, remitente_id: int) -> Dict[str, Any]:
+        """
+        Subir un archivo al chat como mensaje. La referencia en el almacén y el
+        mensaje que la usa se confirman en la misma transacción.
+        Returns: {"mensaje": MensajeChatResponse, "estado": estado del procesamiento}
+        """
+        try:
+            chat = await db.scalar(select(Chat).filter(
+                and_(
+                    Chat.id == chat_id,
+                    Chat.activo == True,
+                    or_(
+                        Chat.cliente_id == remitente_id,
+                        Chat.mecanico_id == remitente_id
+                    )
+                )
+            ))
+            
+            if not chat:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Chat no encontrado o sin acceso"
+                )
+            
+            file_url, file_type, estado = await chat_file_service.upload_chat_file(db, file, chat_id, remitente_id)
+            
+            nuevo_mensaje = MensajeChat(
+                chat_id=chat_id,
+                remitente_id=remitente_id,
+                contenido=(file.filename or "archivo")[:2000],
+                tipo_mensaje=TipoMensaje(file_type),
+                archivo_url=file_url
+            )
+            db.add(nuevo_mensaje)
+            
+            ChatController._registrar_mensaje_en_resumen(chat, nuevo_mensaje)
+            chat.updated_at = datetime.now()
+            
+            await db.commit()
+            nuevo_mensaje = await ChatController._cargar_mensaje(db, nuevo_mensaje.id)
+            
+            return {"mensaje": ChatController._construir_mensaje_response(nuevo_mensaje), "estado": estado}
+            
+        except HTTPException:
+            await db.rollback()
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error al enviar archivo: {str(e)}"
+            )
+    
+    @staticmethod
+    async def obtener_mensajes(
+        db: AsyncSession, 
         chat_id: int, 
         usuario_id: int, 
-        page: int = 1, 
         per_page: int = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
         es_admin: bool = False
     ) -> Dict[str, Any]:
-        """Obtener mensajes de un chat con paginación"""
+        """
+        Obtener mensajes de un chat con paginación por cursor.
+        Sin cursor devuelve los más recientes; before_id carga los anteriores
+        a ese mensaje y after_id los nuevos desde ese mensaje (polling).
+        """
         try:
             # Verificar acceso al chat
-            chat_query = db.query(Chat)
+            chat_query = select(Chat)
             if not es_admin:
                 chat_query = chat_query.filter(
                     or_(
@@ -397,35 +488,47 @@ class ChatController:
                     )
                 )
             
-            chat = chat_query.filter(Chat.id == chat_id).first()
+            chat = await db.scalar(chat_query.filter(Chat.id == chat_id))
             if not chat:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Chat no encontrado"
                 )
             
-            # Obtener mensajes
-            query = db.query(MensajeChat).filter(
+            # Obtener mensajes recorriendo el índice (chat_id, id) desde el cursor
+            query = select(MensajeChat).filter(
                 MensajeChat.chat_id == chat_id
             ).options(
-                joinedload(MensajeChat.remitente)
-            ).order_by(desc(MensajeChat.created_at))
+                *opciones_mensaje()
+            )
+            
+            if after_id is not None:
+                query = query.filter(MensajeChat.id > after_id).order_by(MensajeChat.id)
+            else:
+                if before_id is not None:
+                    query = query.filter(MensajeChat.id < before_id)
+                query = query.order_by(desc(MensajeChat.id))
             
-            total = query.count()
-            mensajes = query.offset((page - 1) * per_page).limit(per_page).all()
+            # Se pide un mensaje extra solo para saber si hay más
+            mensajes = list((await db.scalars(query.limit(per_page + 1))).all())
+            has_more = len(mensajes) > per_page
+            mensajes = mensajes[:per_page]
+            
+            if after_id is None:
+                mensajes.reverse()  # Ordenar cronológicamente
             
             # Construir respuesta
-            mensajes_response = []
-            for mensaje in reversed(mensajes):  # Ordenar cronológicamente
-                mensaje_resp = ChatController._construir_mensaje_response(mensaje)
-                mensajes_response.append(mensaje_resp)
+            mensajes_response = [
+                ChatController._construir_mensaje_response(mensaje)
+                for mensaje in mensajes
+            ]
             
             return {
                 "mensajes": mensajes_response,
-                "total": total,
-                "page": page,
                 "per_page": per_page,
-                "total_pages": (total + per_page - 1) // per_page
+                "has_more": has_more,
+                "before_id": mensajes[0].id if mensajes else before_id,
+                "after_id": mensajes[-1].id if mensajes else after_id
             }
             
         except HTTPException:
@@ -437,11 +540,73 @@ class ChatController:
             )
     
     @staticmethod
-    def marcar_mensajes_como_leidos(db: Session, chat_id: int, usuario_id: int) -> bool:
+    async def actualizar_mensaje(db: AsyncSession, mensaje_id: int, mensaje_data: MensajeChatUpdate, usuario_id: int) -> MensajeChatResponse:
+        """
+        Actualizar un mensaje. El contenido solo lo edita su remitente y el
+        estado solo lo avanza el destinatario (ENVIADO -> ENTREGADO -> LEIDO).
+        """
+        try:
+            mensaje, chat = await ChatController._cargar_mensaje_con_acceso(db, mensaje_id, usuario_id)
+            
+            if mensaje_data.contenido is not None:
+                if mensaje.remitente_id != usuario_id:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="Solo el remitente puede editar el mensaje"
+                    )
+                mensaje.contenido = mensaje_data.contenido
+            
+            if mensaje_data.estado is not None:
+                if mensaje.remitente_id == usuario_id:
+                    raise HTTPException(
+                        status_code=status.HTTP_403_FORBIDDEN,
+                        detail="El estado del mensaje lo actualiza el destinatario"
+                    )
+                estado = EstadoMensaje(mensaje_data.estado.value)
+                if estado == EstadoMensaje.LEIDO:
+                    ChatController._marcar_leido(chat, mensaje, usuario_id)
+                elif mensaje.estado == EstadoMensaje.ENVIADO:
+                    mensaje.estado = estado
+            
+            await db.commit()
+            mensaje = await ChatController._cargar_mensaje(db, mensaje_id)
+            return ChatController._construir_mensaje_response(mensaje)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error al actualizar mensaje: {str(e)}"
+            )
+    
+    @staticmethod
+    async def marcar_mensaje_leido(db: AsyncSession, mensaje_id: int, usuario_id: int) -> bool:
+        """Marcar un mensaje recibido como leído (los propios no cambian)"""
+        try:
+            mensaje, chat = await ChatController._cargar_mensaje_con_acceso(db, mensaje_id, usuario_id)
+            
+            if mensaje.remitente_id != usuario_id:
+                ChatController._marcar_leido(chat, mensaje, usuario_id)
+                await db.commit()
+            return True
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error al marcar mensaje como leído: {str(e)}"
+            )
+    
+    @staticmethod
+    async def marcar_mensajes_como_leidos(db: AsyncSession, chat_id: int, usuario_id: int) -> bool:
         """Marcar todos los mensajes no leídos como leídos"""
         try:
             # Verificar acceso al chat
-            chat = db.query(Chat).filter(
+            chat = await db.scalar(select(Chat).filter(
                 and_(
                     Chat.id == chat_id,
                     or_(
@@ -449,7 +614,7 @@ class ChatController:
                         Chat.mecanico_id == usuario_id
                     )
                 )
-            ).first()
+            ))
             
             if not chat:
                 raise HTTPException(
@@ -458,75 +623,76 @@ class ChatController:
                 )
             
             # Marcar mensajes como leídos (excepto los propios)
-            db.query(MensajeChat).filter(
-                and_(
-                    MensajeChat.chat_id == chat_id,
-                    MensajeChat.remitente_id != usuario_id,
-                    MensajeChat.estado != EstadoMensaje.LEIDO
-                )
-            ).update({
-                MensajeChat.estado: EstadoMensaje.LEIDO,
-                MensajeChat.leido_at: datetime.now()
-            })
+            await db.execute(
+                update(MensajeChat).where(
+                    and_(
+                        MensajeChat.chat_id == chat_id,
+                        MensajeChat.remitente_id != usuario_id,
+                        MensajeChat.estado != EstadoMensaje.LEIDO
+                    )
+                ).values({
+                    MensajeChat.estado: EstadoMensaje.LEIDO,
+                    MensajeChat.leido_at: datetime.now()
+                })
+            )
             
-            db.commit()
+            # Reiniciar el contador de no leídos del lector
+            if chat.cliente_id == usuario_id:
+                chat.no_leidos_cliente = 0
+            else:
+                chat.no_leidos_mecanico = 0
+            
+            await db.commit()
             return True
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al marcar mensajes como leídos: {str(e)}"
             )
     
     @staticmethod
-    def obtener_estadisticas_chat(db: Session, usuario_id: int, es_admin: bool = False) -> ChatEstadisticas:
+    async def obtener_estadisticas_chat(db: AsyncSession, usuario_id: int, es_admin: bool = False) -> ChatEstadisticas:
         """Obtener estadísticas generales del chat"""
         try:
             # Base query para chats del usuario
             if es_admin:
-                chats_query = db.query(Chat)
-                mensajes_query = db.query(MensajeChat)
+                chats_query = select(Chat)
+                no_leidos = Chat.no_leidos_cliente + Chat.no_leidos_mecanico
             else:
-                chats_query = db.query(Chat).filter(
+                chats_query = select(Chat).filter(
                     or_(
                         Chat.cliente_id == usuario_id,
                         Chat.mecanico_id == usuario_id
                     )
                 )
-                mensajes_query = db.query(MensajeChat).join(Chat).filter(
-                    or_(
-                        Chat.cliente_id == usuario_id,
-                        Chat.mecanico_id == usuario_id
-                    )
+                no_leidos = case(
+                    (Chat.cliente_id == usuario_id, Chat.no_leidos_cliente),
+                    else_=Chat.no_leidos_mecanico
                 )
             
-            # Estadísticas básicas
-            total_chats = chats_query.count()
-            chats_activos = chats_query.filter(Chat.activo == True).count()
-            total_mensajes = mensajes_query.count()
-            
-            # Mensajes no leídos
-            mensajes_no_leidos = mensajes_query.filter(
-                and_(
-                    MensajeChat.remitente_id != usuario_id,
-                    MensajeChat.estado != EstadoMensaje.LEIDO
+            # Estadísticas básicas y mensajes desde los contadores de cada chat
+            resumen = (await db.execute(
+                chats_query.with_only_columns(
+                    func.count(Chat.id),
+                    func.coalesce(func.sum(case((Chat.activo == True, 1), else_=0)), 0),
+                    func.coalesce(func.sum(Chat.total_mensajes), 0),
+                    func.coalesce(func.sum(no_leidos), 0),
+                    func.coalesce(func.sum(case((Chat.activo == True, Chat.total_respuestas), else_=0)), 0),
+                    func.coalesce(func.sum(case((Chat.activo == True, Chat.minutos_respuesta), else_=0)), 0)
                 )
-            ).count()
+            )).one()
+            total_chats, chats_activos, total_mensajes, mensajes_no_leidos = (int(valor) for valor in resumen[:4])
             
-            # Usuarios conectados (últimos 5 minutos)
-            tiempo_limite = datetime.now() - timedelta(minutes=5)
-            usuarios_conectados = db.query(ConexionChat).filter(
-                and_(
-                    ConexionChat.activa == True,
-                    ConexionChat.last_activity >= tiempo_limite
-                )
-            ).distinct(ConexionChat.usuario_id).count()
+            # Promedio de tiempo de respuesta (acumulado al enviar cada mensaje)
+            total_respuestas, minutos_respuesta = resumen[4], resumen[5]
+            promedio_respuesta = float(minutos_respuesta) / total_respuestas if total_respuestas else 0.0
             
-            # Promedio de tiempo de respuesta
-            promedio_respuesta = ChatController._calcular_promedio_respuesta(db, usuario_id, es_admin)
+            # Usuarios conectados en todos los workers (conjunto compartido en Redis)
+            usuarios_conectados = await websocket_manager.count_online_users()
             
             return ChatEstadisticas(
                 total_chats=total_chats,
@@ -544,101 +710,138 @@ class ChatController:
             )
     
     # Métodos para WebSocket
+    # La presencia vive en memoria; conexiones_chat se persiste en lote
+    # (PresenceTracker), por eso estos métodos no reciben sesión de base de datos
     @staticmethod
-    def crear_conexion(db: Session, conexion_data: ConexionChatCreate, usuario_id: int) -> bool:
-        """Crear o actualizar conexión WebSocket"""
-        try:
-            # Verificar si ya existe conexión activa
-            conexion_existente = db.query(ConexionChat).filter(
-                and_(
-                    ConexionChat.usuario_id == usuario_id,
-                    ConexionChat.chat_id == conexion_data.chat_id,
-                    ConexionChat.activa == True
-                )
-            ).first()
-            
-            if conexion_existente:
-                # Actualizar conexión existente
-                conexion_existente.session_id = conexion_data.session_id
-                conexion_existente.last_activity = datetime.now()
-            else:
-                # Crear nueva conexión
-                nueva_conexion = ConexionChat(
-                    usuario_id=usuario_id,
-                    chat_id=conexion_data.chat_id,
-                    session_id=conexion_data.session_id
+    async def crear_conexion(conexion_data: ConexionChatCreate, usuario_id: int) -> bool:
+        """Registrar conexión WebSocket"""
+        presence_tracker.connect(conexion_data.session_id, usuario_id, conexion_data.chat_id)
+        return True
+    
+    @staticmethod
+    async def desconectar_usuario(session_id: str) -> bool:
+        """Desconectar usuario del chat"""
+        presence_tracker.disconnect(session_id)
+        return True
+    
+    @staticmethod
+    async def actualizar_actividad(session_id: str) -> bool:
+        """Actualizar última actividad de conexión"""
+        presence_tracker.touch(session_id)
+        return True
+    
+    @staticmethod
+    async def verificar_acceso_chat(db: AsyncSession, chat_id: int, usuario_id: int) -> Optional[Usuario]:
+        """
+        Usuario que puede abrir el WebSocket de un chat activo: un participante
+        o un administrador, con la cuenta activa. None si no tiene acceso.
+        """
+        usuario = await db.scalar(select(Usuario).filter(Usuario.usuario_id == usuario_id))
+        if usuario is None or not usuario.is_active():
+            return None
+        
+        query = select(Chat.id).filter(Chat.id == chat_id, Chat.activo == True)
+        if not usuario.is_admin():
+            query = query.filter(
+                or_(
+                    Chat.cliente_id == usuario_id,
+                    Chat.mecanico_id == usuario_id
                 )
-                db.add(nueva_conexion)
-            
-            db.commit()
-            return True
-            
-        except Exception as e:
-            db.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error al crear conexión: {str(e)}"
             )
+        
+        if await db.scalar(query) is None:
+            return None
+        return usuario
     
+    # Métodos privados auxiliares
     @staticmethod
-    def desconectar_usuario(db: Session, session_id: str) -> bool:
-        """Desconectar usuario del chat"""
-        try:
-            conexion = db.query(ConexionChat).filter(
-                ConexionChat.session_id == session_id
-            ).first()
-            
-            if conexion:
-                conexion.activa = False
-                db.commit()
-            
-            return True
-            
-        except Exception as e:
-            db.rollback()
+    async def _cargar_chat(db: AsyncSession, chat_id: int) -> Chat:
+        """Recargar un chat con las relaciones que necesita la respuesta"""
+        return await db.scalar(
+            select(Chat).options(*opciones_chat()).filter(Chat.id == chat_id)
+            .execution_options(populate_existing=True)
+        )
+    
+    @staticmethod
+    async def _cargar_mensaje(db: AsyncSession, mensaje_id: int) -> MensajeChat:
+        """Recargar un mensaje con su remitente y el mensaje al que responde"""
+        return await db.scalar(
+            select(MensajeChat).options(*opciones_mensaje()).filter(MensajeChat.id == mensaje_id)
+            .execution_options(populate_existing=True)
+        )
+    
+    @staticmethod
+    async def _cargar_mensaje_con_acceso(db: AsyncSession, mensaje_id: int, usuario_id: int) -> Tuple[MensajeChat, Chat]:
+        """Mensaje y su chat si el usuario participa en él; 404 en otro caso"""
+        fila = (await db.execute(
+            select(MensajeChat, Chat).join(Chat, MensajeChat.chat_id == Chat.id).filter(
+                and_(
+                    MensajeChat.id == mensaje_id,
+                    or_(
+                        Chat.cliente_id == usuario_id,
+                        Chat.mecanico_id == usuario_id
+                    )
+                )
+            )
+        )).first()
+        if fila is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error al desconectar usuario: {str(e)}"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Mensaje no encontrado"
             )
+        return fila.MensajeChat, fila.Chat
     
     @staticmethod
-    def actualizar_actividad(db: Session, session_id: str) -> bool:
-        """Actualizar última actividad de conexión"""
-        try:
-            db.query(ConexionChat).filter(
-                ConexionChat.session_id == session_id
-            ).update({
-                ConexionChat.last_activity: datetime.now()
-            })
-            
-            db.commit()
-            return True
-            
-        except Exception as e:
-            db.rollback()
-            return False
+    def _marcar_leido(chat: Chat, mensaje: MensajeChat, usuario_id: int) -> None:
+        """Marcar un mensaje como leído y descontarlo de los no leídos del lector"""
+        if mensaje.estado == EstadoMensaje.LEIDO:
+            return
+        mensaje.estado = EstadoMensaje.LEIDO
+        mensaje.leido_at = datetime.now()
+        if chat.cliente_id == usuario_id:
+            chat.no_leidos_cliente = case((Chat.no_leidos_cliente > 0, Chat.no_leidos_cliente - 1), else_=0)
+        else:
+            chat.no_leidos_mecanico = case((Chat.no_leidos_mecanico > 0, Chat.no_leidos_mecanico - 1), else_=0)
     
-    # Métodos privados auxiliares
     @staticmethod
-    def _construir_chat_response(db: Session, chat: Chat) -> ChatResponse:
-        """Construir respuesta de chat con información relacionada"""
-        # Obtener estadísticas del chat
-        total_mensajes = db.query(MensajeChat).filter(
-            MensajeChat.chat_id == chat.id
-        ).count()
+    def _registrar_mensaje_en_resumen(chat: Chat, mensaje: MensajeChat) -> None:
+        """
+        Actualizar los contadores denormalizados del chat con un mensaje nuevo.
+        Se asignan expresiones SQL (columna + 1) para que el incremento sea
+        atómico y se confirme en la misma transacción que el mensaje.
+        """
+        ahora = datetime.now()
         
-        # Último mensaje
-        ultimo_mensaje = db.query(MensajeChat).filter(
-            MensajeChat.chat_id == chat.id
-        ).order_by(desc(MensajeChat.created_at)).first()
+        # Tiempo de respuesta: solo cuando cambia el remitente dentro de la hora
+        if (
+            chat.ultimo_remitente_id is not None
+            and chat.ultimo_remitente_id != mensaje.remitente_id
+            and chat.ultimo_mensaje_fecha is not None
+        ):
+            minutos = (ahora - chat.ultimo_mensaje_fecha.replace(tzinfo=None)).total_seconds() / 60
+            if 0 <= minutos <= MAX_MINUTOS_RESPUESTA:
+                chat.total_respuestas = Chat.total_respuestas + 1
+                chat.minutos_respuesta = Chat.minutos_respuesta + minutos
         
-        # Mensajes no leídos para el usuario actual (esto se puede ajustar según contexto)
-        mensajes_no_leidos = db.query(MensajeChat).filter(
-            and_(
-                MensajeChat.chat_id == chat.id,
-                MensajeChat.estado != EstadoMensaje.LEIDO
-            )
-        ).count()
+        chat.total_mensajes = Chat.total_mensajes + 1
+        if mensaje.remitente_id == chat.cliente_id:
+            chat.no_leidos_mecanico = Chat.no_leidos_mecanico + 1
+        else:
+            chat.no_leidos_cliente = Chat.no_leidos_cliente + 1
+        chat.ultimo_mensaje = (mensaje.contenido or "")[:100]
+        chat.ultimo_mensaje_fecha = ahora
+        chat.ultimo_remitente_id = mensaje.remitente_id
+    
+    @staticmethod
+    def _construir_chat_response(chat: Chat, usuario_id: Optional[int] = None) -> ChatResponse:
+        """Construir respuesta de chat con información relacionada"""
+        # No leídos del participante que consulta; para terceros (admin) los de ambos
+        if usuario_id == chat.cliente_id:
+            mensajes_no_leidos = chat.no_leidos_cliente or 0
+        elif usuario_id is not None and usuario_id == chat.mecanico_id:
+            mensajes_no_leidos = chat.no_leidos_mecanico or 0
+        else:
+            mensajes_no_leidos = (chat.no_leidos_cliente or 0) + (chat.no_leidos_mecanico or 0)
         
         return ChatResponse(
             id=chat.id,
@@ -649,16 +852,16 @@ class ChatController:
             activo=chat.activo,
             created_at=chat.created_at,
             updated_at=chat.updated_at,
-            cliente_nombre=chat.cliente.nombre if chat.cliente else None,
-            cliente_email=chat.cliente.email if chat.cliente else None,
-            mecanico_nombre=chat.mecanico.nombre if chat.mecanico else None,
-            mecanico_email=chat.mecanico.email if chat.mecanico else None,
+            cliente_nombre=chat.cliente.nombre_completo if chat.cliente else None,
+            cliente_email=chat.cliente.correo if chat.cliente else None,
+            mecanico_nombre=chat.mecanico.nombre_completo if chat.mecanico else None,
+            mecanico_email=chat.mecanico.correo if chat.mecanico else None,
             proceso_descripcion=chat.proceso.descripcion if chat.proceso else None,
             automovil_placa=chat.proceso.automovil.placa if chat.proceso and chat.proceso.automovil else None,
-            total_mensajes=total_mensajes,
+            total_mensajes=chat.total_mensajes or 0,
             mensajes_no_leidos=mensajes_no_leidos,
-            ultimo_mensaje=ultimo_mensaje.contenido[:100] if ultimo_mensaje else None,
-            ultimo_mensaje_fecha=ultimo_mensaje.created_at if ultimo_mensaje else None
+            ultimo_mensaje=chat.ultimo_mensaje,
+            ultimo_mensaje_fecha=chat.ultimo_mensaje_fecha
         )
     
     @staticmethod
@@ -672,7 +875,7 @@ class ChatController:
             mensaje_padre = mensaje.mensaje_padre
             if mensaje_padre:
                 mensaje_padre_contenido = mensaje_padre.contenido[:50]
-                mensaje_padre_remitente = mensaje_padre.remitente.nombre if mensaje_padre.remitente else "Usuario"
+                mensaje_padre_remitente = mensaje_padre.remitente.nombre_completo if mensaje_padre.remitente else "Usuario"
         
         return MensajeChatResponse(
             id=mensaje.id,
@@ -685,85 +888,31 @@ class ChatController:
             estado=mensaje.estado,
             created_at=mensaje.created_at,
             leido_at=mensaje.leido_at,
-            remitente_nombre=mensaje.remitente.nombre if mensaje.remitente else "Usuario",
-            remitente_email=mensaje.remitente.email if mensaje.remitente else None,
-            remitente_rol=mensaje.remitente.rol.nombre if mensaje.remitente and mensaje.remitente.rol else None,
+            remitente_nombre=mensaje.remitente.nombre_completo if mensaje.remitente else "Usuario",
+            remitente_email=mensaje.remitente.correo if mensaje.remitente else None,
+            remitente_rol=mensaje.remitente.role.nombre if mensaje.remitente and mensaje.remitente.role else None,
             mensaje_padre_contenido=mensaje_padre_contenido,
             mensaje_padre_remitente=mensaje_padre_remitente
         )
     
     @staticmethod
-    def _obtener_participantes_activos(db: Session, chat_id: int) -> List[dict]:
-        """Obtener lista de participantes activos en el chat"""
-        tiempo_limite = datetime.now() - timedelta(minutes=5)
-        
-        participantes = db.query(ConexionChat).filter(
-            and_(
-                ConexionChat.chat_id == chat_id,
-                ConexionChat.activa == True,
-                ConexionChat.last_activity >= tiempo_limite
-            )
-        ).options(
-            joinedload(ConexionChat.usuario)
-        ).all()
+    async def _obtener_participantes_activos(db: AsyncSession, chat_id: int) -> List[dict]:
+        """Obtener lista de participantes activos en el chat (todos los workers)"""
+        ultima_actividad = await presence_tracker.active_users(db, chat_id, timedelta(minutes=5))
+        if not ultima_actividad:
+            return []
         
-        resultado = []
-        for participante in participantes:
-            if participante.usuario:
-                resultado.append({
-                    "usuario_id": participante.usuario_id,
-                    "nombre": participante.usuario.nombre,
-                    "email": participante.usuario.email,
-                    "rol": participante.usuario.rol.nombre if participante.usuario.rol else None,
-                    "ultima_actividad": participante.last_activity
-                })
+        usuarios = (await db.scalars(
+            select(Usuario).filter(Usuario.usuario_id.in_(list(ultima_actividad)))
+        )).all()
         
-        return resultado
-    
-    @staticmethod
-    def _calcular_promedio_respuesta(db: Session, usuario_id: int, es_admin: bool = False) -> float:
-        """Calcular promedio de tiempo de respuesta en minutos"""
-        try:
-            # Esta es una implementación básica, se puede mejorar con lógica más compleja
-            if es_admin:
-                # Para admin, calcular promedio general
-                chats_activos = db.query(Chat).filter(Chat.activo == True).all()
-            else:
-                # Para usuario, solo sus chats
-                chats_activos = db.query(Chat).filter(
-                    and_(
-                        Chat.activo == True,
-                        or_(
-                            Chat.cliente_id == usuario_id,
-                            Chat.mecanico_id == usuario_id
-                        )
-                    )
-                ).all()
-            
-            if not chats_activos:
-                return 0.0
-            
-            total_tiempo = 0
-            total_respuestas = 0
-            
-            for chat in chats_activos:
-                # Obtener mensajes del chat ordenados por fecha
-                mensajes = db.query(MensajeChat).filter(
-                    MensajeChat.chat_id == chat.id
-                ).order_by(MensajeChat.created_at).all()
-                
-                # Calcular tiempo entre mensajes de diferentes usuarios
-                for i in range(1, len(mensajes)):
-                    mensaje_anterior = mensajes[i-1]
-                    mensaje_actual = mensajes[i]
-                    
-                    if mensaje_anterior.remitente_id != mensaje_actual.remitente_id:
-                        tiempo_respuesta = (mensaje_actual.created_at - mensaje_anterior.created_at).total_seconds() / 60
-                        if tiempo_respuesta <= 60:  # Solo contar respuestas dentro de 1 hora
-                            total_tiempo += tiempo_respuesta
-                            total_respuestas += 1
-            
-            return total_tiempo / total_respuestas if total_respuestas > 0 else 0.0
-            
-        except Exception:
-            return 0.0
\ No newline at end of file
+        return [
+            {
+                "usuario_id": usuario.usuario_id,
+                "nombre": usuario.nombre_completo,
+                "email": usuario.correo,
+                "rol": usuario.role.nombre if usuario.role else None,
+                "ultima_actividad": ultima_actividad[usuario.usuario_id]
+            }
+            for usuario in usuarios
+        ]
@@ -1,5 +1,6 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func, and_
+from sqlalchemy.orm import selectinload
+from sqlalchemy import desc, func, and_, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -29,11 +30,11 @@ class CotizacionController:
         return subtotal, impuestos, total
     
     @staticmethod
-    def crear_cotizacion(db: Session, cotizacion_data: CotizacionCreate, empleado_id: int) -> Cotizacion:
+    async def crear_cotizacion(db: AsyncSession, cotizacion_data: CotizacionCreate, empleado_id: int) -> Cotizacion:
         """Crea una nueva cotización"""
         
         # Validar que el cliente existe
-        cliente = db.query(User).filter(User.id == cotizacion_data.cliente_id).first()
+        cliente = await db.scalar(select(User).filter(User.id == cotizacion_data.cliente_id))
         if not cliente:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -41,7 +42,7 @@ class CotizacionController:
             )
         
         # Validar que el automóvil existe
-        automovil = db.query(Automovil).filter(Automovil.id == cotizacion_data.automovil_id).first()
+        automovil = await db.scalar(select(Automovil).filter(Automovil.id == cotizacion_data.automovil_id))
         if not automovil:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -62,7 +63,7 @@ class CotizacionController:
         )
         
         db.add(db_cotizacion)
-        db.flush()  # Para obtener el ID
+        await db.flush()  # Para obtener el ID
         
         # Crear items
         items_db = []
@@ -87,24 +88,23 @@ class CotizacionController:
         db_cotizacion.impuestos = impuestos
         db_cotizacion.total = total
         
-        db.commit()
-        db.refresh(db_cotizacion)
-        return db_cotizacion
+        await db.commit()
+        return await CotizacionController.obtener_cotizacion_por_id(db, db_cotizacion.id)
     
     @staticmethod
-    def obtener_cotizaciones(
-        db: Session, 
+    async def obtener_cotizaciones(
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         estado: Optional[EstadoCotizacion] = None,
         cliente_id: Optional[int] = None
     ) -> List[Cotizacion]:
         """Obtiene lista de cotizaciones con filtros"""
-        query = db.query(Cotizacion).options(
-            joinedload(Cotizacion.cliente),
-            joinedload(Cotizacion.automovil),
-            joinedload(Cotizacion.empleado),
-            joinedload(Cotizacion.items)
+        query = select(Cotizacion).options(
+            selectinload(Cotizacion.cliente),
+            selectinload(Cotizacion.automovil),
+            selectinload(Cotizacion.empleado),
+            selectinload(Cotizacion.items)
         )
         
         if estado:
@@ -113,17 +113,17 @@ class CotizacionController:
         if cliente_id:
             query = query.filter(Cotizacion.cliente_id == cliente_id)
         
-        return query.order_by(desc(Cotizacion.created_at)).offset(skip).limit(limit).all()
+        return (await db.scalars(query.order_by(desc(Cotizacion.created_at)).offset(skip).limit(limit))).all()
     
     @staticmethod
-    def obtener_cotizacion_por_id(db: Session, cotizacion_id: int) -> Cotizacion:
+    async def obtener_cotizacion_por_id(db: AsyncSession, cotizacion_id: int) -> Cotizacion:
         """Obtiene una cotización por ID"""
-        cotizacion = db.query(Cotizacion).options(
-            joinedload(Cotizacion.cliente),
-            joinedload(Cotizacion.automovil),
-            joinedload(Cotizacion.empleado),
-            joinedload(Cotizacion.items)
-        ).filter(Cotizacion.id == cotizacion_id).first()
+        cotizacion = await db.scalar(select(Cotizacion).options(
+            selectinload(Cotizacion.cliente),
+            selectinload(Cotizacion.automovil),
+            selectinload(Cotizacion.empleado),
+            selectinload(Cotizacion.items)
+        ).filter(Cotizacion.id == cotizacion_id).execution_options(populate_existing=True))
         
         if not cotizacion:
             raise HTTPException(
@@ -134,13 +134,13 @@ class CotizacionController:
         return cotizacion
     
     @staticmethod
-    def actualizar_cotizacion(
-        db: Session, 
+    async def actualizar_cotizacion(
+        db: AsyncSession, 
         cotizacion_id: int, 
         cotizacion_data: CotizacionUpdate
     ) -> Cotizacion:
         """Actualiza una cotización existente"""
-        cotizacion = CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
+        cotizacion = await CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
         
         # Solo se pueden editar cotizaciones en estado BORRADOR
         if cotizacion.estado != EstadoCotizacion.BORRADOR:
@@ -157,7 +157,7 @@ class CotizacionController:
         # Actualizar items si se proporcionan
         if cotizacion_data.items is not None:
             # Eliminar items existentes
-            db.query(ItemCotizacion).filter(ItemCotizacion.cotizacion_id == cotizacion_id).delete()
+            await db.execute(delete(ItemCotizacion).where(ItemCotizacion.cotizacion_id == cotizacion_id))
             
             # Crear nuevos items
             items_db = []
@@ -182,18 +182,17 @@ class CotizacionController:
             cotizacion.impuestos = impuestos
             cotizacion.total = total
         
-        db.commit()
-        db.refresh(cotizacion)
-        return cotizacion
+        await db.commit()
+        return await CotizacionController.obtener_cotizacion_por_id(db, cotizacion.id)
     
     @staticmethod
-    def cambiar_estado_cotizacion(
-        db: Session, 
+    async def cambiar_estado_cotizacion(
+        db: AsyncSession, 
         cotizacion_id: int, 
         nuevo_estado: EstadoCotizacion
     ) -> Cotizacion:
         """Cambia el estado de una cotización"""
-        cotizacion = CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
+        cotizacion = await CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
         
         # Validar transiciones de estado válidas
         transiciones_validas = {
@@ -213,14 +212,13 @@ class CotizacionController:
         if nuevo_estado == EstadoCotizacion.ACEPTADA:
             cotizacion.fecha_aceptacion = datetime.now()
         
-        db.commit()
-        db.refresh(cotizacion)
-        return cotizacion
+        await db.commit()
+        return await CotizacionController.obtener_cotizacion_por_id(db, cotizacion.id)
     
     @staticmethod
-    def eliminar_cotizacion(db: Session, cotizacion_id: int) -> bool:
+    async def eliminar_cotizacion(db: AsyncSession, cotizacion_id: int) -> bool:
         """Elimina una cotización (solo en estado BORRADOR)"""
-        cotizacion = CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
+        cotizacion = await CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
         
         if cotizacion.estado != EstadoCotizacion.BORRADOR:
             raise HTTPException(
@@ -228,43 +226,43 @@ class CotizacionController:
                 detail="Solo se pueden eliminar cotizaciones en estado borrador"
             )
         
-        db.delete(cotizacion)
-        db.commit()
+        await db.delete(cotizacion)
+        await db.commit()
         return True
     
     @staticmethod
-    def obtener_estadisticas(db: Session) -> dict:
+    async def obtener_estadisticas(db: AsyncSession) -> dict:
         """Obtiene estadísticas de las cotizaciones"""
         
         # Total de cotizaciones
-        total_cotizaciones = db.query(Cotizacion).count()
+        total_cotizaciones = await db.scalar(select(func.count()).select_from(Cotizacion))
         
         # Cotizaciones por estado
         cotizaciones_por_estado = {}
         for estado in EstadoCotizacion:
-            count = db.query(Cotizacion).filter(Cotizacion.estado == estado).count()
+            count = await db.scalar(select(func.count()).select_from(Cotizacion).filter(Cotizacion.estado == estado))
             cotizaciones_por_estado[estado.value] = count
         
         # Valor total de cotizaciones
-        valor_total = db.query(func.sum(Cotizacion.total)).scalar() or Decimal('0')
+        valor_total = await db.scalar(select(func.sum(Cotizacion.total))) or Decimal('0')
         
         # Cotizaciones vencidas
-        cotizaciones_vencidas = db.query(Cotizacion).filter(
+        cotizaciones_vencidas = await db.scalar(select(func.count()).select_from(Cotizacion).filter(
             and_(
                 Cotizacion.fecha_vencimiento < datetime.now(),
                 Cotizacion.estado == EstadoCotizacion.ENVIADA
             )
-        ).count()
+        ))
         
         # Promedio de valor por cotización
         promedio_valor = valor_total / total_cotizaciones if total_cotizaciones > 0 else Decimal('0')
         
         # Servicios más solicitados
-        servicios_populares = db.query(
+        servicios_populares = (await db.execute(select(
             ItemCotizacion.tipo_servicio,
             func.count(ItemCotizacion.id).label('cantidad'),
             func.sum(ItemCotizacion.precio_total).label('valor_total')
-        ).group_by(ItemCotizacion.tipo_servicio).order_by(desc('cantidad')).limit(5).all()
+        ).group_by(ItemCotizacion.tipo_servicio).order_by(desc('cantidad')).limit(5))).all()
         
         servicios_mas_solicitados = [
             {
@@ -1,6 +1,6 @@
 # 📁 app/controllers/historial_servicio_controller.py
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_, or_, func
+from sqlalchemy import desc, and_, or_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -22,16 +22,16 @@ class HistorialServicioController:
     RF004 - Gestión de Procesos
     """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
-    def crear_historial(self, historial_data: HistorialServicioCreate, usuario_id: str) -> HistorialServicio:
+    async def crear_historial(self, historial_data: HistorialServicioCreate, usuario_id: str) -> HistorialServicio:
         """
         Crear un nuevo registro de historial de servicio
         """
         try:
             # Verificar que el automóvil existe
-            automovil = self.db.query(Automovil).filter(Automovil.id == historial_data.automovil_id).first()
+            automovil = await self.db.scalar(select(Automovil).filter(Automovil.id == historial_data.automovil_id))
             if not automovil:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -40,7 +40,7 @@ class HistorialServicioController:
             
             # Verificar que el técnico existe (si se proporciona)
             if historial_data.tecnico_id:
-                tecnico = self.db.query(Usuario).filter(Usuario.id == historial_data.tecnico_id).first()
+                tecnico = await self.db.scalar(select(Usuario).filter(Usuario.id == historial_data.tecnico_id))
                 if not tecnico:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -69,28 +69,28 @@ class HistorialServicioController:
             )
             
             self.db.add(nuevo_historial)
-            self.db.commit()
-            self.db.refresh(nuevo_historial)
+            await self.db.commit()
+            await self.db.refresh(nuevo_historial)
             
             return nuevo_historial
             
         except HTTPException:
             raise
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al crear historial de servicio: {str(e)}"
             )
     
-    def obtener_historial_por_id(self, historial_id: str) -> HistorialServicio:
+    async def obtener_historial_por_id(self, historial_id: str) -> HistorialServicio:
         """
         Obtener un historial específico por ID
         """
-        historial = self.db.query(HistorialServicio).filter(
+        historial = await self.db.scalar(select(HistorialServicio).filter(
             HistorialServicio.id == historial_id,
             HistorialServicio.is_active == True
-        ).first()
+        ))
         
         if not historial:
             raise HTTPException(
@@ -100,7 +100,7 @@ class HistorialServicioController:
         
         return historial
     
-    def obtener_historial_por_automovil(
+    async def obtener_historial_por_automovil(
         self, 
         automovil_id: str,
         skip: int = 0,
@@ -110,7 +110,7 @@ class HistorialServicioController:
         """
         Obtener historial de servicios de un automóvil específico
         """
-        query = self.db.query(HistorialServicio).filter(
+        query = select(HistorialServicio).filter(
             HistorialServicio.automovil_id == automovil_id,
             HistorialServicio.is_active == True
         )
@@ -138,9 +138,9 @@ class HistorialServicioController:
             if filtros.costo_maximo:
                 query = query.filter(HistorialServicio.costo <= filtros.costo_maximo)
         
-        return query.order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit).all()
+        return (await self.db.scalars(query.order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit))).all()
     
-    def obtener_todos_historiales(
+    async def obtener_todos_historiales(
         self, 
         skip: int = 0, 
         limit: int = 100,
@@ -149,7 +149,7 @@ class HistorialServicioController:
         """
         Obtener todos los historiales de servicio con filtros opcionales
         """
-        query = self.db.query(HistorialServicio).filter(HistorialServicio.is_active == True)
+        query = select(HistorialServicio).filter(HistorialServicio.is_active == True)
         
         # Aplicar filtros si se proporcionan
         if filtros:
@@ -177,18 +177,18 @@ class HistorialServicioController:
             if filtros.costo_maximo:
                 query = query.filter(HistorialServicio.costo <= filtros.costo_maximo)
         
-        return query.order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit).all()
+        return (await self.db.scalars(query.order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit))).all()
     
-    def actualizar_historial(self, historial_id: str, historial_data: HistorialServicioUpdate, usuario_id: str) -> HistorialServicio:
+    async def actualizar_historial(self, historial_id: str, historial_data: HistorialServicioUpdate, usuario_id: str) -> HistorialServicio:
         """
         Actualizar un registro de historial existente
         """
         try:
-            historial = self.obtener_historial_por_id(historial_id)
+            historial = await self.obtener_historial_por_id(historial_id)
             
             # Verificar automóvil si se está cambiando
             if historial_data.automovil_id and historial_data.automovil_id != historial.automovil_id:
-                automovil = self.db.query(Automovil).filter(Automovil.id == historial_data.automovil_id).first()
+                automovil = await self.db.scalar(select(Automovil).filter(Automovil.id == historial_data.automovil_id))
                 if not automovil:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -197,7 +197,7 @@ class HistorialServicioController:
             
             # Verificar técnico si se está cambiando
             if historial_data.tecnico_id:
-                tecnico = self.db.query(Usuario).filter(Usuario.id == historial_data.tecnico_id).first()
+                tecnico = await self.db.scalar(select(Usuario).filter(Usuario.id == historial_data.tecnico_id))
                 if not tecnico:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -214,89 +214,89 @@ class HistorialServicioController:
             historial.updated_by = usuario_id
             historial.updated_at = datetime.utcnow()
             
-            self.db.commit()
-            self.db.refresh(historial)
+            await self.db.commit()
+            await self.db.refresh(historial)
             
             return historial
             
         except HTTPException:
             raise
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al actualizar historial: {str(e)}"
             )
     
-    def eliminar_historial(self, historial_id: str, usuario_id: str) -> bool:
+    async def eliminar_historial(self, historial_id: str, usuario_id: str) -> bool:
         """
         Eliminar (desactivar) un registro de historial
         """
         try:
-            historial = self.obtener_historial_por_id(historial_id)
+            historial = await self.obtener_historial_por_id(historial_id)
             
             historial.is_active = False
             historial.updated_by = usuario_id
             historial.updated_at = datetime.utcnow()
             
-            self.db.commit()
+            await self.db.commit()
             return True
             
         except HTTPException:
             raise
         except Exception as e:
-            self.db.rollback()
+            await self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al eliminar historial: {str(e)}"
             )
     
-    def obtener_historial_por_tecnico(self, tecnico_id: str, skip: int = 0, limit: int = 100) -> List[HistorialServicio]:
+    async def obtener_historial_por_tecnico(self, tecnico_id: str, skip: int = 0, limit: int = 100) -> List[HistorialServicio]:
         """
         Obtener historiales de servicio realizados por un técnico específico
         """
-        return self.db.query(HistorialServicio).filter(
+        return (await self.db.scalars(select(HistorialServicio).filter(
             HistorialServicio.tecnico_id == tecnico_id,
             HistorialServicio.is_active == True
-        ).order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit).all()
+        ).order_by(desc(HistorialServicio.fecha_servicio)).offset(skip).limit(limit))).all()
     
-    def obtener_proximos_mantenimientos(self, dias_adelanto: int = 30) -> List[HistorialServicio]:
+    async def obtener_proximos_mantenimientos(self, dias_adelanto: int = 30) -> List[HistorialServicio]:
         """
         Obtener vehículos que necesitan mantenimiento próximamente
         """
         fecha_limite = datetime.utcnow() + timedelta(days=dias_adelanto)
         
-        return self.db.query(HistorialServicio).filter(
+        return (await self.db.scalars(select(HistorialServicio).filter(
             HistorialServicio.is_active == True,
             HistorialServicio.proximo_mantenimiento_fecha <= fecha_limite,
             HistorialServicio.proximo_mantenimiento_fecha >= datetime.utcnow()
-        ).order_by(HistorialServicio.proximo_mantenimiento_fecha).all()
+        ).order_by(HistorialServicio.proximo_mantenimiento_fecha))).all()
     
-    def obtener_estadisticas_mantenimiento(self, automovil_id: Optional[str] = None) -> dict:
+    async def obtener_estadisticas_mantenimiento(self, automovil_id: Optional[str] = None) -> dict:
         """
         Obtener estadísticas de mantenimiento
         """
         try:
-            query = self.db.query(HistorialServicio).filter(HistorialServicio.is_active == True)
+            query = select(HistorialServicio).filter(HistorialServicio.is_active == True)
             
             if automovil_id:
                 query = query.filter(HistorialServicio.automovil_id == automovil_id)
             
             # Estadísticas básicas
-            total_servicios = query.count()
-            costo_total = query.with_entities(func.sum(HistorialServicio.costo)).scalar() or 0
-            costo_promedio = query.with_entities(func.avg(HistorialServicio.costo)).scalar() or 0
+            total_servicios = await self.db.scalar(select(func.count()).select_from(query.subquery()))
+            costo_total = await self.db.scalar(query.with_only_columns(func.sum(HistorialServicio.costo))) or 0
+            costo_promedio = await self.db.scalar(query.with_only_columns(func.avg(HistorialServicio.costo))) or 0
             
             # Servicios por tipo
             servicios_por_tipo = {}
             for tipo in TipoMantenimiento:
-                count = query.filter(HistorialServicio.tipo_mantenimiento == tipo).count()
+                count = await self.db.scalar(select(func.count()).select_from(query.filter(HistorialServicio.tipo_mantenimiento == tipo).subquery()))
                 servicios_por_tipo[tipo.value] = count
             
             # Servicios por estado
             servicios_por_estado = {}
             for estado in EstadoHistorial:
-                count = query.filter(HistorialServicio.estado == estado).count()
+                count = await self.db.scalar(select(func.count()).select_from(query.filter(HistorialServicio.estado == estado).subquery()))
                 servicios_por_estado[estado.value] = count
             
             return {
@@ -1,14 +1,15 @@
 # 📁 app/controllers/proceso_controller.py
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc
+from sqlalchemy import and_, or_, desc, asc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from typing import Optional, List
 from datetime import datetime, timedelta
 import logging
 
 from app.models.proceso import Proceso
-from app.models.automovil import Automovil
-from app.models.user import Usuario
+from app.models.automovil import Automovil, EstadoAutomovil
+from app.models.user import EstadoUsuario, Usuario
+from app.auth.permissions import Permiso, permission_registry
 from app.schemas.proceso import (
     ProcesoCreate, 
     ProcesoUpdate, 
@@ -24,13 +25,13 @@ logger = logging.getLogger(__name__)
 class ProcesoController:
     
     @staticmethod
-    def crear_proceso(db: Session, proceso_data: ProcesoCreate, usuario_id: int) -> Proceso:
+    async def crear_proceso(db: AsyncSession, proceso_data: ProcesoCreate, usuario_id: int) -> Proceso:
         """Crear un nuevo proceso"""
         try:
             # Verificar que el automóvil existe
-            automovil = db.query(Automovil).filter(
-                and_(Automovil.id == proceso_data.automovil_id, Automovil.activo == True)
-            ).first()
+            automovil = await db.scalar(select(Automovil).filter(
+                and_(Automovil.id == proceso_data.automovil_id, Automovil.estado != EstadoAutomovil.INACTIVO)
+            ))
             
             if not automovil:
                 raise HTTPException(
@@ -40,13 +41,13 @@ class ProcesoController:
             
             # Verificar técnico responsable si se proporciona
             if proceso_data.tecnico_responsable_id:
-                tecnico = db.query(Usuario).filter(
+                tecnico = await db.scalar(select(Usuario).filter(
                     and_(
-                        Usuario.id == proceso_data.tecnico_responsable_id,
-                        Usuario.activo == True,
-                        or_(Usuario.rol.has(nombre="EMPLEADO"), Usuario.rol.has(nombre="ADMINISTRADOR"))
+                        Usuario.usuario_id == proceso_data.tecnico_responsable_id,
+                        Usuario.estado == EstadoUsuario.ACTIVO,
+                        Usuario.rol_id.in_(permission_registry.roles_con(Permiso.PROCESOS_ATENDER))
                     )
-                ).first()
+                ))
                 
                 if not tecnico:
                     raise HTTPException(
@@ -55,7 +56,7 @@ class ProcesoController:
                     )
             
             # Generar código único del proceso
-            codigo_proceso = ProcesoController._generar_codigo_proceso(db)
+            codigo_proceso = await ProcesoController._generar_codigo_proceso(db)
             
             # Crear proceso
             nuevo_proceso = Proceso(
@@ -65,8 +66,8 @@ class ProcesoController:
             )
             
             db.add(nuevo_proceso)
-            db.commit()
-            db.refresh(nuevo_proceso)
+            await db.commit()
+            await db.refresh(nuevo_proceso)
             
             logger.info(f"✅ Proceso creado: {codigo_proceso} para automóvil ID {proceso_data.automovil_id}")
             return nuevo_proceso
@@ -75,29 +76,29 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error creando proceso: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno creando proceso: {str(e)}"
             )
     
     @staticmethod
-    def obtener_proceso_por_id(db: Session, proceso_id: int) -> Optional[Proceso]:
+    async def obtener_proceso_por_id(db: AsyncSession, proceso_id: int) -> Optional[Proceso]:
         """Obtener proceso por ID"""
-        return db.query(Proceso).filter(
+        return await db.scalar(select(Proceso).filter(
             and_(Proceso.id == proceso_id, Proceso.activo == True)
-        ).first()
+        ))
     
     @staticmethod
-    def obtener_proceso_por_codigo(db: Session, codigo_proceso: str) -> Optional[Proceso]:
+    async def obtener_proceso_por_codigo(db: AsyncSession, codigo_proceso: str) -> Optional[Proceso]:
         """Obtener proceso por código"""
-        return db.query(Proceso).filter(
+        return await db.scalar(select(Proceso).filter(
             and_(Proceso.codigo_proceso == codigo_proceso, Proceso.activo == True)
-        ).first()
+        ))
     
     @staticmethod
-    def listar_procesos(
-        db: Session, 
+    async def listar_procesos(
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         automovil_id: Optional[int] = None,
@@ -110,7 +111,7 @@ class ProcesoController:
     ) -> List[Proceso]:
         """Listar procesos con filtros opcionales"""
         try:
-            query = db.query(Proceso).filter(Proceso.activo == True)
+            query = select(Proceso).filter(Proceso.activo == True)
             
             # Aplicar filtros
             if automovil_id:
@@ -137,7 +138,7 @@ class ProcesoController:
             # Ordenar por fecha de creación descendente
             query = query.order_by(desc(Proceso.creado_en))
             
-            return query.offset(skip).limit(limit).all()
+            return (await db.scalars(query.offset(skip).limit(limit))).all()
             
         except Exception as e:
             logger.error(f"❌ Error listando procesos: {str(e)}")
@@ -147,10 +148,10 @@ class ProcesoController:
             )
     
     @staticmethod
-    def actualizar_proceso(db: Session, proceso_id: int, proceso_data: ProcesoUpdate) -> Optional[Proceso]:
+    async def actualizar_proceso(db: AsyncSession, proceso_id: int, proceso_data: ProcesoUpdate) -> Optional[Proceso]:
         """Actualizar proceso existente"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -174,8 +175,8 @@ class ProcesoController:
             # Actualizar timestamp de modificación
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
-            db.refresh(proceso)
+            await db.commit()
+            await db.refresh(proceso)
             
             logger.info(f"✅ Proceso actualizado: {proceso.codigo_proceso}")
             return proceso
@@ -184,17 +185,17 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error actualizando proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno actualizando proceso: {str(e)}"
             )
     
     @staticmethod
-    def iniciar_proceso(db: Session, proceso_id: int, datos_inicio: ProcesoIniciar) -> Proceso:
+    async def iniciar_proceso(db: AsyncSession, proceso_id: int, datos_inicio: ProcesoIniciar) -> Proceso:
         """Iniciar un proceso pendiente"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -220,8 +221,8 @@ class ProcesoController:
             
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
-            db.refresh(proceso)
+            await db.commit()
+            await db.refresh(proceso)
             
             logger.info(f"✅ Proceso iniciado: {proceso.codigo_proceso}")
             return proceso
@@ -230,17 +231,17 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error iniciando proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno iniciando proceso: {str(e)}"
             )
     
     @staticmethod
-    def completar_proceso(db: Session, proceso_id: int, datos_completion: ProcesoCompletar) -> Proceso:
+    async def completar_proceso(db: AsyncSession, proceso_id: int, datos_completion: ProcesoCompletar) -> Proceso:
         """Completar un proceso en progreso"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -284,8 +285,8 @@ class ProcesoController:
             
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
-            db.refresh(proceso)
+            await db.commit()
+            await db.refresh(proceso)
             
             logger.info(f"✅ Proceso completado: {proceso.codigo_proceso}")
             return proceso
@@ -294,17 +295,17 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error completando proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno completando proceso: {str(e)}"
             )
     
     @staticmethod
-    def cancelar_proceso(db: Session, proceso_id: int, motivo: str) -> Proceso:
+    async def cancelar_proceso(db: AsyncSession, proceso_id: int, motivo: str) -> Proceso:
         """Cancelar un proceso"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -322,8 +323,8 @@ class ProcesoController:
             proceso.observaciones_finales = f"PROCESO CANCELADO - Motivo: {motivo}"
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
-            db.refresh(proceso)
+            await db.commit()
+            await db.refresh(proceso)
             
             logger.info(f"✅ Proceso cancelado: {proceso.codigo_proceso}")
             return proceso
@@ -332,17 +333,17 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error cancelando proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno cancelando proceso: {str(e)}"
             )
     
     @staticmethod
-    def realizar_inspeccion(db: Session, proceso_id: int, inspeccion_data: ProcesoInspeccion) -> Proceso:
+    async def realizar_inspeccion(db: AsyncSession, proceso_id: int, inspeccion_data: ProcesoInspeccion) -> Proceso:
         """Realizar inspección de calidad del proceso"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -357,12 +358,12 @@ class ProcesoController:
                 )
             
             # Verificar inspector
-            inspector = db.query(Usuario).filter(
+            inspector = await db.scalar(select(Usuario).filter(
                 and_(
-                    Usuario.id == inspeccion_data.inspector_id,
-                    Usuario.activo == True
+                    Usuario.usuario_id == inspeccion_data.inspector_id,
+                    Usuario.estado == EstadoUsuario.ACTIVO
                 )
-            ).first()
+            ))
             
             if not inspector:
                 raise HTTPException(
@@ -377,8 +378,8 @@ class ProcesoController:
             proceso.inspector_id = inspeccion_data.inspector_id
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
-            db.refresh(proceso)
+            await db.commit()
+            await db.refresh(proceso)
             
             logger.info(f"✅ Inspección realizada para proceso: {proceso.codigo_proceso}")
             return proceso
@@ -387,17 +388,17 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error realizando inspección del proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno realizando inspección: {str(e)}"
             )
     
     @staticmethod
-    def eliminar_proceso(db: Session, proceso_id: int) -> bool:
+    async def eliminar_proceso(db: AsyncSession, proceso_id: int) -> bool:
         """Eliminar proceso (soft delete)"""
         try:
-            proceso = ProcesoController.obtener_proceso_por_id(db, proceso_id)
+            proceso = await ProcesoController.obtener_proceso_por_id(db, proceso_id)
             
             if not proceso:
                 raise HTTPException(
@@ -415,7 +416,7 @@ class ProcesoController:
             proceso.activo = False
             proceso.actualizado_en = datetime.utcnow()
             
-            db.commit()
+            await db.commit()
             
             logger.info(f"✅ Proceso eliminado: {proceso.codigo_proceso}")
             return True
@@ -424,14 +425,14 @@ class ProcesoController:
             raise
         except Exception as e:
             logger.error(f"❌ Error eliminando proceso {proceso_id}: {str(e)}")
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error interno eliminando proceso: {str(e)}"
             )
     
     @staticmethod
-    def _generar_codigo_proceso(db: Session) -> str:
+    async def _generar_codigo_proceso(db: AsyncSession) -> str:
         """Generar código único para el proceso"""
         from datetime import datetime
         
@@ -440,9 +441,9 @@ class ProcesoController:
         fecha_str = fecha_actual.strftime("%Y%m%d")
         
         # Buscar el último proceso del día
-        ultimo_proceso = db.query(Proceso).filter(
+        ultimo_proceso = await db.scalar(select(Proceso).filter(
             Proceso.codigo_proceso.like(f"PRO-{fecha_str}-%")
-        ).order_by(desc(Proceso.codigo_proceso)).first()
+        ).order_by(desc(Proceso.codigo_proceso)))
         
         if ultimo_proceso:
             # Extraer número secuencial del último código
@@ -454,15 +455,15 @@ class ProcesoController:
         return f"PRO-{fecha_str}-{siguiente_numero:04d}"
     
     @staticmethod
-    def obtener_estadisticas_procesos(db: Session, automovil_id: Optional[int] = None) -> dict:
+    async def obtener_estadisticas_procesos(db: AsyncSession, automovil_id: Optional[int] = None) -> dict:
         """Obtener estadísticas de procesos"""
         try:
-            query = db.query(Proceso).filter(Proceso.activo == True)
+            query = select(Proceso).filter(Proceso.activo == True)
             
             if automovil_id:
                 query = query.filter(Proceso.automovil_id == automovil_id)
             
-            procesos = query.all()
+            procesos = (await db.scalars(query)).all()
             
             total_procesos = len(procesos)
             
@@ -1,9 +1,12 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, desc, asc, func, extract
-from fastapi import HTTPException, status
+from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, or_, desc, asc, func, extract, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, UploadFile, status
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from decimal import Decimal
+import os
+import re
 
 from app.models.reporte import Reporte, TipoReporte, EstadoReporte
 from app.models.automovil import Automovil
@@ -15,15 +18,24 @@ from app.schemas.reporte import (
     EstadisticasReportes, FiltrosReporte, ReportesPaginados,
     TemplateReporte
 )
+from app.services.blob_store import blob_store
+
+# Adjuntos de reportes: extensiones permitidas y tamaño máximo
+EXTENSIONES_ADJUNTO = {".jpg", ".jpeg", ".png", ".pdf", ".doc", ".docx"}
+ADJUNTO_MAX_SIZE = 10 * 1024 * 1024
+# Los adjuntos están en el almacén privado y solo se sirven por esta ruta autenticada
+URL_ADJUNTO = re.compile(r"^/api/v1/reportes/(\d+)/adjuntos/([^/?#]+)$")
+# Campos con URLs de archivos separadas por comas
+CAMPOS_ARCHIVOS = {"fotos_antes", "fotos_despues", "documentos_adjuntos"}
 
 class ReporteController:
     
     @staticmethod
-    def crear_reporte(db: Session, reporte_data: ReporteCreate, usuario_id: int) -> ReporteResponse:
+    async def crear_reporte(db: AsyncSession, reporte_data: ReporteCreate, usuario_id: int) -> ReporteResponse:
         """Crea un nuevo reporte"""
         try:
             # Verificar que el automóvil existe
-            automovil = db.query(Automovil).filter(Automovil.id == reporte_data.automovil_id).first()
+            automovil = await db.scalar(select(Automovil).filter(Automovil.id == reporte_data.automovil_id))
             if not automovil:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -32,7 +44,7 @@ class ReporteController:
             
             # Verificar que el proceso existe (si se proporciona)
             if reporte_data.proceso_id:
-                proceso = db.query(Proceso).filter(Proceso.id == reporte_data.proceso_id).first()
+                proceso = await db.scalar(select(Proceso).filter(Proceso.id == reporte_data.proceso_id))
                 if not proceso:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -41,7 +53,7 @@ class ReporteController:
             
             # Verificar que el técnico existe (si se proporciona)
             if reporte_data.tecnico_responsable_id:
-                tecnico = db.query(User).filter(User.id == reporte_data.tecnico_responsable_id).first()
+                tecnico = await db.scalar(select(User).filter(User.id == reporte_data.tecnico_responsable_id))
                 if not tecnico:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -57,29 +69,33 @@ class ReporteController:
             # Calcular costo total
             db_reporte.calcular_costo_total()
             
+            # Los adjuntos del almacén solo se agregan subiéndolos
+            for field in CAMPOS_ARCHIVOS:
+                await ReporteController._ajustar_referencias(db, None, None, getattr(db_reporte, field))
+            
             db.add(db_reporte)
-            db.flush()  # Para obtener el ID
+            await db.flush()  # Para obtener el ID
             
             # Generar código de reporte único
             db_reporte.codigo_reporte = db_reporte.generar_codigo_reporte()
             
-            db.commit()
-            db.refresh(db_reporte)
+            await db.commit()
+            await db.refresh(db_reporte)
             
             return ReporteResponse.from_orm(db_reporte)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al crear reporte: {str(e)}"
             )
     
     @staticmethod
-    def obtener_reportes(
-        db: Session, 
+    async def obtener_reportes(
+        db: AsyncSession, 
         skip: int = 0, 
         limit: int = 100,
         filtros: Optional[FiltrosReporte] = None,
@@ -88,10 +104,10 @@ class ReporteController:
     ) -> ReportesPaginados:
         """Obtiene reportes con filtros y paginación"""
         try:
-            query = db.query(Reporte).options(
-                joinedload(Reporte.automovil),
-                joinedload(Reporte.usuario_creador),
-                joinedload(Reporte.tecnico_responsable)
+            query = select(Reporte).options(
+                selectinload(Reporte.automovil),
+                selectinload(Reporte.usuario_creador),
+                selectinload(Reporte.tecnico_responsable)
             )
             
             # Aplicar filtros de seguridad (no admin solo ve sus reportes)
@@ -146,10 +162,10 @@ class ReporteController:
             query = query.order_by(desc(Reporte.created_at))
             
             # Contar total
-            total = query.count()
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
             
             # Aplicar paginación
-            reportes = query.offset(skip).limit(limit).all()
+            reportes = (await db.scalars(query.offset(skip).limit(limit))).all()
             
             return ReportesPaginados(
                 reportes=[ReporteSimple.from_orm(r) for r in reportes],
@@ -166,17 +182,17 @@ class ReporteController:
             )
     
     @staticmethod
-    def obtener_reporte_por_id(db: Session, reporte_id: int, usuario_id: Optional[int] = None, es_admin: bool = False) -> ReporteResponse:
+    async def obtener_reporte_por_id(db: AsyncSession, reporte_id: int, usuario_id: Optional[int] = None, es_admin: bool = False) -> ReporteResponse:
         """Obtiene un reporte por ID"""
         try:
-            query = db.query(Reporte).options(
-                joinedload(Reporte.automovil),
-                joinedload(Reporte.proceso),
-                joinedload(Reporte.usuario_creador),
-                joinedload(Reporte.tecnico_responsable)
+            query = select(Reporte).options(
+                selectinload(Reporte.automovil),
+                selectinload(Reporte.proceso),
+                selectinload(Reporte.usuario_creador),
+                selectinload(Reporte.tecnico_responsable)
             )
             
-            reporte = query.filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(query.filter(Reporte.id == reporte_id))
             
             if not reporte:
                 raise HTTPException(
@@ -203,10 +219,10 @@ class ReporteController:
             )
     
     @staticmethod
-    def actualizar_reporte(db: Session, reporte_id: int, reporte_data: ReporteUpdate, usuario_id: int, es_admin: bool = False) -> ReporteResponse:
+    async def actualizar_reporte(db: AsyncSession, reporte_id: int, reporte_data: ReporteUpdate, usuario_id: int, es_admin: bool = False) -> ReporteResponse:
         """Actualiza un reporte existente"""
         try:
-            reporte = db.query(Reporte).filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(select(Reporte).filter(Reporte.id == reporte_id))
             
             if not reporte:
                 raise HTTPException(
@@ -231,7 +247,7 @@ class ReporteController:
             
             # Validar técnico responsable si se proporciona
             if reporte_data.tecnico_responsable_id:
-                tecnico = db.query(User).filter(User.id == reporte_data.tecnico_responsable_id).first()
+                tecnico = await db.scalar(select(User).filter(User.id == reporte_data.tecnico_responsable_id))
                 if not tecnico:
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
@@ -240,6 +256,8 @@ class ReporteController:
             
             # Actualizar campos
             update_data = reporte_data.dict(exclude_unset=True)
+            for field in CAMPOS_ARCHIVOS & update_data.keys():
+                await ReporteController._ajustar_referencias(db, reporte.id, getattr(reporte, field), update_data[field])
             for field, value in update_data.items():
                 setattr(reporte, field, value)
             
@@ -249,25 +267,25 @@ class ReporteController:
             # Recalcular costo total
             reporte.calcular_costo_total()
             
-            db.commit()
-            db.refresh(reporte)
+            await db.commit()
+            await db.refresh(reporte)
             
             return ReporteResponse.from_orm(reporte)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al actualizar reporte: {str(e)}"
             )
     
     @staticmethod
-    def eliminar_reporte(db: Session, reporte_id: int, usuario_id: int, es_admin: bool = False) -> dict:
+    async def eliminar_reporte(db: AsyncSession, reporte_id: int, usuario_id: int, es_admin: bool = False) -> dict:
         """Elimina un reporte"""
         try:
-            reporte = db.query(Reporte).filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(select(Reporte).filter(Reporte.id == reporte_id))
             
             if not reporte:
                 raise HTTPException(
@@ -289,25 +307,116 @@ class ReporteController:
                     detail=f"No se puede eliminar un reporte en estado {reporte.estado.value}"
                 )
             
-            db.delete(reporte)
-            db.commit()
+            # Los archivos del reporte pierden su referencia en el almacén
+            for field in CAMPOS_ARCHIVOS:
+                await ReporteController._ajustar_referencias(db, reporte.id, getattr(reporte, field), None)
+            
+            await db.delete(reporte)
+            await db.commit()
             
             return {"message": "Reporte eliminado exitosamente"}
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al eliminar reporte: {str(e)}"
             )
     
     @staticmethod
-    def cambiar_estado_reporte(db: Session, reporte_id: int, cambio_estado: CambiarEstadoReporte, usuario_id: int, es_admin: bool = False) -> ReporteResponse:
+    async def subir_adjunto_reporte(db: AsyncSession, reporte_id: int, file: UploadFile, descripcion: Optional[str], usuario_id: int, es_admin: bool = False) -> dict:
+        """Adjuntar un archivo a un reporte; el contenido se guarda una sola vez en el almacén"""
+        reporte = await ReporteController._reporte_con_acceso(db, reporte_id, usuario_id, es_admin)
+        
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        if extension not in EXTENSIONES_ADJUNTO:
+            raise ValueError(f"Tipo de archivo no permitido. Permitidos: {', '.join(sorted(EXTENSIONES_ADJUNTO))}")
+        
+        blob = await blob_store.store(db, file, extension, ADJUNTO_MAX_SIZE)
+        url = ReporteController.url_adjunto(reporte_id, blob.clave)
+        adjuntos = ReporteController._urls(reporte.documentos_adjuntos)
+        if url in adjuntos:
+            # Ya adjunto: no suma otra referencia
+            await blob_store.release(db, blob.clave)
+        else:
+            adjuntos.append(url)
+            reporte.documentos_adjuntos = ",".join(adjuntos)
+        await db.commit()
+        
+        return {
+            "message": "Archivo adjuntado exitosamente",
+            "reporte_id": reporte_id,
+            "url": url,
+            "nombre_original": file.filename,
+            "tamano": blob.tamano,
+            "descripcion": descripcion
+        }
+    
+    @staticmethod
+    async def obtener_adjunto(db: AsyncSession, reporte_id: int, nombre: str, usuario_id: int, es_admin: bool = False) -> str:
+        """Ruta en disco de un archivo del almacén que el reporte referencia"""
+        reporte = await ReporteController._reporte_con_acceso(db, reporte_id, usuario_id, es_admin)
+        
+        url = ReporteController.url_adjunto(reporte_id, nombre)
+        referenciado = any(url in ReporteController._urls(getattr(reporte, field)) for field in CAMPOS_ARCHIVOS)
+        if not referenciado or not blob_store.es_clave(nombre) or not os.path.exists(blob_store.path_for(nombre)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archivo no encontrado"
+            )
+        return blob_store.path_for(nombre)
+    
+    @staticmethod
+    async def _reporte_con_acceso(db: AsyncSession, reporte_id: int, usuario_id: int, es_admin: bool) -> Reporte:
+        """Reporte visible para el usuario: admin, creador o técnico responsable"""
+        reporte = await db.scalar(select(Reporte).filter(Reporte.id == reporte_id))
+        if not reporte:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reporte no encontrado"
+            )
+        if not es_admin and usuario_id not in (reporte.usuario_creador_id, reporte.tecnico_responsable_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tiene permisos para ver este reporte"
+            )
+        return reporte
+    
+    @staticmethod
+    def url_adjunto(reporte_id: int, clave: str) -> str:
+        return f"/api/v1/reportes/{reporte_id}/adjuntos/{clave}"
+    
+    @staticmethod
+    def _urls(campo: Optional[str]) -> List[str]:
+        """URLs de un campo separado por comas"""
+        return [url.strip() for url in (campo or "").split(",") if url.strip()]
+    
+    @staticmethod
+    async def _ajustar_referencias(db: AsyncSession, reporte_id: Optional[int], anterior: Optional[str], nuevo: Optional[str]):
+        """
+        Quitar las referencias del almacén de los adjuntos que salen del campo.
+        Un adjunto nuevo solo entra por subir_adjunto_reporte: una URL escrita a
+        mano apuntaría a un archivo sin referencia (o de otro reporte).
+        """
+        antes = set(ReporteController._urls(anterior))
+        despues = set(ReporteController._urls(nuevo))
+        if any(URL_ADJUNTO.match(url) for url in despues - antes):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Los adjuntos se agregan con la subida de archivos del reporte"
+            )
+        for url in antes - despues:
+            match = URL_ADJUNTO.match(url)
+            if match and int(match.group(1)) == reporte_id:
+                await blob_store.release(db, match.group(2))
+    
+    @staticmethod
+    async def cambiar_estado_reporte(db: AsyncSession, reporte_id: int, cambio_estado: CambiarEstadoReporte, usuario_id: int, es_admin: bool = False) -> ReporteResponse:
         """Cambia el estado de un reporte"""
         try:
-            reporte = db.query(Reporte).filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(select(Reporte).filter(Reporte.id == reporte_id))
             
             if not reporte:
                 raise HTTPException(
@@ -345,25 +454,27 @@ class ReporteController:
             if cambio_estado.nuevo_estado == EstadoReporte.COMPLETADO:
                 reporte.fecha_finalizacion = datetime.now()
             
-            db.commit()
-            db.refresh(reporte)
+            await db.commit()
+            await db.refresh(reporte)
             
             return ReporteResponse.from_orm(reporte)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al cambiar estado del reporte: {str(e)}"
             )
     
     @staticmethod
-    def registrar_aprobacion_cliente(db: Session, reporte_id: int, aprobacion: AprobacionCliente, usuario_id: int) -> ReporteResponse:
+    async def registrar_aprobacion_cliente(db: AsyncSession, reporte_id: int, aprobacion: AprobacionCliente, usuario_id: int) -> ReporteResponse:
         """Registra la aprobación del cliente"""
         try:
-            reporte = db.query(Reporte).filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(
+                select(Reporte).options(selectinload(Reporte.automovil)).filter(Reporte.id == reporte_id)
+            )
             
             if not reporte:
                 raise HTTPException(
@@ -398,25 +509,25 @@ class ReporteController:
             else:
                 reporte.estado = EstadoReporte.RECHAZADO
             
-            db.commit()
-            db.refresh(reporte)
+            await db.commit()
+            await db.refresh(reporte)
             
             return ReporteResponse.from_orm(reporte)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al registrar aprobación del cliente: {str(e)}"
             )
     
     @staticmethod
-    def firmar_reporte(db: Session, reporte_id: int, firma: FirmaReporte, usuario_id: int) -> ReporteResponse:
+    async def firmar_reporte(db: AsyncSession, reporte_id: int, firma: FirmaReporte, usuario_id: int) -> ReporteResponse:
         """Registra la firma digital del reporte"""
         try:
-            reporte = db.query(Reporte).filter(Reporte.id == reporte_id).first()
+            reporte = await db.scalar(select(Reporte).filter(Reporte.id == reporte_id))
             
             if not reporte:
                 raise HTTPException(
@@ -442,22 +553,22 @@ class ReporteController:
             reporte.firma_tecnico = firma.firma_digital
             reporte.fecha_firma = datetime.now()
             
-            db.commit()
-            db.refresh(reporte)
+            await db.commit()
+            await db.refresh(reporte)
             
             return ReporteResponse.from_orm(reporte)
             
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al firmar reporte: {str(e)}"
             )
     
     @staticmethod
-    def obtener_estadisticas_reportes(db: Session, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> EstadisticasReportes:
+    async def obtener_estadisticas_reportes(db: AsyncSession, fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> EstadisticasReportes:
         """Obtiene estadísticas de reportes"""
         try:
             # Filtro de fechas por defecto (último mes)
@@ -466,44 +577,44 @@ class ReporteController:
             if not fecha_fin:
                 fecha_fin = datetime.now()
             
-            query_base = db.query(Reporte).filter(
+            query_base = select(Reporte).filter(
                 Reporte.created_at >= fecha_inicio,
                 Reporte.created_at <= fecha_fin
             )
             
             # Conteos por estado
-            total_reportes = query_base.count()
-            reportes_pendientes = query_base.filter(Reporte.estado == EstadoReporte.PENDIENTE).count()
-            reportes_en_proceso = query_base.filter(Reporte.estado == EstadoReporte.EN_PROCESO).count()
-            reportes_completados = query_base.filter(Reporte.estado == EstadoReporte.COMPLETADO).count()
-            reportes_aprobados = query_base.filter(Reporte.estado == EstadoReporte.APROBADO).count()
+            total_reportes = await db.scalar(select(func.count()).select_from(query_base.subquery()))
+            reportes_pendientes = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.estado == EstadoReporte.PENDIENTE).subquery()))
+            reportes_en_proceso = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.estado == EstadoReporte.EN_PROCESO).subquery()))
+            reportes_completados = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.estado == EstadoReporte.COMPLETADO).subquery()))
+            reportes_aprobados = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.estado == EstadoReporte.APROBADO).subquery()))
             
             # Conteos por tipo
-            reportes_servicio = query_base.filter(Reporte.tipo_reporte == TipoReporte.SERVICIO).count()
-            reportes_mantenimiento = query_base.filter(Reporte.tipo_reporte == TipoReporte.MANTENIMIENTO).count()
-            reportes_reparacion = query_base.filter(Reporte.tipo_reporte == TipoReporte.REPARACION).count()
-            reportes_inspeccion = query_base.filter(Reporte.tipo_reporte == TipoReporte.INSPECCION).count()
+            reportes_servicio = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.tipo_reporte == TipoReporte.SERVICIO).subquery()))
+            reportes_mantenimiento = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.tipo_reporte == TipoReporte.MANTENIMIENTO).subquery()))
+            reportes_reparacion = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.tipo_reporte == TipoReporte.REPARACION).subquery()))
+            reportes_inspeccion = await db.scalar(select(func.count()).select_from(query_base.filter(Reporte.tipo_reporte == TipoReporte.INSPECCION).subquery()))
             
             # Satisfacción promedio
-            satisfaccion_promedio = db.query(func.avg(Reporte.nivel_satisfaccion)).filter(
+            satisfaccion_promedio = await db.scalar(select(func.avg(Reporte.nivel_satisfaccion)).filter(
                 Reporte.created_at >= fecha_inicio,
                 Reporte.created_at <= fecha_fin,
                 Reporte.nivel_satisfaccion.isnot(None)
-            ).scalar() or 0
+            )) or 0
             
             # Costo promedio
-            costo_promedio = db.query(func.avg(Reporte.costo_total)).filter(
+            costo_promedio = await db.scalar(select(func.avg(Reporte.costo_total)).filter(
                 Reporte.created_at >= fecha_inicio,
                 Reporte.created_at <= fecha_fin,
                 Reporte.costo_total.isnot(None)
-            ).scalar() or 0
+            )) or 0
             
             # Tiempo promedio de resolución (en días)
-            reportes_con_tiempo = db.query(Reporte).filter(
+            reportes_con_tiempo = (await db.scalars(select(Reporte).filter(
                 Reporte.created_at >= fecha_inicio,
                 Reporte.created_at <= fecha_fin,
                 Reporte.fecha_finalizacion.isnot(None)
-            ).all()
+            ))).all()
             
             tiempo_promedio_resolucion = 0
             if reportes_con_tiempo:
@@ -534,11 +645,11 @@ class ReporteController:
             )
     
     @staticmethod
-    def obtener_reportes_por_automovil(db: Session, automovil_id: int, usuario_id: Optional[int] = None, es_admin: bool = False) -> List[ReporteSimple]:
+    async def obtener_reportes_por_automovil(db: AsyncSession, automovil_id: int, usuario_id: Optional[int] = None, es_admin: bool = False) -> List[ReporteSimple]:
         """Obtiene todos los reportes de un automóvil específico"""
         try:
             # Verificar que el automóvil existe
-            automovil = db.query(Automovil).filter(Automovil.id == automovil_id).first()
+            automovil = await db.scalar(select(Automovil).filter(Automovil.id == automovil_id))
             if not automovil:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -553,12 +664,12 @@ class ReporteController:
                         detail="No tiene permisos para ver los reportes de este automóvil"
                     )
             
-            reportes = db.query(Reporte).options(
-                joinedload(Reporte.usuario_creador),
-                joinedload(Reporte.tecnico_responsable)
+            reportes = (await db.scalars(select(Reporte).options(
+                selectinload(Reporte.usuario_creador),
+                selectinload(Reporte.tecnico_responsable)
             ).filter(
                 Reporte.automovil_id == automovil_id
-            ).order_by(desc(Reporte.created_at)).all()
+            ).order_by(desc(Reporte.created_at)))).all()
             
             return [ReporteSimple.from_orm(r) for r in reportes]
             
@@ -571,7 +682,7 @@ class ReporteController:
             )
     
     @staticmethod
-    def obtener_template_reporte(db: Session, tipo_reporte: TipoReporte) -> TemplateReporte:
+    async def obtener_template_reporte(db: AsyncSession, tipo_reporte: TipoReporte) -> TemplateReporte:
         """Obtiene un template base para crear reportes según el tipo"""
         try:
             templates = {
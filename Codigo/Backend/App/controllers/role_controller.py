@@ -1,9 +1,13 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from typing import List
 from app.models.role import Role
 from app.models.user import User
 from app.schemas.role import RoleCreate, RoleUpdate, RoleResponse, RoleListResponse, RoleAssignRequest
+from app.auth.principal_cache import principal_cache
+from app.auth.permissions import permission_registry
+from app.auth.permission_sync import permission_sync
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,12 +15,21 @@ logger = logging.getLogger(__name__)
 class RoleController:
     
     @staticmethod
-    def get_all_roles(db: Session) -> RoleListResponse:
+    async def load_permission_registry(db: AsyncSession):
+        """
+        Compila los permisos de todos los roles en la tabla en memoria de este
+        worker; tras un cambio, permission_sync avisa a los demás
+        """
+        roles = (await db.scalars(select(Role))).all()
+        permission_registry.load(roles)
+    
+    @staticmethod
+    async def get_all_roles(db: AsyncSession) -> RoleListResponse:
         """
         Obtiene todos los roles del sistema
         """
         try:
-            roles = db.query(Role).all()
+            roles = (await db.scalars(select(Role))).all()
             
             return RoleListResponse(
                 roles=[RoleResponse.from_orm(role) for role in roles],
@@ -31,12 +44,12 @@ class RoleController:
             )
     
     @staticmethod
-    def get_role_by_id(db: Session, role_id: int) -> Role:
+    async def get_role_by_id(db: AsyncSession, role_id: int) -> Role:
         """
         Obtiene un rol por su ID
         """
         try:
-            role = db.query(Role).filter(Role.id == role_id).first()
+            role = await db.scalar(select(Role).filter(Role.id == role_id))
             
             if not role:
                 raise HTTPException(
@@ -56,7 +69,7 @@ class RoleController:
             )
     
     @staticmethod
-    def create_role(db: Session, role_data: RoleCreate, current_user: User) -> Role:
+    async def create_role(db: AsyncSession, role_data: RoleCreate, current_user: User) -> Role:
         """
         Crea un nuevo rol (solo admin)
         """
@@ -69,7 +82,7 @@ class RoleController:
                 )
             
             # Verificar si el rol ya existe
-            existing_role = db.query(Role).filter(Role.nombre == role_data.nombre).first()
+            existing_role = await db.scalar(select(Role).filter(Role.nombre == role_data.nombre))
             if existing_role:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -80,8 +93,10 @@ class RoleController:
             new_role = Role(nombre=role_data.nombre)
             
             db.add(new_role)
-            db.commit()
-            db.refresh(new_role)
+            await db.commit()
+            await db.refresh(new_role)
+            await RoleController.load_permission_registry(db)
+            await permission_sync.notify_changed()
             
             logger.info(f"Rol '{new_role.nombre}' creado por usuario {current_user.usuario_id}")
             return new_role
@@ -89,7 +104,7 @@ class RoleController:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error creando rol: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -97,7 +112,7 @@ class RoleController:
             )
     
     @staticmethod
-    def update_role(db: Session, role_id: int, role_update: RoleUpdate, current_user: User) -> Role:
+    async def update_role(db: AsyncSession, role_id: int, role_update: RoleUpdate, current_user: User) -> Role:
         """
         Actualiza un rol existente (solo admin)
         """
@@ -110,7 +125,7 @@ class RoleController:
                 )
             
             # Obtener rol a actualizar
-            role = db.query(Role).filter(Role.id == role_id).first()
+            role = await db.scalar(select(Role).filter(Role.id == role_id))
             if not role:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -119,7 +134,7 @@ class RoleController:
             
             # Verificar que no se esté cambiando a un nombre que ya existe
             if role_update.nombre and role_update.nombre != role.nombre:
-                existing_role = db.query(Role).filter(Role.nombre == role_update.nombre).first()
+                existing_role = await db.scalar(select(Role).filter(Role.nombre == role_update.nombre))
                 if existing_role:
                     raise HTTPException(
                         status_code=status.HTTP_400_BAD_REQUEST,
@@ -130,8 +145,12 @@ class RoleController:
             if role_update.nombre:
                 role.nombre = role_update.nombre
             
-            db.commit()
-            db.refresh(role)
+            await db.commit()
+            await db.refresh(role)
+            # El nombre del rol define sus permisos y va en las copias cacheadas de sus usuarios
+            await RoleController.load_permission_registry(db)
+            await permission_sync.notify_changed()
+            principal_cache.clear()
             
             logger.info(f"Rol {role_id} actualizado por usuario {current_user.usuario_id}")
             return role
@@ -139,7 +158,7 @@ class RoleController:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error actualizando rol {role_id}: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -147,7 +166,7 @@ class RoleController:
             )
     
     @staticmethod
-    def delete_role(db: Session, role_id: int, current_user: User) -> dict:
+    async def delete_role(db: AsyncSession, role_id: int, current_user: User) -> dict:
         """
         Elimina un rol (solo admin)
         """
@@ -160,7 +179,7 @@ class RoleController:
                 )
             
             # Obtener rol a eliminar
-            role = db.query(Role).filter(Role.id == role_id).first()
+            role = await db.scalar(select(Role).filter(Role.id == role_id))
             if not role:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -168,7 +187,9 @@ class RoleController:
                 )
             
             # Verificar que no haya usuarios con este rol
-            users_with_role = db.query(User).filter(User.rol_id == role_id).count()
+            users_with_role = await db.scalar(
+                select(func.count()).select_from(User).filter(User.rol_id == role_id)
+            )
             if users_with_role > 0:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -177,8 +198,10 @@ class RoleController:
             
             # Eliminar rol
             role_name = role.nombre
-            db.delete(role)
-            db.commit()
+            await db.delete(role)
+            await db.commit()
+            await RoleController.load_permission_registry(db)
+            await permission_sync.notify_changed()
             
             logger.info(f"Rol '{role_name}' eliminado por usuario {current_user.usuario_id}")
             return {"message": f"Rol '{role_name}' eliminado exitosamente"}
@@ -186,7 +209,7 @@ class RoleController:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error eliminando rol {role_id}: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -194,7 +217,7 @@ class RoleController:
             )
     
     @staticmethod
-    def assign_role_to_user(db: Session, user_id: int, role_assign: RoleAssignRequest, current_user: User) -> User:
+    async def assign_role_to_user(db: AsyncSession, user_id: int, role_assign: RoleAssignRequest, current_user: User) -> User:
         """
         Asigna un rol a un usuario (solo admin)
         """
@@ -207,7 +230,7 @@ class RoleController:
                 )
             
             # Verificar que el usuario existe
-            user = db.query(User).filter(User.usuario_id == user_id).first()
+            user = await db.scalar(select(User).filter(User.usuario_id == user_id))
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -215,7 +238,7 @@ class RoleController:
                 )
             
             # Verificar que el rol existe
-            role = db.query(Role).filter(Role.id == role_assign.rol_id).first()
+            role = await db.scalar(select(Role).filter(Role.id == role_assign.rol_id))
             if not role:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -226,8 +249,9 @@ class RoleController:
             old_role_id = user.rol_id
             user.rol_id = role_assign.rol_id
             
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
+            principal_cache.invalidate_user(user_id)
             
             logger.info(f"Rol {role_assign.rol_id} asignado al usuario {user_id} por admin {current_user.usuario_id}")
             return user
@@ -235,7 +259,7 @@ class RoleController:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error asignando rol al usuario {user_id}: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,26 +1,58 @@
 # app/controllers/user_controller.py
 
+import io
 import os
+import re
+import csv
+import json
 import math
+import asyncio
 import logging
-from uuid import uuid4
-from typing import Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 from fastapi import HTTPException, status, UploadFile
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.user import User
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import func, select, update, insert, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, async_engine
+from app.models.user import User, EstadoUsuario, normalizar_busqueda, texto_busqueda
 from app.models.role import Role
-from app.schemas.user import UserCreate, UserUpdate, UserResponse, UserListResponse, PasswordChangeRequest
+from app.models.refresh_token import RefreshToken
+from app.schemas.user import UserCreate, UserUpdate, UserResponse, UserListResponse, PasswordChangeRequest, UserImportResponse
 from app.auth.password_handler import password_handler
+from app.auth.principal_cache import principal_cache
 from app.config import settings
+from app.services.blob_store import public_blob_store
 
 logger = logging.getLogger(__name__)
 
+# Columnas de la exportación masiva (nunca incluye password_hash)
+EXPORT_COLUMNS = (
+    "usuario_id", "nombre_completo", "correo", "telefono", "tipo_identificacion",
+    "numero_identificacion", "estado", "rol_id", "fecha_registro"
+)
+# Máximo de errores devueltos al rechazar una importación
+MAX_IMPORT_ERRORS = 100
+# Con count_mode="approx" el conteo filtrado se detiene en este tope
+APPROX_COUNT_CAP = 1000
+# InnoDB ignora en FULLTEXT las palabras más cortas que innodb_ft_min_token_size
+FULLTEXT_MIN_TOKEN = 3
+# Rol asignado cuando no se indica uno (cliente)
+ROL_POR_DEFECTO = 3
+# Tamaño máximo de la foto de perfil
+FOTO_PERFIL_MAX_SIZE = 5 * 1024 * 1024
+
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for inicio in range(0, len(items), size):
+        yield items[inicio:inicio + size]
+
 class UserController:
 
     @staticmethod
-    def get_user_by_id(db: Session, user_id: int, current_user: User) -> User:
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+    async def get_user_by_id(db: AsyncSession, user_id: int, current_user: User) -> User:
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         if not current_user.is_admin() and current_user.usuario_id != user_id:
@@ -28,27 +60,25 @@ class UserController:
         return user
 
     @staticmethod
-    def get_users_paginated(db: Session, current_user: User, page=1, size=10, search=None, role_filter=None, status_filter=None):
+    async def get_users_paginated(db: AsyncSession, current_user: User, page=1, size=10, search=None, role_filter=None, status_filter=None, count_mode="exact"):
         if not current_user.is_admin():
             raise HTTPException(status_code=403, detail="Solo los administradores pueden listar usuarios")
 
-        query = db.query(User)
-
+        conditions = []
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                (User.nombre_completo.ilike(search_term)) |
-                (User.correo.ilike(search_term)) |
-                (User.numero_identificacion.ilike(search_term))
-            )
+            search_condition = UserController._search_condition(search)
+            if search_condition is not None:
+                conditions.append(search_condition)
         if role_filter:
-            query = query.join(Role).filter(Role.nombre == role_filter)
+            conditions.append(User.rol_id.in_(select(Role.id).filter(Role.nombre == role_filter)))
         if status_filter:
-            query = query.filter(User.estado == status_filter)
+            conditions.append(User.estado == status_filter)
 
-        total = query.count()
+        total, total_aproximado = await UserController._count_users(db, conditions, count_mode)
         offset = (page - 1) * size
-        users = query.offset(offset).limit(size).all()
+        users = (await db.scalars(
+            select(User).filter(*conditions).order_by(User.usuario_id).offset(offset).limit(size)
+        )).all()
         total_pages = math.ceil(total / size) if total > 0 else 1
 
         return UserListResponse(
@@ -56,15 +86,81 @@ class UserController:
             total=total,
             page=page,
             size=size,
-            total_pages=total_pages
+            total_pages=total_pages,
+            total_aproximado=total_aproximado
         )
 
     @staticmethod
-    def create_user(db: Session, user_data: UserCreate) -> User:
-        if db.query(User).filter(User.correo == user_data.correo).first():
+    def _search_condition(search: str):
+        """
+        Condición indexada para la búsqueda de usuarios: prefijo sobre correo o
+        documento cuando el término lo parece y, si no, FULLTEXT (MySQL) sobre la
+        columna normalizada busqueda. Un término que empieza por "@" (p. ej.
+        "@gmail.com") es un fragmento de dominio y sigue buscándose dentro del correo.
+        """
+        termino = normalizar_busqueda(search)
+        if not termino:
+            return None
+        if "@" in termino and not termino.startswith("@"):
+            return User.correo.startswith(termino, autoescape=True)
+        if termino.replace("-", "").isdigit():
+            return User.numero_identificacion.startswith(termino, autoescape=True)
+
+        if async_engine.dialect.name == "mysql":
+            palabras = [p for p in re.split(r"\W+", termino) if len(p) >= FULLTEXT_MIN_TOKEN]
+            if palabras:
+                return User.busqueda.match(" ".join(f"+{p}*" for p in palabras))
+            # Solo palabras cortas: prefijo sobre el nombre (índice B-tree de busqueda)
+            return User.busqueda.startswith(termino, autoescape=True)
+        return User.busqueda.contains(termino, autoescape=True)
+
+    @staticmethod
+    async def _count_users(db: AsyncSession, conditions: List, count_mode: str) -> Tuple[int, bool]:
+        """Total de usuarios (exacto o aproximado) y si el valor es aproximado"""
+        if count_mode == "approx":
+            if not conditions and async_engine.dialect.name == "mysql":
+                # Estimación de InnoDB: no recorre la tabla
+                estimado = await db.scalar(text(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'usuarios'"
+                ))
+                if estimado is not None:
+                    return int(estimado), True
+            limitado = select(User.usuario_id).filter(*conditions).limit(APPROX_COUNT_CAP).subquery()
+            total = await db.scalar(select(func.count()).select_from(limitado))
+            return total, total >= APPROX_COUNT_CAP
+
+        total = await db.scalar(select(func.count(User.usuario_id)).filter(*conditions))
+        return total, False
+
+    @staticmethod
+    async def backfill_search_column(db: AsyncSession) -> int:
+        """Completar busqueda en usuarios que no la tengan (bases anteriores a la columna)"""
+        total = 0
+        while True:
+            pendientes = (await db.execute(
+                select(User.usuario_id, User.nombre_completo, User.correo, User.numero_identificacion)
+                .filter(User.busqueda.is_(None))
+                .limit(settings.USER_BULK_CHUNK_SIZE)
+            )).all()
+            if not pendientes:
+                break
+            await db.execute(update(User), [
+                {"usuario_id": usuario_id, "busqueda": texto_busqueda(nombre, correo, numero)}
+                for usuario_id, nombre, correo, numero in pendientes
+            ])
+            await db.commit()
+            total += len(pendientes)
+        if total:
+            logger.info(f"Columna de búsqueda completada para {total} usuarios")
+        return total
+
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
+        if await db.scalar(select(User).filter(User.correo == user_data.correo)):
             raise HTTPException(status_code=400, detail="El correo ya está registrado")
 
-        hashed_password = password_handler.hash_password(user_data.password)
+        hashed_password = await password_handler.hash_password_async(user_data.password)
         db_user = User(
             correo=user_data.correo,
             nombre_completo=user_data.nombre_completo,
@@ -72,18 +168,18 @@ class UserController:
             telefono=user_data.telefono,
             tipo_identificacion=user_data.tipo_identificacion,
             password_hash=hashed_password,
-            rol_id=user_data.rol_id or 3,  # cliente por defecto
+            rol_id=user_data.rol_id or ROL_POR_DEFECTO,
             estado="activo"
         )
 
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
 
     @staticmethod
-    def update_user(db: Session, user_id: int, user_update: UserUpdate, current_user: User) -> User:
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+    async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate, current_user: User) -> User:
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
@@ -94,35 +190,43 @@ class UserController:
             raise HTTPException(status_code=403, detail="Solo los administradores pueden cambiar roles o estado")
 
         if user_update.correo and user_update.correo != user.correo:
-            existing = db.query(User).filter(User.correo == user_update.correo, User.usuario_id != user_id).first()
+            existing = await db.scalar(
+                select(User).filter(User.correo == user_update.correo, User.usuario_id != user_id)
+            )
             if existing:
                 raise HTTPException(status_code=400, detail="El correo ya está en uso")
 
         if user_update.numero_identificacion and user_update.numero_identificacion != user.numero_identificacion:
             tipo_id = user_update.tipo_identificacion or user.tipo_identificacion
-            existing = db.query(User).filter(
+            existing = await db.scalar(select(User).filter(
                 User.numero_identificacion == user_update.numero_identificacion,
                 User.tipo_identificacion == tipo_id,
                 User.usuario_id != user_id
-            ).first()
+            ))
             if existing:
                 raise HTTPException(status_code=400, detail="El número de identificación ya está en uso")
 
         if user_update.rol_id:
-            if not db.query(Role).filter(Role.id == user_update.rol_id).first():
+            if not await db.scalar(select(Role).filter(Role.id == user_update.rol_id)):
                 raise HTTPException(status_code=400, detail="Rol no válido")
 
         update_data = user_update.dict(exclude_unset=True)
+        if "foto_perfil" in update_data and update_data["foto_perfil"] != user.foto_perfil:
+            # Las fotos del almacén solo se asignan subiéndolas (update_user_with_file)
+            if public_blob_store.es_url(update_data["foto_perfil"]):
+                raise HTTPException(status_code=400, detail="La foto de perfil se cambia subiendo el archivo")
+            await public_blob_store.release(db, public_blob_store.clave_from_url(user.foto_perfil))
         for field, value in update_data.items():
             setattr(user, field, value)
 
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate_user(user_id)
         return user
 
     @staticmethod
-    def update_user_with_file(
-        db: Session,
+    async def update_user_with_file(
+        db: AsyncSession,
         user_id: int,
         current_user: User,
         nombre_completo: str,
@@ -132,7 +236,7 @@ class UserController:
         numero_identificacion: str,
         foto_perfil: Optional[UploadFile] = None
     ) -> User:
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
@@ -140,28 +244,23 @@ class UserController:
             raise HTTPException(status_code=403, detail="No tienes permisos para editar este usuario")
 
         if correo != user.correo:
-            if db.query(User).filter(User.correo == correo, User.usuario_id != user_id).first():
+            if await db.scalar(select(User).filter(User.correo == correo, User.usuario_id != user_id)):
                 raise HTTPException(status_code=400, detail="El correo ya está en uso")
 
         if numero_identificacion != user.numero_identificacion:
-            if db.query(User).filter(
+            if await db.scalar(select(User).filter(
                 User.numero_identificacion == numero_identificacion,
                 User.tipo_identificacion == tipo_identificacion,
                 User.usuario_id != user_id
-            ).first():
+            )):
                 raise HTTPException(status_code=400, detail="El número de identificación ya está en uso")
 
         if foto_perfil:
-            ext = os.path.splitext(foto_perfil.filename)[-1]
-            new_filename = f"{uuid4().hex}{ext}"
-            upload_dir = os.path.join(settings.MEDIA_DIR, "usuarios")
-            os.makedirs(upload_dir, exist_ok=True)
-            file_path = os.path.join(upload_dir, new_filename)
-
-            with open(file_path, "wb") as f:
-                f.write(foto_perfil.file.read())
-
-            user.foto_perfil = f"media/usuarios/{new_filename}"
+            ext = os.path.splitext(foto_perfil.filename or "")[-1]
+            blob = await public_blob_store.store(db, foto_perfil, ext, FOTO_PERFIL_MAX_SIZE)
+            # La foto anterior pierde una referencia (las de media/usuarios no están en el almacén)
+            await public_blob_store.release(db, public_blob_store.clave_from_url(user.foto_perfil))
+            user.foto_perfil = public_blob_store.url_for(blob.clave)
 
         user.nombre_completo = nombre_completo
         user.correo = correo
@@ -169,55 +268,275 @@ class UserController:
         user.tipo_identificacion = tipo_identificacion
         user.numero_identificacion = numero_identificacion
 
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate_user(user_id)
         return user
 
     @staticmethod
-    def delete_user(db: Session, user_id: int, current_user: User) -> dict:
+    async def delete_user(db: AsyncSession, user_id: int, current_user: User) -> dict:
         if not current_user.is_admin():
             raise HTTPException(status_code=403, detail="Solo los administradores pueden eliminar usuarios")
         if current_user.usuario_id == user_id:
             raise HTTPException(status_code=400, detail="No puedes eliminar tu propia cuenta")
 
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-        db.delete(user)
-        db.commit()
+        await public_blob_store.release(db, public_blob_store.clave_from_url(user.foto_perfil))
+        await db.delete(user)
+        await db.commit()
+        principal_cache.invalidate_user(user_id)
         return {"message": "Usuario eliminado exitosamente"}
 
     @staticmethod
-    def toggle_user_status(db: Session, user_id: int, current_user: User) -> User:
+    async def toggle_user_status(db: AsyncSession, user_id: int, current_user: User) -> User:
         if not current_user.is_admin():
             raise HTTPException(status_code=403, detail="Solo los administradores pueden cambiar el estado")
 
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
         user.estado = "inactivo" if user.estado == "activo" else "activo"
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        principal_cache.invalidate_user(user_id)
         return user
 
     @staticmethod
-    def change_password(db: Session, user_id: int, password_data: PasswordChangeRequest, current_user: User) -> dict:
+    async def change_password(db: AsyncSession, user_id: int, password_data: PasswordChangeRequest, current_user: User) -> dict:
         if not current_user.is_admin() and current_user.usuario_id != user_id:
             raise HTTPException(status_code=403, detail="No tienes permisos para cambiar esta contraseña")
 
-        user = db.query(User).filter(User.usuario_id == user_id).first()
+        user = await db.scalar(select(User).filter(User.usuario_id == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
         if current_user.usuario_id == user_id:
-            if not password_handler.verify_password(password_data.current_password, user.password_hash):
+            if not await password_handler.verify_password_async(password_data.current_password, user.password_hash):
                 raise HTTPException(status_code=400, detail="Contraseña actual incorrecta")
 
-        if password_handler.verify_password(password_data.new_password, user.password_hash):
+        if await password_handler.verify_password_async(password_data.new_password, user.password_hash):
             raise HTTPException(status_code=400, detail="La nueva contraseña debe ser diferente")
 
-        user.password_hash = password_handler.hash_password(password_data.new_password)
-        db.commit()
+        user.password_hash = await password_handler.hash_password_async(password_data.new_password)
+        # Cerrar las sesiones renovables abiertas con la contraseña anterior
+        await db.execute(update(RefreshToken).where(RefreshToken.usuario_id == user_id).values(revocado=True))
+        await db.commit()
         return {"message": "Contraseña actualizada exitosamente"}
+
+    @staticmethod
+    def detect_import_format(filename: Optional[str], formato: Optional[str] = None) -> str:
+        if formato:
+            return formato
+        extension = os.path.splitext(filename or "")[1].lower()
+        if extension == ".csv":
+            return "csv"
+        if extension in (".ndjson", ".jsonl", ".json"):
+            return "ndjson"
+        raise HTTPException(status_code=400, detail="Formato no soportado, usa CSV o NDJSON")
+
+    @staticmethod
+    def _read_import_rows(file: UploadFile, formato: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        """Recorrer el archivo fila a fila (fila, datos, error) sin cargarlo completo"""
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        try:
+            if formato == "csv":
+                for fila, row in enumerate(csv.DictReader(stream), start=2):
+                    yield fila, {
+                        key.strip(): (value.strip() or None) if isinstance(value, str) else value
+                        for key, value in row.items() if key
+                    }, None
+            else:
+                for fila, line in enumerate(stream, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        yield fila, None, "JSON inválido"
+                        continue
+                    if isinstance(data, dict):
+                        yield fila, data, None
+                    else:
+                        yield fila, None, "Cada línea debe ser un objeto JSON"
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="El archivo debe estar en UTF-8")
+        finally:
+            stream.detach()
+
+    @staticmethod
+    def _parse_import(file: UploadFile, formato: str) -> Tuple[List[UserCreate], List[Dict], Dict[str, int], Dict[Tuple[str, str], int]]:
+        """
+        Leer y validar todas las filas (E/S de archivo y validación síncronas;
+        se ejecuta en el threadpool). Detecta también repetidos dentro del archivo.
+        Returns: (nuevos, errores, fila_por_correo, fila_por_identificacion)
+        """
+        errores: List[Dict] = []
+        nuevos: List[UserCreate] = []
+        fila_por_correo: Dict[str, int] = {}
+        fila_por_identificacion: Dict[Tuple[str, str], int] = {}
+
+        for fila, data, error in UserController._read_import_rows(file, formato):
+            if len(nuevos) + len(errores) >= settings.USER_IMPORT_MAX_ROWS:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"La importación admite máximo {settings.USER_IMPORT_MAX_ROWS} filas"
+                )
+            if error:
+                errores.append({"fila": fila, "error": error})
+                continue
+            try:
+                user_data = UserCreate(**data)
+            except ValidationError as e:
+                errores.append({"fila": fila, "error": "; ".join(err["msg"] for err in e.errors())})
+                continue
+
+            correo = user_data.correo.lower()
+            identificacion = (user_data.tipo_identificacion.value, user_data.numero_identificacion)
+            if correo in fila_por_correo:
+                errores.append({"fila": fila, "error": f"Correo repetido en la fila {fila_por_correo[correo]}"})
+                continue
+            if identificacion in fila_por_identificacion:
+                errores.append({"fila": fila, "error": f"Identificación repetida en la fila {fila_por_identificacion[identificacion]}"})
+                continue
+            fila_por_correo[correo] = fila
+            fila_por_identificacion[identificacion] = fila
+            nuevos.append(user_data)
+
+        return nuevos, errores, fila_por_correo, fila_por_identificacion
+
+    @staticmethod
+    async def import_users(db: AsyncSession, file: UploadFile, formato: str) -> UserImportResponse:
+        """
+        Importar usuarios en lote. Valida todas las filas, verifica unicidad con
+        consultas por conjuntos, cifra las contraseñas en el pool de hash e
+        inserta por bloques en una sola transacción (todo o nada).
+        """
+        nuevos, errores, fila_por_correo, fila_por_identificacion = await run_in_threadpool(
+            UserController._parse_import, file, formato
+        )
+
+        if not nuevos and not errores:
+            raise HTTPException(status_code=400, detail="El archivo no contiene usuarios")
+
+        # Unicidad contra la base de datos, por bloques de valores
+        chunk_size = settings.USER_BULK_CHUNK_SIZE
+        for lote in _chunks(list(fila_por_correo), chunk_size):
+            for correo in await db.scalars(select(User.correo).filter(User.correo.in_(lote))):
+                errores.append({"fila": fila_por_correo[correo.lower()], "error": "El correo ya está registrado"})
+        for lote in _chunks(list(fila_por_identificacion), chunk_size):
+            existentes = await db.execute(
+                select(User.tipo_identificacion, User.numero_identificacion)
+                .filter(tuple_(User.tipo_identificacion, User.numero_identificacion).in_(lote))
+            )
+            for tipo, numero in existentes:
+                fila = fila_por_identificacion.get((tipo.lower(), numero))
+                if fila:
+                    errores.append({"fila": fila, "error": "Identificación ya registrada"})
+
+        for user_data in nuevos:
+            if public_blob_store.es_url(user_data.foto_perfil):
+                errores.append({
+                    "fila": fila_por_correo[user_data.correo.lower()],
+                    "error": "La foto de perfil no puede apuntar al almacén de archivos"
+                })
+
+        rol_ids = {user_data.rol_id or ROL_POR_DEFECTO for user_data in nuevos}
+        roles_validos = set(await db.scalars(select(Role.id).filter(Role.id.in_(rol_ids))))
+        for user_data in nuevos:
+            if (user_data.rol_id or ROL_POR_DEFECTO) not in roles_validos:
+                errores.append({"fila": fila_por_correo[user_data.correo.lower()], "error": "Rol no encontrado"})
+
+        if errores:
+            errores.sort(key=lambda e: e["fila"])
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "mensaje": "La importación tiene errores, no se creó ningún usuario",
+                    "total_errores": len(errores),
+                    "errores": errores[:MAX_IMPORT_ERRORS]
+                }
+            )
+
+        # Cifrar en grupos del tamaño del pool para no saturar su cola (los logins
+        # la comparten); si está llena se espera un hueco en vez de abortar con 503
+        hashes: List[str] = []
+        for lote in _chunks(nuevos, settings.HASH_POOL_WORKERS):
+            hashes.extend(await asyncio.gather(
+                *(password_handler.hash_password_async(user_data.password, wait=True) for user_data in lote)
+            ))
+
+        rows = [
+            {
+                "nombre_completo": user_data.nombre_completo,
+                "correo": user_data.correo,
+                "telefono": user_data.telefono,
+                "tipo_identificacion": user_data.tipo_identificacion.value,
+                "numero_identificacion": user_data.numero_identificacion,
+                "password_hash": password_hash,
+                "estado": EstadoUsuario(user_data.estado.value),
+                "rol_id": user_data.rol_id or ROL_POR_DEFECTO,
+                "foto_perfil": user_data.foto_perfil,
+                "busqueda": texto_busqueda(user_data.nombre_completo, user_data.correo, user_data.numero_identificacion),
+            }
+            for user_data, password_hash in zip(nuevos, hashes)
+        ]
+        try:
+            for lote in _chunks(rows, chunk_size):
+                await db.execute(insert(User), lote)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Otro proceso registró usuarios con los mismos datos, reintenta la importación"
+            )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error importando usuarios: {e}")
+            raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+        logger.info(f"Importación masiva: {len(rows)} usuarios creados")
+        return UserImportResponse(creados=len(rows), formato=formato)
+
+    @staticmethod
+    def _export_value(value):
+        if isinstance(value, EstadoUsuario):
+            return value.value
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    async def export_users(formato: str) -> AsyncIterator[str]:
+        """
+        Exportar usuarios en streaming. Usa su propia sesión porque el cuerpo se
+        envía después de que termina la dependencia de la ruta.
+        """
+        columnas = [getattr(User, columna) for columna in EXPORT_COLUMNS]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if formato == "csv":
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(*columnas)
+                .order_by(User.usuario_id)
+                .execution_options(yield_per=settings.USER_BULK_CHUNK_SIZE)
+            )
+            async for partition in result.partitions():
+                buffer.seek(0)
+                buffer.truncate(0)
+                for row in partition:
+                    values = [UserController._export_value(value) for value in row]
+                    if formato == "csv":
+                        writer.writerow(values)
+                    else:
+                        buffer.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False))
+                        buffer.write("\n")
+                yield buffer.getvalue()
@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from app.config import settings
 import logging
 
@@ -25,6 +26,47 @@ except Exception as e:
 # Crear SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Drivers asíncronos equivalentes a los síncronos configurados en DATABASE_URL
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """Convierte la URL síncrona en su equivalente con driver asíncrono"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, _, rest = database_url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+# Crear engine asíncrono para las rutas async (no bloquea el event loop)
+try:
+    async_database_url = get_async_database_url(settings.DATABASE_URL)
+    async_engine_options = {
+        "echo": settings.DEBUG,
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+    }
+    if not async_database_url.startswith("sqlite"):
+        async_engine_options["pool_size"] = settings.DB_POOL_SIZE
+        async_engine_options["max_overflow"] = settings.DB_MAX_OVERFLOW
+
+    async_engine = create_async_engine(async_database_url, **async_engine_options)
+    logger.info("🔗 Motor asíncrono de base de datos creado exitosamente")
+except Exception as e:
+    logger.error(f"❌ Error al crear motor asíncrono de base de datos: {e}")
+    raise
+
+# expire_on_commit=False: los objetos siguen siendo legibles después del commit
+# sin disparar lazy loads (que en modo asíncrono no están permitidos)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base para modelos
 Base = declarative_base()
 
@@ -40,6 +82,16 @@ def get_db():
     finally:
         db.close()
 
+# Dependency asíncrona para obtener sesión de base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except SQLAlchemyError as e:
+            logger.error(f"Error en sesión asíncrona de base de datos: {e}")
+            await db.rollback()
+            raise
+
 # Función para verificar conexión a la base de datos
 def verify_database_connection():
     try:
@@ -2,7 +2,6 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
-from fastapi.staticfiles import StaticFiles
 import sys
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
@@ -10,29 +9,27 @@ from sqlalchemy import text
 
 # Importar configuración y base de datos
 from app.config import settings
-from app.database import engine, get_db
-from app.models import user, role, tipo_identificacion, proceso, historial_servicio, automovil
+from app.database import engine, get_db, AsyncSessionLocal, async_engine
+from app.models import user, role, tipo_identificacion, proceso, historial_servicio, automovil, refresh_token, blob
 
 
 # Importar rutas
 from app.routes import auth_routes, user_routes, role_routes, automovil_routes, proceso_routes, historial_servicio_routes, cotizacion_routes, chat_routes, reporte_routes
 from app.services.websocket_service import websocket_manager
+from app.services.presence_service import presence_tracker
+from app.services.image_pipeline import image_pipeline
+from app.services.blob_store import blob_store, public_blob_store
+from app.services.file_delivery import MediaFiles
+from app.auth.hash_pool import hash_pool
+from app.auth.revocation import revocation_list
+from app.auth.permission_sync import permission_sync
+from app.controllers.role_controller import RoleController
+from app.controllers.user_controller import UserController
 
 # Importar funciones de autenticación para crear el admin
 from app.auth.password_handler import get_password_hash
 
 
-
-
-# Configurar lifespan para inicializar/cerrar WebSocket
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    await websocket_manager.initialize()
-    yield
-    # Shutdown
-    await websocket_manager.shutdown()
-    
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -118,6 +115,13 @@ async def create_default_admin():
         if db:
             db.close()
 
+async def reload_permission_registry():
+    """
+    Recompila la matriz de permisos desde la tabla roles (permission_sync)
+    """
+    async with AsyncSessionLocal() as async_db:
+        await RoleController.load_permission_registry(async_db)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -145,6 +149,11 @@ async def lifespan(app: FastAPI):
         # Crear usuario administrador por defecto
         await create_default_admin()
         
+        # Compilar la matriz de permisos por rol
+        async with AsyncSessionLocal() as async_db:
+            await RoleController.load_permission_registry(async_db)
+            await UserController.backfill_search_column(async_db)
+        
         logger.info(f"✅ Servidor corriendo en: {settings.SERVER_HOST}:{settings.SERVER_PORT}")
         logger.info("✅ API funcionando al 100%")
         logger.info("📚 Documentación disponible en: /docs")
@@ -157,10 +166,28 @@ async def lifespan(app: FastAPI):
         if db:
             db.close()
     
+    # Inicializar WebSocket (limpieza, escritura y relé Redis)
+    await websocket_manager.initialize()
+    await revocation_list.start()
+    await presence_tracker.start()
+    await blob_store.start()
+    await public_blob_store.start()
+    # Recarga de permisos en este worker cuando otro modifica un rol
+    await permission_sync.start(reload_permission_registry, websocket_manager.redis_client)
+    
     yield
     
     # Shutdown
     logger.info("=== CERRANDO FULLPAINT API ===")
+    await permission_sync.stop()
+    await websocket_manager.shutdown()
+    await revocation_list.stop()
+    await presence_tracker.stop()
+    await blob_store.stop()
+    await public_blob_store.stop()
+    hash_pool.shutdown()
+    image_pipeline.shutdown()
+    await async_engine.dispose()
 
 # Crear aplicación FastAPI
 app = FastAPI(
@@ -207,7 +234,8 @@ app.include_router(historial_servicio_routes.router)
 app.include_router(cotizacion_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(reporte_routes.router)
-app.mount("/media", StaticFiles(directory="media"), name="media")
+# Solo contenido público (fotos de perfil); chat y reportes se sirven por sus rutas autenticadas
+app.mount("/media", MediaFiles(directory="media"), name="media")
 
 # Ruta de salud
 @app.get("/")
@@ -231,23 +259,20 @@ async def health_check():
     """
     Endpoint de verificación de salud
     """
-    db = None
     try:
-        # Verificar conexión a la base de datos
-        db = next(get_db())
-        db.execute(text("SELECT 1"))
+        # Verificar conexión a la base de datos sin bloquear el event loop
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
         
         return {
             "status": "healthy",
             "database": "connected",
-            "version": settings.VERSION
+            "version": settings.VERSION,
+            "hash_pool": hash_pool.metrics()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unavailable")
-    finally:
-        if db:
-            db.close()
 
 # Manejador de errores global
 @app.exception_handler(Exception)
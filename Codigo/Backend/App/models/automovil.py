@@ -62,7 +62,6 @@ class Automovil(Base):
     procesos = relationship("Proceso", back_populates="automovil", cascade="all, delete-orphan")
     historial_servicios = relationship("HistorialServicio", back_populates="automovil", cascade="all, delete-orphan")
     cotizaciones = relationship("Cotizacion", back_populates="automovil")
-    mensajes_chat = relationship("MensajeChat", back_populates="vehiculo")  # ← relación válida ahora
     reportes = relationship("Reporte", back_populates="automovil", cascade="all, delete-orphan")
 
     def __repr__(self):
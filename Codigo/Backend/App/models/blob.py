@@ -0,0 +1,28 @@
+# app/models/blob.py
+
+from sqlalchemy import Column, Integer, String, BigInteger, TIMESTAMP, Index, func
+from app.database import Base
+
+class Blob(Base):
+    """
+    Archivo del almacén direccionado por contenido. La clave es el nombre en
+    disco (sha256 + extensión), almacen distingue el privado del público y
+    referencias cuenta los registros que lo usan.
+    """
+    __tablename__ = "blobs"
+
+    almacen = Column(String(20), primary_key=True)
+    clave = Column(String(80), primary_key=True)
+    sha256 = Column(String(64), nullable=False)
+    tamano = Column(BigInteger, nullable=False)
+    referencias = Column(Integer, default=0, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    __table_args__ = (
+        Index('idx_blobs_sha256', 'almacen', 'sha256'),
+        Index('idx_blobs_referencias', 'almacen', 'referencias', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f"<Blob(almacen='{self.almacen}', clave='{self.clave}', referencias={self.referencias})>"
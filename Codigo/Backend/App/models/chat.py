@@ -1,19 +1,20 @@
 # app/models/chat.py
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, Index, Enum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
 
 class TipoMensaje(str, enum.Enum):
-    TEXTO = "texto"
-    IMAGEN = "imagen"
-    AUDIO = "audio"
-    ARCHIVO = "archivo"
+    TEXTO = "TEXTO"
+    IMAGEN = "IMAGEN"
+    ARCHIVO = "ARCHIVO"
+    NOTIFICACION = "NOTIFICACION"
 
 class EstadoMensaje(str, enum.Enum):
     ENVIADO = "ENVIADO"
+    ENTREGADO = "ENTREGADO"
     LEIDO = "LEIDO"
 
 class TipoMensajeModel(Base):
@@ -26,27 +27,32 @@ class TipoMensajeModel(Base):
         return f"<TipoMensaje(tipo_id={self.tipo_id})>"
 
 class MensajeChat(Base):
-    __tablename__ = "chat"
-
-    mensaje_id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey("chats.id"))
-    vehiculo_id = Column(Integer, ForeignKey("automoviles.id"))
-    remitente_id = Column(Integer, ForeignKey("usuarios.usuario_id"))
-    receptor_id = Column(Integer, ForeignKey("usuarios.usuario_id"))
-    mensaje = Column(Text, nullable=True)
-    tipo_id = Column(String(20), ForeignKey("tipos_mensaje.tipo_id"), default=TipoMensaje.TEXTO)
-    archivo_url = Column(String(255), nullable=True)
-    leido = Column(Boolean, default=False)
-    fecha_envio = Column(DateTime(timezone=True), server_default=func.now())
+    __tablename__ = "mensajes_chat"
+    __table_args__ = (
+        # Paginación por cursor: los mensajes de un chat se recorren por este índice
+        Index("idx_chat_mensaje", "chat_id", "id"),
+        Index("idx_remitente", "remitente_id"),
+        Index("idx_estado", "estado"),
+        Index("idx_fecha", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), nullable=False)
+    remitente_id = Column(Integer, ForeignKey("usuarios.usuario_id"), nullable=False)
+    contenido = Column(Text, nullable=False)
+    tipo_mensaje = Column(Enum(TipoMensaje), default=TipoMensaje.TEXTO)
+    estado = Column(Enum(EstadoMensaje), default=EstadoMensaje.ENVIADO)
+    archivo_url = Column(String(500), nullable=True)
+    respuesta_a = Column(Integer, ForeignKey("mensajes_chat.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    leido_at = Column(DateTime(timezone=True), nullable=True)
 
     chat = relationship("Chat", back_populates="mensajes")
     remitente = relationship("Usuario", foreign_keys=[remitente_id], back_populates="mensajes_enviados")
-    receptor = relationship("Usuario", foreign_keys=[receptor_id], back_populates="mensajes_recibidos")
-    tipo_mensaje = relationship("TipoMensajeModel", foreign_keys=[tipo_id])
-    vehiculo = relationship("Automovil", back_populates="mensajes_chat")
+    mensaje_padre = relationship("MensajeChat", remote_side=[id])
 
     def __repr__(self):
-        return f"<MensajeChat(id={self.mensaje_id}, tipo={self.tipo_id}, leido={self.leido})>"
+        return f"<MensajeChat(id={self.id}, tipo={self.tipo_mensaje}, estado={self.estado})>"
 
 class Chat(Base):
     __tablename__ = "chats"
@@ -60,6 +66,18 @@ class Chat(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    # Resumen denormalizado para la bandeja de chats; lo mantienen enviar_mensaje
+    # y marcar_mensajes_como_leidos en la misma transacción que los mensajes
+    total_mensajes = Column(Integer, default=0, nullable=False)
+    no_leidos_cliente = Column(Integer, default=0, nullable=False)
+    no_leidos_mecanico = Column(Integer, default=0, nullable=False)
+    ultimo_mensaje = Column(String(100), nullable=True)
+    ultimo_mensaje_fecha = Column(DateTime(timezone=True), nullable=True)
+    ultimo_remitente_id = Column(Integer, nullable=True)
+    # Acumulado de tiempos de respuesta (cambio de remitente en menos de 1 hora)
+    total_respuestas = Column(Integer, default=0, nullable=False)
+    minutos_respuesta = Column(Float, default=0, nullable=False)
+
     proceso = relationship("Proceso", back_populates="chats")
     cliente = relationship("Usuario", foreign_keys=[cliente_id], back_populates="chats_como_cliente")
     mecanico = relationship("Usuario", foreign_keys=[mecanico_id], back_populates="chats_como_mecanico")
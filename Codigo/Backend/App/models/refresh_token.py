@@ -0,0 +1,24 @@
+# app/models/refresh_token.py
+
+from sqlalchemy import Column, Integer, String, ForeignKey, TIMESTAMP, Boolean, func
+from app.database import Base
+
+class RefreshToken(Base):
+    """
+    Token de renovación rotativo. Solo se guarda el SHA-256 del token; cada uso
+    lo marca como usado y emite otro de la misma familia. Presentar un token ya
+    usado revoca la familia completa (detección de reutilización).
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.usuario_id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    familia = Column(String(32), nullable=False, index=True)
+    expira_en = Column(TIMESTAMP, nullable=False)
+    usado_en = Column(TIMESTAMP, nullable=True)
+    revocado = Column(Boolean, default=False, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, usuario_id={self.usuario_id}, familia='{self.familia}')>"
@@ -1,10 +1,22 @@
 # app/models/user.py
 
+import unicodedata
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, TIMESTAMP, func
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, TIMESTAMP, Index, event, func
 from sqlalchemy.orm import relationship
 from app.database import Base
 
+
+def normalizar_busqueda(texto: str) -> str:
+    """Minúsculas, sin tildes y con espacios simples"""
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower())
+    return " ".join("".join(c for c in sin_tildes if not unicodedata.combining(c)).split())
+
+
+def texto_busqueda(nombre_completo: str, correo: str, numero_identificacion: str) -> str:
+    """Contenido de la columna busqueda (nombre primero para búsquedas por prefijo)"""
+    return normalizar_busqueda(" ".join(filter(None, [nombre_completo, correo, numero_identificacion])))[:255]
+
 class EstadoUsuario(PyEnum):
     ACTIVO = "ACTIVO"
     INACTIVO = "INACTIVO"
@@ -29,9 +41,17 @@ class Usuario(Base):
     rol_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
     foto_perfil = Column(String(255), default="static/img/default-profile.png")
     fecha_registro = Column(TIMESTAMP, server_default=func.current_timestamp())
+    # Nombre, correo y documento normalizados; se mantiene en before_insert/before_update
+    busqueda = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        Index("idx_usuarios_busqueda", "busqueda"),
+        Index("ft_usuarios_busqueda", "busqueda", mysql_prefix="FULLTEXT"),
+    )
 
     # Relaciones básicas
-    role = relationship("Role", back_populates="usuarios")
+    # selectin: el rol se carga junto al usuario (AsyncSession no admite lazy loads)
+    role = relationship("Role", back_populates="usuarios", lazy="selectin")
     tipo_identificacion_rel = relationship("TipoIdentificacion", back_populates="usuarios")
     automoviles = relationship("Automovil", back_populates="propietario", cascade="all, delete-orphan")
     cotizaciones = relationship("Cotizacion", back_populates="cliente", foreign_keys="Cotizacion.cliente_id")
@@ -99,12 +119,6 @@ class Usuario(Base):
         foreign_keys="MensajeChat.remitente_id",
         back_populates="remitente"
     )
-    
-    mensajes_recibidos = relationship(
-        "MensajeChat",
-        foreign_keys="MensajeChat.receptor_id",
-        back_populates="receptor"
-    )
 
     conexiones_chat = relationship(
         "ConexionChat",
@@ -154,6 +168,10 @@ class Usuario(Base):
     def is_active(self) -> bool:
         return self.estado == EstadoUsuario.ACTIVO
 
+    def has_permission(self, permiso: int) -> bool:
+        from app.auth.permissions import permission_registry
+        return permission_registry.tiene(self.rol_id, permiso, self.role.nombre if self.role else None)
+
     def get_procesos_activos_como_tecnico(self):
         return [p for p in self.procesos_como_tecnico if p.activo and p.estado.name != 'COMPLETADO']
 
@@ -169,4 +187,10 @@ class Usuario(Base):
     def get_servicios_como_cliente(self):
         return self.servicios_como_cliente
 
+
+@event.listens_for(Usuario, "before_insert")
+@event.listens_for(Usuario, "before_update")
+def _actualizar_busqueda(mapper, connection, target):
+    target.busqueda = texto_busqueda(target.nombre_completo, target.correo, target.numero_identificacion)
+
 User = Usuario
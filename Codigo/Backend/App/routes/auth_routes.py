@@ -1,32 +1,43 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.controllers.auth_controller import AuthController
-from app.schemas.auth import LoginRequest, RegisterRequest, TokenResponse
+from app.schemas.auth import LoginRequest, RegisterRequest, TokenResponse, RefreshRequest
 from app.schemas.user import UserResponse
-from app.auth.password_handler import get_current_user
+from app.auth.password_handler import get_current_user, oauth2_scheme
 from app.models.user import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user_data: RegisterRequest, db: Session = Depends(get_db)):
-    return AuthController.register_user(db, user_data)
+async def register_user(user_data: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    return await AuthController.register_user(db, user_data)
 
 @router.post("/login", response_model=TokenResponse)
-async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_user(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     login_data = LoginRequest(correo=form_data.username, password=form_data.password)
-    return AuthController.login_user(db, login_data)
+    client_ip = request.client.host if request.client else None
+    return await AuthController.login_user(db, login_data, client_ip)
 
 @router.post("/login-json", response_model=TokenResponse)
-async def login_user_json(user_login: LoginRequest, db: Session = Depends(get_db)):
-    return AuthController.login_user(db, user_login)
+async def login_user_json(request: Request, user_login: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    client_ip = request.client.host if request.client else None
+    return await AuthController.login_user(db, user_login, client_ip)
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
+@router.post("/logout")
+async def logout_user(
+    body: Optional[RefreshRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await AuthController.logout_user(token, db, body.refresh_token if body else None)
+
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_token(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return AuthController.create_user_token(current_user)
+async def refresh_token(body: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    return await AuthController.refresh_session(db, body.refresh_token)
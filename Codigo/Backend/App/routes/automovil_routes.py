@@ -1,9 +1,9 @@
 # app/routes/automovil_routes.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from app.schemas.automovil import (
     AutomovilCreate, AutomovilUpdate, AutomovilResponse, 
@@ -36,7 +36,7 @@ router = APIRouter(
 )
 async def crear_automovil(
     automovil_data: AutomovilCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -61,11 +61,11 @@ async def crear_automovil(
     try:
         # Si no se especifica propietario, asignar al usuario actual
         if not automovil_data.propietario_id:
-            automovil_data.propietario_id = current_user.id
+            automovil_data.propietario_id = current_user.usuario_id
             
-        automovil = AutomovilController.crear_automovil(db, automovil_data, current_user)
+        automovil = await AutomovilController.crear_automovil(db, automovil_data, current_user)
         
-        logger.info(f"Automóvil creado exitosamente: {automovil.placa} por usuario {current_user.id}")
+        logger.info(f"Automóvil creado exitosamente: {automovil.placa} por usuario {current_user.usuario_id}")
         return automovil
         
     except Exception as e:
@@ -90,7 +90,7 @@ async def listar_automoviles(
     propietario_id: Optional[int] = Query(None, description="Filtrar por ID del propietario"),
     tipo_combustible: Optional[str] = Query(None, description="Filtrar por tipo de combustible"),
     tipo_transmision: Optional[str] = Query(None, description="Filtrar por tipo de transmisión"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -125,7 +125,7 @@ async def listar_automoviles(
             tipo_transmision=tipo_transmision
         )
         
-        automoviles, total = AutomovilController.obtener_automoviles(
+        automoviles, total = await AutomovilController.obtener_automoviles(
             db, current_user, filtros, skip, limit
         )
         
@@ -151,7 +151,7 @@ async def listar_automoviles(
 )
 async def obtener_automovil(
     automovil_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -166,7 +166,7 @@ async def obtener_automovil(
     - Empleados/Admins: Pueden ver cualquier automóvil
     """
     try:
-        automovil = AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
+        automovil = await AutomovilController.obtener_automovil_por_id(db, automovil_id, current_user)
         
         if not automovil:
             raise HTTPException(
@@ -194,7 +194,7 @@ async def obtener_automovil(
 async def actualizar_automovil(
     automovil_id: int,
     automovil_data: AutomovilUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -209,7 +209,7 @@ async def actualizar_automovil(
     - Empleados/Admins: Pueden actualizar cualquier automóvil
     """
     try:
-        automovil = AutomovilController.actualizar_automovil(db, automovil_id, automovil_data, current_user)
+        automovil = await AutomovilController.actualizar_automovil(db, automovil_id, automovil_data, current_user)
         
         if not automovil:
             raise HTTPException(
@@ -217,7 +217,7 @@ async def actualizar_automovil(
                 detail="Automóvil no encontrado"
             )
         
-        logger.info(f"Automóvil {automovil.placa} actualizado por usuario {current_user.id}")
+        logger.info(f"Automóvil {automovil.placa} actualizado por usuario {current_user.usuario_id}")
         return automovil
         
     except HTTPException:
@@ -236,7 +236,7 @@ async def actualizar_automovil(
 )
 async def eliminar_automovil(
     automovil_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -250,7 +250,7 @@ async def eliminar_automovil(
     - Solo Administradores pueden eliminar automóviles
     """
     try:
-        success = AutomovilController.eliminar_automovil(db, automovil_id, current_user)
+        success = await AutomovilController.eliminar_automovil(db, automovil_id, current_user)
         
         if not success:
             raise HTTPException(
@@ -258,7 +258,7 @@ async def eliminar_automovil(
                 detail="Automóvil no encontrado"
             )
         
-        logger.info(f"Automóvil ID {automovil_id} eliminado por usuario {current_user.id}")
+        logger.info(f"Automóvil ID {automovil_id} eliminado por usuario {current_user.usuario_id}")
         return {"message": "Automóvil eliminado exitosamente"}
         
     except HTTPException:
@@ -279,7 +279,7 @@ async def eliminar_automovil(
 async def cambiar_estado_automovil(
     automovil_id: int,
     cambio_estado: CambioEstadoAutomovil,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -297,7 +297,7 @@ async def cambiar_estado_automovil(
     - Clientes: Solo pueden marcar como "en_servicio" sus propios vehículos
     """
     try:
-        automovil = AutomovilController.cambiar_estado_automovil(
+        automovil = await AutomovilController.cambiar_estado_automovil(
             db, automovil_id, cambio_estado, current_user
         )
         
@@ -307,7 +307,7 @@ async def cambiar_estado_automovil(
                 detail="Automóvil no encontrado"
             )
         
-        logger.info(f"Estado del automóvil {automovil.placa} cambiado a {cambio_estado.nuevo_estado} por usuario {current_user.id}")
+        logger.info(f"Estado del automóvil {automovil.placa} cambiado a {cambio_estado.nuevo_estado} por usuario {current_user.usuario_id}")
         return automovil
         
     except HTTPException:
@@ -328,7 +328,7 @@ async def cambiar_estado_automovil(
 async def actualizar_kilometraje(
     automovil_id: int,
     kilometraje_data: ActualizarKilometraje,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -343,7 +343,7 @@ async def actualizar_kilometraje(
     - Empleados/Admins: Pueden actualizar cualquier vehículo
     """
     try:
-        automovil = AutomovilController.actualizar_kilometraje(
+        automovil = await AutomovilController.actualizar_kilometraje(
             db, automovil_id, kilometraje_data, current_user
         )
         
@@ -353,7 +353,7 @@ async def actualizar_kilometraje(
                 detail="Automóvil no encontrado"
             )
         
-        logger.info(f"Kilometraje del automóvil {automovil.placa} actualizado a {kilometraje_data.nuevo_kilometraje} por usuario {current_user.id}")
+        logger.info(f"Kilometraje del automóvil {automovil.placa} actualizado a {kilometraje_data.nuevo_kilometraje} por usuario {current_user.usuario_id}")
         return automovil
         
     except HTTPException:
@@ -375,7 +375,7 @@ async def obtener_historial_automovil(
     automovil_id: int,
     skip: int = Query(0, ge=0, description="Número de registros a saltar"),
     limit: int = Query(50, ge=1, le=200, description="Límite de registros por página"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -391,7 +391,7 @@ async def obtener_historial_automovil(
     - Empleados/Admins: Pueden ver cualquier historial
     """
     try:
-        historial = AutomovilController.obtener_historial_automovil(
+        historial = await AutomovilController.obtener_historial_automovil(
             db, automovil_id, current_user, skip, limit
         )
         
@@ -419,7 +419,7 @@ async def obtener_historial_automovil(
     description="Obtiene estadísticas generales sobre los automóviles en el sistema."
 )
 async def obtener_estadisticas_automoviles(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -435,7 +435,7 @@ async def obtener_estadisticas_automoviles(
     - Clientes: Solo ven estadísticas de sus vehículos
     """
     try:
-        estadisticas = AutomovilController.obtener_estadisticas(db, current_user)
+        estadisticas = await AutomovilController.obtener_estadisticas(db, current_user)
         return estadisticas
         
     except Exception as e:
@@ -453,7 +453,7 @@ async def obtener_estadisticas_automoviles(
 )
 async def buscar_automoviles(
     termino: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -474,7 +474,7 @@ async def buscar_automoviles(
                 detail="El término de búsqueda debe tener al menos 2 caracteres"
             )
         
-        automoviles = AutomovilController.buscar_automoviles(db, termino, current_user)
+        automoviles = await AutomovilController.buscar_automoviles(db, termino, current_user)
         return automoviles
         
     except HTTPException:
@@ -1,16 +1,18 @@
 # app/routes/chat_routes.py
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict
-import json
+import os
 import uuid
 from datetime import datetime
 import logging
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.auth_handler import get_current_user, decode_token
 from app.controllers.chat_controller import ChatController
+from app.models.chat import Chat
 from app.schemas.chat import (
     ChatCreate, ChatUpdate, ChatResponse, ChatDetalle, ChatListResponse,
     MensajeChatCreate, MensajeChatUpdate, MensajeChatResponse, MensajeListResponse,
@@ -18,138 +20,39 @@ from app.schemas.chat import (
     ConexionChatCreate, ConexionChatResponse
 )
 from app.schemas.user import UserResponse
+from app.services.websocket_service import websocket_manager
+from app.services.chat_file_service import chat_file_service
+from app.services.file_delivery import FileDeliveryResponse, cache_control
 
 router = APIRouter(prefix="/api/v1/chat", tags=["Chat en Vivo"])
 security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
-# Manager para conexiones WebSocket
-class ConnectionManager:
-    def __init__(self):
-        # Diccionario para almacenar conexiones activas por chat_id
-        self.active_connections: Dict[int, List[Dict]] = {}
-        # Diccionario para mapear websockets a información de usuario
-        self.connection_info: Dict[WebSocket, Dict] = {}
-
-    async def connect(self, websocket: WebSocket, chat_id: int, user_id: int, user_name: str):
-        """Conectar un usuario a un chat específico"""
-        await websocket.accept()
-        
-        if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = []
-        
-        connection_data = {
-            "websocket": websocket,
-            "user_id": user_id,
-            "user_name": user_name,
-            "connected_at": datetime.now()
-        }
-        
-        self.active_connections[chat_id].append(connection_data)
-        self.connection_info[websocket] = {
-            "chat_id": chat_id,
-            "user_id": user_id,
-            "user_name": user_name
-        }
-        
-        logger.info(f"Usuario {user_name} conectado al chat {chat_id}")
-        
-        # Notificar a otros usuarios que alguien se conectó
-        await self.broadcast_to_chat(chat_id, {
-            "tipo": "user_connected",
-            "user_id": user_id,
-            "user_name": user_name,
-            "timestamp": datetime.now().isoformat()
-        }, exclude_user=user_id)
-
-    def disconnect(self, websocket: WebSocket):
-        """Desconectar un usuario"""
-        if websocket in self.connection_info:
-            info = self.connection_info[websocket]
-            chat_id = info["chat_id"]
-            user_id = info["user_id"]
-            user_name = info["user_name"]
-            
-            # Remover de active_connections
-            if chat_id in self.active_connections:
-                self.active_connections[chat_id] = [
-                    conn for conn in self.active_connections[chat_id] 
-                    if conn["websocket"] != websocket
-                ]
-                
-                # Si no hay más conexiones en este chat, remover el chat
-                if not self.active_connections[chat_id]:
-                    del self.active_connections[chat_id]
-            
-            # Remover de connection_info
-            del self.connection_info[websocket]
-            
-            logger.info(f"Usuario {user_name} desconectado del chat {chat_id}")
-            
-            # Notificar a otros usuarios que alguien se desconectó
-            # Esto se hace en el except del websocket endpoint
-
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """Enviar mensaje personal a una conexión específica"""
-        try:
-            await websocket.send_text(json.dumps(message, default=str))
-        except Exception as e:
-            logger.error(f"Error enviando mensaje personal: {e}")
-
-    async def broadcast_to_chat(self, chat_id: int, message: dict, exclude_user: Optional[int] = None):
-        """Enviar mensaje a todos los usuarios conectados a un chat específico"""
-        if chat_id not in self.active_connections:
-            return
-        
-        disconnected_connections = []
-        
-        for connection_data in self.active_connections[chat_id]:
-            # Excluir usuario si se especifica
-            if exclude_user and connection_data["user_id"] == exclude_user:
-                continue
-                
-            try:
-                await connection_data["websocket"].send_text(json.dumps(message, default=str))
-            except Exception as e:
-                logger.error(f"Error broadcasting a chat {chat_id}: {e}")
-                disconnected_connections.append(connection_data)
-        
-        # Limpiar conexiones desconectadas
-        for disconnected in disconnected_connections:
-            self.active_connections[chat_id].remove(disconnected)
-            if disconnected["websocket"] in self.connection_info:
-                del self.connection_info[disconnected["websocket"]]
-
-    def get_chat_users(self, chat_id: int) -> List[Dict]:
-        """Obtener usuarios activos en un chat"""
-        if chat_id not in self.active_connections:
-            return []
-        
-        return [
-            {
-                "user_id": conn["user_id"],
-                "user_name": conn["user_name"],
-                "connected_at": conn["connected_at"]
-            }
-            for conn in self.active_connections[chat_id]
-        ]
-
-# Instancia global del manager
-manager = ConnectionManager()
+async def _verificar_acceso_chat(db: AsyncSession, chat_id: int, current_user) -> None:
+    """404 si el chat no existe o el usuario no participa en él (salvo administradores)"""
+    query = select(Chat.id).filter(Chat.id == chat_id)
+    if not current_user.is_admin():
+        query = query.filter(or_(
+            Chat.cliente_id == current_user.usuario_id,
+            Chat.mecanico_id == current_user.usuario_id
+        ))
+    if await db.scalar(query) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
 
 # ========================= ENDPOINTS REST API =========================
 
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 async def crear_chat(
     chat_data: ChatCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Crear un nuevo chat para un proceso"""
     try:
-        chat_controller = ChatController(db)
-        nuevo_chat = await chat_controller.crear_chat(chat_data, current_user.id)
+        nuevo_chat = await ChatController.crear_chat(db, chat_data, current_user.usuario_id)
         return nuevo_chat
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
@@ -163,7 +66,7 @@ async def listar_chats(
     proceso_id: Optional[int] = Query(None, description="Filtrar por proceso"),
     activo: Optional[bool] = Query(None, description="Filtrar por estado activo"),
     buscar: Optional[str] = Query(None, description="Buscar en título"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Listar chats con filtros y paginación"""
@@ -174,15 +77,17 @@ async def listar_chats(
             buscar=buscar
         )
         
-        chat_controller = ChatController(db)
-        resultado = await chat_controller.listar_chats(
-            filtros=filtros,
-            user_id=current_user.id,
-            user_role=current_user.role_name,
+        resultado = await ChatController.obtener_chats(
+            db,
+            filtros,
+            current_user.usuario_id,
+            es_admin=current_user.is_admin(),
             page=page,
             per_page=per_page
         )
         return resultado
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listando chats: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
@@ -190,15 +95,14 @@ async def listar_chats(
 @router.get("/{chat_id}", response_model=ChatDetalle)
 async def obtener_chat(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Obtener detalles de un chat específico"""
     try:
-        chat_controller = ChatController(db)
-        chat = await chat_controller.obtener_chat_detalle(chat_id, current_user.id, current_user.role_name)
-        if not chat:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
+        chat = await ChatController.obtener_chat_detalle(
+            db, chat_id, current_user.usuario_id, es_admin=current_user.is_admin()
+        )
         return chat
     except HTTPException:
         raise
@@ -210,15 +114,14 @@ async def obtener_chat(
 async def actualizar_chat(
     chat_id: int,
     chat_data: ChatUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Actualizar información de un chat"""
     try:
-        chat_controller = ChatController(db)
-        chat_actualizado = await chat_controller.actualizar_chat(chat_id, chat_data, current_user.id, current_user.role_name)
-        if not chat_actualizado:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
+        chat_actualizado = await ChatController.actualizar_chat(
+            db, chat_id, chat_data, current_user.usuario_id, es_admin=current_user.is_admin()
+        )
         return chat_actualizado
     except HTTPException:
         raise
@@ -231,15 +134,12 @@ async def actualizar_chat(
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_chat(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Eliminar un chat (solo administradores)"""
     try:
-        chat_controller = ChatController(db)
-        eliminado = await chat_controller.eliminar_chat(chat_id, current_user.id, current_user.role_name)
-        if not eliminado:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
+        await ChatController.eliminar_chat(db, chat_id, current_user.usuario_id, es_admin=current_user.is_admin())
     except HTTPException:
         raise
     except ValueError as e:
@@ -254,7 +154,7 @@ async def eliminar_chat(
 async def enviar_mensaje(
     chat_id: int,
     mensaje_data: MensajeChatCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Enviar un mensaje a un chat"""
@@ -263,8 +163,7 @@ async def enviar_mensaje(
         if mensaje_data.chat_id != chat_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ID de chat no coincide")
         
-        chat_controller = ChatController(db)
-        nuevo_mensaje = await chat_controller.enviar_mensaje(mensaje_data, current_user.id)
+        nuevo_mensaje = await ChatController.enviar_mensaje(db, mensaje_data, current_user.usuario_id)
         
         # Broadcast del mensaje a todos los usuarios conectados al chat
         mensaje_websocket = {
@@ -283,7 +182,7 @@ async def enviar_mensaje(
             "timestamp": datetime.now().isoformat()
         }
         
-        await manager.broadcast_to_chat(chat_id, mensaje_websocket, exclude_user=current_user.id)
+        await websocket_manager.broadcast_to_chat(chat_id, mensaje_websocket, exclude_user=current_user.usuario_id)
         
         return nuevo_mensaje
     except HTTPException:
@@ -294,25 +193,61 @@ async def enviar_mensaje(
         logger.error(f"Error enviando mensaje: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
 
+@router.post("/{chat_id}/archivos", status_code=status.HTTP_201_CREATED)
+async def enviar_archivo(
+    chat_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Subir un archivo o imagen al chat como mensaje"""
+    resultado = await ChatController.enviar_archivo(db, chat_id, file, current_user.usuario_id)
+    nuevo_mensaje = resultado["mensaje"]
+    
+    await websocket_manager.broadcast_to_chat(chat_id, {
+        "tipo": "nuevo_mensaje",
+        "chat_id": chat_id,
+        "mensaje": {
+            "id": nuevo_mensaje.id,
+            "contenido": nuevo_mensaje.contenido,
+            "tipo_mensaje": nuevo_mensaje.tipo_mensaje,
+            "remitente_id": nuevo_mensaje.remitente_id,
+            "remitente_nombre": nuevo_mensaje.remitente_nombre,
+            "created_at": nuevo_mensaje.created_at.isoformat(),
+            "archivo_url": nuevo_mensaje.archivo_url,
+            "respuesta_a": nuevo_mensaje.respuesta_a
+        },
+        "timestamp": datetime.now().isoformat()
+    }, exclude_user=current_user.usuario_id)
+    
+    return resultado
+
 @router.get("/{chat_id}/mensajes", response_model=MensajeListResponse)
 async def listar_mensajes(
     chat_id: int,
-    page: int = Query(1, ge=1, description="Número de página"),
     per_page: int = Query(50, ge=1, le=100, description="Elementos por página"),
-    db: Session = Depends(get_db),
+    before_id: Optional[int] = Query(None, ge=1, description="Mensajes anteriores a este ID"),
+    after_id: Optional[int] = Query(None, ge=0, description="Mensajes posteriores a este ID"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Listar mensajes de un chat con paginación"""
+    """Listar mensajes de un chat con paginación por cursor"""
     try:
-        chat_controller = ChatController(db)
-        resultado = await chat_controller.listar_mensajes(
-            chat_id=chat_id,
-            user_id=current_user.id,
-            user_role=current_user.role_name,
-            page=page,
-            per_page=per_page
+        if before_id is not None and after_id is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use before_id o after_id, no ambos")
+        
+        resultado = await ChatController.obtener_mensajes(
+            db,
+            chat_id,
+            current_user.usuario_id,
+            per_page=per_page,
+            before_id=before_id,
+            after_id=after_id,
+            es_admin=current_user.is_admin()
         )
         return resultado
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     except Exception as e:
@@ -323,15 +258,12 @@ async def listar_mensajes(
 async def actualizar_mensaje(
     mensaje_id: int,
     mensaje_data: MensajeChatUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Actualizar un mensaje (solo el remitente puede editar contenido)"""
     try:
-        chat_controller = ChatController(db)
-        mensaje_actualizado = await chat_controller.actualizar_mensaje(mensaje_id, mensaje_data, current_user.id)
-        if not mensaje_actualizado:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mensaje no encontrado")
+        mensaje_actualizado = await ChatController.actualizar_mensaje(db, mensaje_id, mensaje_data, current_user.usuario_id)
         
         # Broadcast de actualización de mensaje
         if mensaje_data.contenido:  # Solo si se actualizó el contenido
@@ -342,7 +274,7 @@ async def actualizar_mensaje(
                 "nuevo_contenido": mensaje_actualizado.contenido,
                 "timestamp": datetime.now().isoformat()
             }
-            await manager.broadcast_to_chat(mensaje_actualizado.chat_id, mensaje_websocket)
+            await websocket_manager.broadcast_to_chat(mensaje_actualizado.chat_id, mensaje_websocket)
         
         return mensaje_actualizado
     except HTTPException:
@@ -356,15 +288,12 @@ async def actualizar_mensaje(
 @router.post("/mensajes/{mensaje_id}/marcar-leido", status_code=status.HTTP_200_OK)
 async def marcar_mensaje_leido(
     mensaje_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Marcar un mensaje como leído"""
     try:
-        chat_controller = ChatController(db)
-        marcado = await chat_controller.marcar_mensaje_leido(mensaje_id, current_user.id)
-        if not marcado:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Mensaje no encontrado")
+        await ChatController.marcar_mensaje_leido(db, mensaje_id, current_user.usuario_id)
         
         return {"message": "Mensaje marcado como leído"}
     except HTTPException:
@@ -377,19 +306,18 @@ async def marcar_mensaje_leido(
 
 @router.get("/estadisticas/generales", response_model=ChatEstadisticas)
 async def obtener_estadisticas(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Obtener estadísticas generales del sistema de chat"""
     try:
-        chat_controller = ChatController(db)
-        estadisticas = await chat_controller.obtener_estadisticas(current_user.id, current_user.role_name)
-        
-        # Agregar usuarios conectados desde el manager
-        total_conectados = sum(len(connections) for connections in manager.active_connections.values())
-        estadisticas.usuarios_conectados = total_conectados
-        
+        # usuarios_conectados ya agrega todos los workers (ver count_online_users)
+        estadisticas = await ChatController.obtener_estadisticas_chat(
+            db, current_user.usuario_id, es_admin=current_user.is_admin()
+        )
         return estadisticas
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo estadísticas: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
@@ -397,18 +325,14 @@ async def obtener_estadisticas(
 @router.get("/{chat_id}/participantes", response_model=List[dict])
 async def obtener_participantes_activos(
     chat_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
     """Obtener usuarios actualmente conectados a un chat"""
     try:
-        # Verificar acceso al chat
-        chat_controller = ChatController(db)
-        chat = await chat_controller.obtener_chat_detalle(chat_id, current_user.id, current_user.role_name)
-        if not chat:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
+        await _verificar_acceso_chat(db, chat_id, current_user)
         
-        participantes = manager.get_chat_users(chat_id)
+        participantes = websocket_manager.get_chat_users(chat_id)
         return participantes
     except HTTPException:
         raise
@@ -416,6 +340,44 @@ async def obtener_participantes_activos(
         logger.error(f"Error obteniendo participantes del chat {chat_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno del servidor")
 
+@router.api_route("/files/{chat_id}/{filename}", methods=["GET", "HEAD"])
+async def descargar_archivo_chat(
+    chat_id: int,
+    filename: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Descargar un archivo del chat (o uno de sus derivados). Admite Range para
+    reanudar descargas y responde 304 si el ETag del cliente sigue vigente.
+    """
+    await _verificar_acceso_chat(db, chat_id, current_user)
+    
+    file_path = await chat_file_service.get_chat_file(db, chat_id, filename)
+    if not file_path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archivo no encontrado")
+    
+    return FileDeliveryResponse(
+        file_path,
+        os.stat(file_path),
+        request.headers,
+        cache_control(file_path, privado=True),
+        method=request.method
+    )
+
+@router.delete("/files/{chat_id}/{filename}", status_code=status.HTTP_204_NO_CONTENT)
+async def eliminar_archivo_chat(
+    chat_id: int,
+    filename: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Quitar un archivo de un mensaje propio del chat"""
+    eliminado = await chat_file_service.delete_chat_file(db, chat_id, filename, current_user.usuario_id)
+    if not eliminado:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Archivo no encontrado")
+
 # ========================= WEBSOCKET ENDPOINT =========================
 
 @router.websocket("/{chat_id}/ws")
@@ -423,84 +385,49 @@ async def websocket_endpoint(
     websocket: WebSocket,
     chat_id: int,
     token: str = Query(..., description="JWT Token para autenticación"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """WebSocket endpoint para chat en tiempo real"""
     try:
         # Verificar token JWT
         try:
             payload = decode_token(token)
-            user_id = payload.get("user_id")
-            if not user_id:
-                await websocket.close(code=4001, reason="Token inválido")
-                return
+            user_id = int(payload["sub"])
         except Exception:
             await websocket.close(code=4001, reason="Token inválido")
             return
         
         # Verificar acceso al chat
-        chat_controller = ChatController(db)
-        user_info = await chat_controller.verificar_acceso_chat(chat_id, user_id)
-        if not user_info:
+        usuario = await ChatController.verificar_acceso_chat(db, chat_id, user_id)
+        if usuario is None:
             await websocket.close(code=4003, reason="Acceso denegado al chat")
             return
         
+        user_data = {
+            "nombre": usuario.nombre_completo,
+            "role": usuario.role.nombre if usuario.role else "cliente"
+        }
+        # La sesión no se usa más: no retener su conexión mientras dure el socket
+        await db.close()
+        
         # Conectar usuario
-        await manager.connect(websocket, chat_id, user_id, user_info["nombre"])
+        await websocket_manager.connect(websocket, chat_id, user_id, user_data)
         
+        reason = "normal"
         try:
             while True:
-                # Escuchar mensajes del cliente
+                # Escuchar mensajes del cliente (typing, stop_typing, ping, message_read)
                 data = await websocket.receive_text()
-                message_data = json.loads(data)
-                
-                # Procesar diferentes tipos de mensajes
-                if message_data.get("tipo") == "typing":
-                    # Usuario está escribiendo
-                    typing_message = {
-                        "tipo": "user_typing",
-                        "chat_id": chat_id,
-                        "user_id": user_id,
-                        "user_name": user_info["nombre"],
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    await manager.broadcast_to_chat(chat_id, typing_message, exclude_user=user_id)
-                
-                elif message_data.get("tipo") == "stop_typing":
-                    # Usuario dejó de escribir
-                    stop_typing_message = {
-                        "tipo": "user_stop_typing",
-                        "chat_id": chat_id,
-                        "user_id": user_id,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    await manager.broadcast_to_chat(chat_id, stop_typing_message, exclude_user=user_id)
-                
-                elif message_data.get("tipo") == "ping":
-                    # Ping para mantener conexión viva
-                    await manager.send_personal_message({
-                        "tipo": "pong",
-                        "timestamp": datetime.now().isoformat()
-                    }, websocket)
+                await websocket_manager.handle_websocket_message(websocket, data)
                 
         except WebSocketDisconnect:
             pass
         except Exception as e:
+            reason = "error"
             logger.error(f"Error en WebSocket para chat {chat_id}: {e}")
         finally:
-            # Limpiar conexión
-            info = manager.connection_info.get(websocket)
-            manager.disconnect(websocket)
-            
-            # Notificar desconexión si teníamos información del usuario
-            if info:
-                disconnect_message = {
-                    "tipo": "user_disconnected",
-                    "user_id": info["user_id"],
-                    "user_name": info["user_name"],
-                    "timestamp": datetime.now().isoformat()
-                }
-                await manager.broadcast_to_chat(chat_id, disconnect_message)
+            # Limpiar conexión y notificar desconexión al resto del chat
+            await websocket_manager.disconnect(websocket, reason)
                 
     except Exception as e:
         logger.error(f"Error general en WebSocket: {e}")
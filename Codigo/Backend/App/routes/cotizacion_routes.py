@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.auth_handler import get_current_user
 from app.models.user import User
 from app.schemas.cotizacion import *
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/api/v1/cotizaciones", tags=["Cotizaciones"])
 @router.post("/", response_model=CotizacionResponse, status_code=status.HTTP_201_CREATED)
 async def crear_cotizacion(
     cotizacion_data: CotizacionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -24,7 +24,7 @@ async def crear_cotizacion(
     - **descripcion_general**: Descripción general del servicio
     - **items**: Lista de servicios incluidos en la cotización
     """
-    cotizacion = CotizacionController.crear_cotizacion(db, cotizacion_data, current_user.id)
+    cotizacion = await CotizacionController.crear_cotizacion(db, cotizacion_data, current_user.id)
     
     # Enriquecer respuesta con información relacionada
     response = CotizacionResponse.from_orm(cotizacion)
@@ -43,13 +43,13 @@ async def listar_cotizaciones(
     limit: int = Query(50, ge=1, le=100, description="Límite de registros a devolver"),
     estado: Optional[EstadoCotizacion] = Query(None, description="Filtrar por estado"),
     cliente_id: Optional[int] = Query(None, description="Filtrar por cliente"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Listar cotizaciones con filtros opcionales
     """
-    cotizaciones = CotizacionController.obtener_cotizaciones(db, skip, limit, estado, cliente_id)
+    cotizaciones = await CotizacionController.obtener_cotizaciones(db, skip, limit, estado, cliente_id)
     
     # Enriquecer respuestas
     response_list = []
@@ -68,13 +68,13 @@ async def listar_cotizaciones(
 @router.get("/{cotizacion_id}", response_model=CotizacionResponse)
 async def obtener_cotizacion(
     cotizacion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Obtener una cotización específica por ID
     """
-    cotizacion = CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
+    cotizacion = await CotizacionController.obtener_cotizacion_por_id(db, cotizacion_id)
     
     # Enriquecer respuesta
     response = CotizacionResponse.from_orm(cotizacion)
@@ -91,13 +91,13 @@ async def obtener_cotizacion(
 async def actualizar_cotizacion(
     cotizacion_id: int,
     cotizacion_data: CotizacionUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Actualizar una cotización existente (solo en estado BORRADOR)
     """
-    cotizacion = CotizacionController.actualizar_cotizacion(db, cotizacion_id, cotizacion_data)
+    cotizacion = await CotizacionController.actualizar_cotizacion(db, cotizacion_id, cotizacion_data)
     
     # Enriquecer respuesta
     response = CotizacionResponse.from_orm(cotizacion)
@@ -114,7 +114,7 @@ async def actualizar_cotizacion(
 async def cambiar_estado_cotizacion(
     cotizacion_id: int,
     estado_data: CambiarEstadoRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -125,7 +125,7 @@ async def cambiar_estado_cotizacion(
     - ENVIADA → ACEPTADA, RECHAZADA, VENCIDA
     - ACEPTADA → CONVERTIDA
     """
-    cotizacion = CotizacionController.cambiar_estado_cotizacion(
+    cotizacion = await CotizacionController.cambiar_estado_cotizacion(
         db, cotizacion_id, estado_data.nuevo_estado
     )
     
@@ -143,26 +143,26 @@ async def cambiar_estado_cotizacion(
 @router.delete("/{cotizacion_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_cotizacion(
     cotizacion_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Eliminar una cotización (solo en estado BORRADOR)
     """
-    CotizacionController.eliminar_cotizacion(db, cotizacion_id)
+    await CotizacionController.eliminar_cotizacion(db, cotizacion_id)
 
 @router.get("/cliente/{cliente_id}", response_model=List[CotizacionResponse])
 async def obtener_cotizaciones_por_cliente(
     cliente_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Obtener todas las cotizaciones de un cliente específico
     """
-    cotizaciones = CotizacionController.obtener_cotizaciones(db, skip, limit, cliente_id=cliente_id)
+    cotizaciones = await CotizacionController.obtener_cotizaciones(db, skip, limit, cliente_id=cliente_id)
     
     # Enriquecer respuestas
     response_list = []
@@ -180,10 +180,10 @@ async def obtener_cotizaciones_por_cliente(
 
 @router.get("/estadisticas/dashboard", response_model=EstadisticasCotizaciones)
 async def obtener_estadisticas_cotizaciones(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Obtener estadísticas generales de cotizaciones para el dashboard
     """
-    return CotizacionController.obtener_estadisticas(db)
\ No newline at end of file
+    return await CotizacionController.obtener_estadisticas(db)
\ No newline at end of file
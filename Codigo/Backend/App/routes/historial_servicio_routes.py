@@ -1,10 +1,10 @@
 # 📁 app/routes/historial_servicio_routes.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.auth_handler import get_current_user
 from app.models.user import Usuario
 from app.controllers.historial_servicio_controller import HistorialServicioController
@@ -27,7 +27,7 @@ router = APIRouter(
 @router.post("/", response_model=HistorialServicioResponse, status_code=status.HTTP_201_CREATED)
 async def crear_historial_servicio(
     historial_data: HistorialServicioCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -45,12 +45,12 @@ async def crear_historial_servicio(
     - **proveedor**: Proveedor del servicio (opcional)
     """
     controller = HistorialServicioController(db)
-    return controller.crear_historial(historial_data, current_user.id)
+    return await controller.crear_historial(historial_data, current_user.id)
 
 @router.get("/{historial_id}", response_model=HistorialServicioResponse)
 async def obtener_historial_servicio(
     historial_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -59,7 +59,7 @@ async def obtener_historial_servicio(
     **RF004 - Gestión de Procesos**
     """
     controller = HistorialServicioController(db)
-    return controller.obtener_historial_por_id(historial_id)
+    return await controller.obtener_historial_por_id(historial_id)
 
 @router.get("/", response_model=List[HistorialServicioResponse])
 async def listar_historiales_servicio(
@@ -73,7 +73,7 @@ async def listar_historiales_servicio(
     tecnico_id: Optional[str] = Query(None, description="Filtrar por ID de técnico"),
     costo_minimo: Optional[float] = Query(None, ge=0, description="Costo mínimo"),
     costo_maximo: Optional[float] = Query(None, ge=0, description="Costo máximo"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -103,7 +103,7 @@ async def listar_historiales_servicio(
         costo_maximo=costo_maximo
     )
     
-    return controller.obtener_todos_historiales(skip, limit, filtros)
+    return await controller.obtener_todos_historiales(skip, limit, filtros)
 
 @router.get("/automovil/{automovil_id}", response_model=List[HistorialServicioResponse])
 async def obtener_historial_por_automovil(
@@ -114,7 +114,7 @@ async def obtener_historial_por_automovil(
     estado: Optional[EstadoHistorial] = Query(None, description="Filtrar por estado"),
     fecha_desde: Optional[datetime] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[datetime] = Query(None, description="Fecha hasta (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -134,14 +134,14 @@ async def obtener_historial_por_automovil(
         fecha_hasta=fecha_hasta
     )
     
-    return controller.obtener_historial_por_automovil(automovil_id, skip, limit, filtros)
+    return await controller.obtener_historial_por_automovil(automovil_id, skip, limit, filtros)
 
 @router.get("/tecnico/{tecnico_id}", response_model=List[HistorialServicioResponse])
 async def obtener_historial_por_tecnico(
     tecnico_id: str,
     skip: int = Query(0, ge=0, description="Número de registros a omitir"),
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -150,13 +150,13 @@ async def obtener_historial_por_tecnico(
     **RF004 - Gestión de Procesos**
     """
     controller = HistorialServicioController(db)
-    return controller.obtener_historial_por_tecnico(tecnico_id, skip, limit)
+    return await controller.obtener_historial_por_tecnico(tecnico_id, skip, limit)
 
 @router.put("/{historial_id}", response_model=HistorialServicioResponse)
 async def actualizar_historial_servicio(
     historial_id: str,
     historial_data: HistorialServicioUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -167,12 +167,12 @@ async def actualizar_historial_servicio(
     Permite actualizar cualquier campo del historial de servicio
     """
     controller = HistorialServicioController(db)
-    return controller.actualizar_historial(historial_id, historial_data, current_user.id)
+    return await controller.actualizar_historial(historial_id, historial_data, current_user.id)
 
 @router.delete("/{historial_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_historial_servicio(
     historial_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -183,13 +183,13 @@ async def eliminar_historial_servicio(
     Nota: El registro se marca como inactivo pero no se elimina físicamente
     """
     controller = HistorialServicioController(db)
-    controller.eliminar_historial(historial_id, current_user.id)
+    await controller.eliminar_historial(historial_id, current_user.id)
     return {"message": "Historial de servicio eliminado correctamente"}
 
 @router.get("/mantenimientos/proximos", response_model=List[HistorialServicioResponse])
 async def obtener_proximos_mantenimientos(
     dias_adelanto: int = Query(30, ge=1, le=365, description="Días de adelanto para mostrar próximos mantenimientos"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -200,12 +200,12 @@ async def obtener_proximos_mantenimientos(
     Retorna los vehículos que tienen mantenimientos programados en los próximos N días
     """
     controller = HistorialServicioController(db)
-    return controller.obtener_proximos_mantenimientos(dias_adelanto)
+    return await controller.obtener_proximos_mantenimientos(dias_adelanto)
 
 @router.get("/estadisticas/mantenimiento")
 async def obtener_estadisticas_mantenimiento(
     automovil_id: Optional[str] = Query(None, description="ID de automóvil específico (opcional)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -220,7 +220,7 @@ async def obtener_estadisticas_mantenimiento(
     - Distribución por estado
     """
     controller = HistorialServicioController(db)
-    return controller.obtener_estadisticas_mantenimiento(automovil_id)
+    return await controller.obtener_estadisticas_mantenimiento(automovil_id)
 
 # ===== ENDPOINTS ADICIONALES PARA REPORTES =====
 
@@ -229,7 +229,7 @@ async def reporte_costos_por_periodo(
     fecha_desde: datetime = Query(..., description="Fecha inicio del período"),
     fecha_hasta: datetime = Query(..., description="Fecha fin del período"),
     automovil_id: Optional[str] = Query(None, description="ID de automóvil específico"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -245,7 +245,7 @@ async def reporte_costos_por_periodo(
         fecha_hasta=fecha_hasta
     )
     
-    historiales = controller.obtener_todos_historiales(0, 9999, filtros)
+    historiales = await controller.obtener_todos_historiales(0, 9999, filtros)
     
     # Calcular estadísticas del período
     total_servicios = len(historiales)
@@ -289,7 +289,7 @@ async def reporte_eficiencia_tecnico(
     tecnico_id: str,
     fecha_desde: Optional[datetime] = Query(None, description="Fecha inicio del período"),
     fecha_hasta: Optional[datetime] = Query(None, description="Fecha fin del período"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
@@ -305,7 +305,7 @@ async def reporte_eficiencia_tecnico(
         fecha_hasta=fecha_hasta
     )
     
-    historiales = controller.obtener_todos_historiales(0, 9999, filtros)
+    historiales = await controller.obtener_todos_historiales(0, 9999, filtros)
     
     # Calcular métricas de eficiencia
     total_servicios = len(historiales)
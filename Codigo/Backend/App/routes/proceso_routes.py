@@ -1,10 +1,10 @@
 # 📁 app/routes/proceso_routes.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.auth_handler import get_current_user
 from app.models.user import User
 from app.controllers.proceso_controller import ProcesoController
@@ -28,7 +28,7 @@ router = APIRouter(
 @router.post("/", response_model=ProcesoResponse, status_code=status.HTTP_201_CREATED)
 async def crear_proceso(
     proceso_data: ProcesoCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -46,12 +46,12 @@ async def crear_proceso(
     - **tecnico_asignado_id**: ID del técnico asignado (opcional)
     """
     controller = ProcesoController(db)
-    return controller.crear_proceso(proceso_data, current_user.id)
+    return await controller.crear_proceso(proceso_data, current_user.id)
 
 @router.get("/{proceso_id}", response_model=ProcesoResponse)
 async def obtener_proceso(
     proceso_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -60,7 +60,7 @@ async def obtener_proceso(
     **RF004 - Gestión de Procesos**
     """
     controller = ProcesoController(db)
-    return controller.obtener_proceso_por_id(proceso_id)
+    return await controller.obtener_proceso_por_id(proceso_id)
 
 @router.get("/", response_model=List[ProcesoResponse])
 async def listar_procesos(
@@ -74,7 +74,7 @@ async def listar_procesos(
     fecha_desde: Optional[datetime] = Query(None, description="Fecha programada desde (YYYY-MM-DD)"),
     fecha_hasta: Optional[datetime] = Query(None, description="Fecha programada hasta (YYYY-MM-DD)"),
     solo_pendientes: bool = Query(False, description="Mostrar solo procesos pendientes"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -105,7 +105,7 @@ async def listar_procesos(
         solo_pendientes=solo_pendientes
     )
     
-    return controller.obtener_todos_procesos(skip, limit, filtros)
+    return await controller.obtener_todos_procesos(skip, limit, filtros)
 
 @router.get("/automovil/{automovil_id}", response_model=List[ProcesoResponse])
 async def obtener_procesos_por_automovil(
@@ -115,7 +115,7 @@ async def obtener_procesos_por_automovil(
     estado: Optional[EstadoProcesoEnum] = Query(None, description="Filtrar por estado"),
     tipo_proceso: Optional[TipoProcesoEnum] = Query(None, description="Filtrar por tipo"),
     solo_pendientes: bool = Query(False, description="Mostrar solo procesos pendientes"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -134,7 +134,7 @@ async def obtener_procesos_por_automovil(
         solo_pendientes=solo_pendientes
     )
     
-    return controller.obtener_procesos_por_automovil(automovil_id, skip, limit, filtros)
+    return await controller.obtener_procesos_por_automovil(automovil_id, skip, limit, filtros)
 
 @router.get("/tecnico/{tecnico_id}", response_model=List[ProcesoResponse])
 async def obtener_procesos_por_tecnico(
@@ -143,7 +143,7 @@ async def obtener_procesos_por_tecnico(
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a retornar"),
     estado: Optional[EstadoProcesoEnum] = Query(None, description="Filtrar por estado"),
     solo_pendientes: bool = Query(False, description="Mostrar solo procesos pendientes"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -158,13 +158,13 @@ async def obtener_procesos_por_tecnico(
         solo_pendientes=solo_pendientes
     )
     
-    return controller.obtener_procesos_por_tecnico(tecnico_id, skip, limit, filtros)
+    return await controller.obtener_procesos_por_tecnico(tecnico_id, skip, limit, filtros)
 
 @router.put("/{proceso_id}", response_model=ProcesoResponse)
 async def actualizar_proceso(
     proceso_id: str,
     proceso_data: ProcesoUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -175,12 +175,12 @@ async def actualizar_proceso(
     Permite actualizar cualquier campo del proceso
     """
     controller = ProcesoController(db)
-    return controller.actualizar_proceso(proceso_id, proceso_data, current_user.id)
+    return await controller.actualizar_proceso(proceso_id, proceso_data, current_user.id)
 
 @router.delete("/{proceso_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def eliminar_proceso(
     proceso_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -191,7 +191,7 @@ async def eliminar_proceso(
     Nota: El proceso se marca como inactivo pero no se elimina físicamente
     """
     controller = ProcesoController(db)
-    controller.eliminar_proceso(proceso_id, current_user.id)
+    await controller.eliminar_proceso(proceso_id, current_user.id)
     return {"message": "Proceso eliminado correctamente"}
 
 @router.patch("/{proceso_id}/estado", response_model=ProcesoResponse)
@@ -199,7 +199,7 @@ async def cambiar_estado_proceso(
     proceso_id: str,
     nuevo_estado: EstadoProcesoEnum,
     observaciones: Optional[str] = Query(None, description="Observaciones del cambio de estado"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -215,13 +215,13 @@ async def cambiar_estado_proceso(
     - PAUSADO: Proceso temporalmente pausado
     """
     controller = ProcesoController(db)
-    return controller.cambiar_estado_proceso(proceso_id, nuevo_estado, current_user.id, observaciones)
+    return await controller.cambiar_estado_proceso(proceso_id, nuevo_estado, current_user.id, observaciones)
 
 @router.patch("/{proceso_id}/asignar-tecnico", response_model=ProcesoResponse)
 async def asignar_tecnico_proceso(
     proceso_id: str,
     tecnico_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -230,14 +230,14 @@ async def asignar_tecnico_proceso(
     **RF004 - Gestión de Procesos**
     """
     controller = ProcesoController(db)
-    return controller.asignar_tecnico(proceso_id, tecnico_id, current_user.id)
+    return await controller.asignar_tecnico(proceso_id, tecnico_id, current_user.id)
 
 @router.patch("/{proceso_id}/cambiar-prioridad", response_model=ProcesoResponse)
 async def cambiar_prioridad_proceso(
     proceso_id: str,
     nueva_prioridad: PrioridadEnum,
     justificacion: Optional[str] = Query(None, description="Justificación del cambio de prioridad"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -252,11 +252,11 @@ async def cambiar_prioridad_proceso(
     - URGENTE: Máxima prioridad
     """
     controller = ProcesoController(db)
-    return controller.cambiar_prioridad(proceso_id, nueva_prioridad, current_user.id, justificacion)
+    return await controller.cambiar_prioridad(proceso_id, nueva_prioridad, current_user.id, justificacion)
 
 @router.get("/pendientes/resumen")
 async def obtener_resumen_pendientes(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -270,13 +270,13 @@ async def obtener_resumen_pendientes(
     - Técnico asignado
     """
     controller = ProcesoController(db)
-    return controller.obtener_resumen_pendientes()
+    return await controller.obtener_resumen_pendientes()
 
 @router.get("/estadisticas/dashboard")
 async def obtener_estadisticas_dashboard(
     automovil_id: Optional[str] = Query(None, description="ID de automóvil específico"),
     tecnico_id: Optional[str] = Query(None, description="ID de técnico específico"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -292,12 +292,12 @@ async def obtener_estadisticas_dashboard(
     - Procesos vencidos
     """
     controller = ProcesoController(db)
-    return controller.obtener_estadisticas_dashboard(automovil_id, tecnico_id)
+    return await controller.obtener_estadisticas_dashboard(automovil_id, tecnico_id)
 
 @router.get("/programados/hoy", response_model=List[ProcesoResponse])
 async def obtener_procesos_programados_hoy(
     tecnico_id: Optional[str] = Query(None, description="Filtrar por técnico específico"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -306,12 +306,12 @@ async def obtener_procesos_programados_hoy(
     **RF004 - Gestión de Procesos**
     """
     controller = ProcesoController(db)
-    return controller.obtener_procesos_programados_hoy(tecnico_id)
+    return await controller.obtener_procesos_programados_hoy(tecnico_id)
 
 @router.get("/vencidos/lista", response_model=List[ProcesoResponse])
 async def obtener_procesos_vencidos(
     dias_vencimiento: int = Query(0, ge=0, description="Días de vencimiento (0 = solo hoy)"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -320,14 +320,14 @@ async def obtener_procesos_vencidos(
     **RF004 - Gestión de Procesos**
     """
     controller = ProcesoController(db)
-    return controller.obtener_procesos_vencidos(dias_vencimiento)
+    return await controller.obtener_procesos_vencidos(dias_vencimiento)
 
 @router.get("/reportes/productividad-tecnico/{tecnico_id}")
 async def reporte_productividad_tecnico(
     tecnico_id: str,
     fecha_desde: Optional[datetime] = Query(None, description="Fecha inicio del período"),
     fecha_hasta: Optional[datetime] = Query(None, description="Fecha fin del período"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -343,7 +343,7 @@ async def reporte_productividad_tecnico(
         fecha_hasta=fecha_hasta
     )
     
-    procesos = controller.obtener_todos_procesos(0, 9999, filtros)
+    procesos = await controller.obtener_todos_procesos(0, 9999, filtros)
     
     # Calcular métricas de productividad
     total_procesos = len(procesos)
@@ -400,7 +400,7 @@ async def reporte_productividad_tecnico(
 async def reporte_eficiencia_general(
     fecha_desde: Optional[datetime] = Query(None, description="Fecha inicio del período"),
     fecha_hasta: Optional[datetime] = Query(None, description="Fecha fin del período"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -415,7 +415,7 @@ async def reporte_eficiencia_general(
         fecha_hasta=fecha_hasta
     )
     
-    procesos = controller.obtener_todos_procesos(0, 9999, filtros)
+    procesos = await controller.obtener_todos_procesos(0, 9999, filtros)
     
     # Métricas generales
     total_procesos = len(procesos)
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query, UploadFile, File
 from fastapi.security import HTTPBearer
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import os
 from datetime import datetime, date
-from app.database import get_db
+from app.database import get_async_db
 from app.auth.auth_handler import JWTBearer, get_current_user
 from app.controllers.reporte_controller import ReporteController
 from app.schemas.reporte import (
@@ -14,6 +15,7 @@ from app.schemas.reporte import (
     TemplateReporte, TipoReporte
 )
 from app.schemas.user import UserCurrent
+from app.services.file_delivery import FileDeliveryResponse, cache_control
 
 router = APIRouter(
     prefix="/api/v1/reportes",
@@ -25,7 +27,7 @@ router = APIRouter(
 @router.post("/", response_model=ReporteResponse, status_code=status.HTTP_201_CREATED)
 async def crear_reporte(
     reporte_data: ReporteCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -62,7 +64,7 @@ async def listar_reportes(
     tecnico_id: Optional[int] = Query(None, description="Filtrar por técnico"),
     cliente_id: Optional[int] = Query(None, description="Filtrar por cliente"),
     search: Optional[str] = Query(None, description="Búsqueda en título y descripción"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -95,7 +97,7 @@ async def listar_reportes(
 @router.get("/{reporte_id}", response_model=ReporteResponse)
 async def obtener_reporte(
     reporte_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -114,7 +116,7 @@ async def obtener_reporte(
 async def actualizar_reporte(
     reporte_id: int,
     reporte_data: ReporteUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -135,7 +137,7 @@ async def actualizar_reporte(
 @router.delete("/{reporte_id}")
 async def eliminar_reporte(
     reporte_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -158,7 +160,7 @@ async def eliminar_reporte(
 async def cambiar_estado_reporte(
     reporte_id: int,
     estado_data: CambiarEstadoReporte,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -187,7 +189,7 @@ async def cambiar_estado_reporte(
 async def aprobacion_cliente(
     reporte_id: int,
     aprobacion_data: AprobacionCliente,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -209,7 +211,7 @@ async def aprobacion_cliente(
 async def firmar_reporte(
     reporte_id: int,
     firma_data: FirmaReporte,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -232,7 +234,7 @@ async def obtener_estadisticas_reportes(
     fecha_inicio: Optional[date] = Query(None, description="Fecha inicio para estadísticas"),
     fecha_fin: Optional[date] = Query(None, description="Fecha fin para estadísticas"),
     tecnico_id: Optional[int] = Query(None, description="Estadísticas por técnico"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -249,7 +251,7 @@ async def obtener_estadisticas_reportes(
 @router.get("/automovil/{automovil_id}", response_model=List[ReporteSimple])
 async def reportes_por_automovil(
     automovil_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -268,7 +270,7 @@ async def reportes_por_automovil(
 @router.get("/plantillas/tipos", response_model=List[TemplateReporte])
 async def obtener_plantillas_reportes(
     tipo: Optional[TipoReporte] = Query(None, description="Filtrar plantillas por tipo"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -287,7 +289,7 @@ async def subir_adjunto_reporte(
     reporte_id: int,
     file: UploadFile = File(...),
     descripcion: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -296,18 +298,46 @@ async def subir_adjunto_reporte(
     """
     try:
         controller = ReporteController()
-        return await controller.subir_adjunto_reporte(db, reporte_id, file, descripcion, current_user.id)
+        return await controller.subir_adjunto_reporte(
+            db, reporte_id, file, descripcion, current_user.usuario_id, current_user.is_admin()
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error interno: {str(e)}")
 
+# 📎 DESCARGAR ADJUNTO DEL REPORTE
+@router.api_route("/{reporte_id}/adjuntos/{nombre}", methods=["GET", "HEAD"])
+async def descargar_adjunto_reporte(
+    reporte_id: int,
+    nombre: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserCurrent = Depends(get_current_user)
+):
+    """
+    Descargar un adjunto del reporte (solo admin, creador o técnico
+    responsable). Admite Range y responde 304 si el ETag sigue vigente.
+    """
+    file_path = await ReporteController.obtener_adjunto(
+        db, reporte_id, nombre, current_user.usuario_id, current_user.is_admin()
+    )
+    return FileDeliveryResponse(
+        file_path,
+        os.stat(file_path),
+        request.headers,
+        cache_control(file_path, privado=True),
+        method=request.method
+    )
+
 # 📥 EXPORTAR REPORTE
 @router.get("/{reporte_id}/exportar")
 async def exportar_reporte(
     reporte_id: int,
     formato: str = Query("pdf", regex="^(pdf|excel|word)$", description="Formato de exportación"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -342,7 +372,7 @@ async def exportar_reporte(
 async def duplicar_reporte(
     reporte_id: int,
     automovil_id: Optional[int] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -360,7 +390,7 @@ async def duplicar_reporte(
 # 📈 REPORTES PENDIENTES
 @router.get("/pendientes/revision", response_model=List[ReporteSimple])
 async def reportes_pendientes_revision(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -380,7 +410,7 @@ async def reportes_pendientes_revision(
 async def notificar_cliente_reporte(
     reporte_id: int,
     mensaje_personalizado: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -400,7 +430,7 @@ async def notificar_cliente_reporte(
 async def agregar_comentario_reporte(
     reporte_id: int,
     comentario: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
@@ -421,7 +451,7 @@ async def gestionar_etiquetas_reporte(
     reporte_id: int,
     etiquetas: List[str],
     accion: str = Query("agregar", regex="^(agregar|quitar|reemplazar)$"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserCurrent = Depends(get_current_user)
 ):
     """
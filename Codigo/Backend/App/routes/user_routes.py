@@ -1,13 +1,15 @@
 # app/routes/users.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Form, File, UploadFile
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_async_db
 from app.controllers.user_controller import UserController
-from app.schemas.user import UserResponse, UserUpdate, UserListResponse, UserCreate, PasswordChangeRequest
-from app.auth.auth_handler import get_current_user, get_current_admin_user
+from app.schemas.user import UserResponse, UserUpdate, UserListResponse, UserCreate, PasswordChangeRequest, UserImportResponse
+from app.auth.auth_handler import get_current_user, require_permissions
+from app.auth.permissions import Permiso
 from app.models.user import User
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -19,10 +21,11 @@ async def get_all_users(
     search: Optional[str] = Query(None),
     role_filter: Optional[str] = Query(None),
     status_filter: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    count_mode: str = Query("exact", regex="^(exact|approx)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
 ):
-    return UserController.get_users_paginated(db, current_user, page, size, search, role_filter, status_filter)
+    return await UserController.get_users_paginated(db, current_user, page, size, search, role_filter, status_filter, count_mode)
 
 
 @router.get("/me", response_model=UserResponse)
@@ -32,22 +35,48 @@ async def get_my_profile(
     return current_user
 
 
+# ✅ Exportación masiva en streaming (CSV o NDJSON)
+@router.get("/export")
+async def export_users(
+    formato: str = Query("csv", regex="^(csv|ndjson)$"),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
+):
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        UserController.export_users(formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="usuarios.{formato}"'}
+    )
+
+
+# ✅ Importación masiva (CSV con encabezados o NDJSON, todo o nada)
+@router.post("/import", response_model=UserImportResponse, status_code=status.HTTP_201_CREATED)
+async def import_users(
+    file: UploadFile = File(...),
+    formato: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
+):
+    formato = UserController.detect_import_format(file.filename, formato)
+    return await UserController.import_users(db, file, formato)
+
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return UserController.get_user_by_id(db, user_id, current_user)
+    return await UserController.get_user_by_id(db, user_id, current_user)
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_my_profile(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return UserController.update_user(db, current_user.usuario_id, user_update, current_user)
+    return await UserController.update_user(db, current_user.usuario_id, user_update, current_user)
 
 
 @router.put("/me/form", response_model=UserResponse)
@@ -58,10 +87,10 @@ async def update_my_profile_form(
     tipo_identificacion: str = Form(...),
     numero_identificacion: str = Form(...),
     foto_perfil: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return UserController.update_user_with_file(
+    return await UserController.update_user_with_file(
         db=db,
         user_id=current_user.usuario_id,
         current_user=current_user,
@@ -78,28 +107,28 @@ async def update_my_profile_form(
 async def update_user_by_admin_or_self(
     user_id: int,
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return UserController.update_user(db, user_id, user_update, current_user)
+    return await UserController.update_user(db, user_id, user_update, current_user)
 
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
 ):
-    return UserController.delete_user(db, user_id, current_user)
+    return await UserController.delete_user(db, user_id, current_user)
 
 
 @router.patch("/{user_id}/toggle-status", response_model=UserResponse)
 async def toggle_user_status(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
 ):
-    return UserController.toggle_user_status(db, user_id, current_user)
+    return await UserController.toggle_user_status(db, user_id, current_user)
 
 
 # ✅ Ruta para cambiar contraseña
@@ -107,17 +136,17 @@ async def toggle_user_status(
 async def change_password(
     user_id: int,
     password_data: PasswordChangeRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return UserController.change_password(db, user_id, password_data, current_user)
+    return await UserController.change_password(db, user_id, password_data, current_user)
 
 
 # ✅ Ruta para crear un nuevo usuario (solo admin por seguridad)
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_permissions(Permiso.USUARIOS_GESTIONAR))
 ):
-    return UserController.create_user(db, user_data)
+    return await UserController.create_user(db, user_data)
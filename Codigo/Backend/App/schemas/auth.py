@@ -59,6 +59,7 @@ class TokenResponse(BaseModel):
     token_type: str = Field(default="bearer", description="Tipo de token")
     expires_in: int = Field(..., description="Tiempo de expiración en segundos")
     user_info: dict = Field(..., description="Información básica del usuario")
+    refresh_token: Optional[str] = Field(None, description="Token de renovación (un solo uso)")
     
     class Config:
         json_schema_extra = {
@@ -75,6 +76,9 @@ class TokenResponse(BaseModel):
             }
         }
 
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, description="Token de renovación emitido en el login")
+
 class UserInfo(BaseModel):
     usuario_id: int
     nombre_completo: str
@@ -173,9 +173,9 @@ class ChatListResponse(BaseModel):
     total_pages: int
     
 class MensajeListResponse(BaseModel):
-    """Respuesta paginada para lista de mensajes"""
+    """Respuesta paginada por cursor para lista de mensajes"""
     mensajes: List[MensajeChatResponse]
-    total: int
-    page: int = 1
     per_page: int = 50
-    total_pages: int
\ No newline at end of file
+    has_more: bool = False
+    before_id: Optional[int] = None  # Cursor para cargar mensajes anteriores
+    after_id: Optional[int] = None   # Cursor para consultar mensajes nuevos
\ No newline at end of file
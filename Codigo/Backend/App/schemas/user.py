@@ -113,6 +113,7 @@ class UserListResponse(BaseModel):
     page: int
     size: int
     total_pages: int
+    total_aproximado: bool = False
 
     model_config = {
         "json_schema_extra": {
@@ -121,12 +122,19 @@ class UserListResponse(BaseModel):
                 "total": 50,
                 "page": 1,
                 "size": 10,
-                "total_pages": 5
+                "total_pages": 5,
+                "total_aproximado": False
             }
         }
     }
 
 
+# Importación masiva
+class UserImportResponse(BaseModel):
+    creados: int
+    formato: str
+
+
 # Cambio de contraseña
 class PasswordChangeRequest(BaseModel):
     current_password: str = Field(..., min_length=1)
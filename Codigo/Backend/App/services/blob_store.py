@@ -0,0 +1,306 @@
+# app/services/blob_store.py
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import FrozenSet, List, Optional
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.blob import Blob
+
+logger = logging.getLogger(__name__)
+
+# Clave de un blob: sha256 + extensión
+NOMBRE_BLOB = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,5})$")
+# Blob o derivado de imagen ({sha256}_{nombre}.{ext}): su contenido nunca cambia
+NOMBRE_CONTENIDO = re.compile(r"^([0-9a-f]{64})(?:_[a-z]+)?\.[a-z0-9]{1,5}$")
+# Cualquier archivo del almacén (incluye la marca .failed de las imágenes)
+NOMBRE_ARCHIVO = re.compile(r"^([0-9a-f]{64})[._]")
+
+EXTENSIONES_IMAGEN = frozenset({".jpg", ".jpeg", ".png", ".gif", ".webp"})
+EXTENSIONES_DOCUMENTO = frozenset({".pdf", ".doc", ".docx", ".txt", ".zip"})
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    clave: str
+    sha256: str
+    tamano: int
+    path: str
+    nuevo: bool
+
+
+class BlobStore:
+    """
+    Almacén de archivos direccionado por contenido. Cada contenido se guarda
+    una sola vez en {root}/ab/cd/{sha256}{ext}; la tabla blobs cuenta sus
+    referencias por almacén y la recolección periódica borra los que quedan
+    sin referencias. El almacén privado (chat y reportes) vive fuera de
+    /media y solo se sirve por rutas autenticadas; el público (fotos de
+    perfil) cuelga de /media.
+    """
+
+    def __init__(
+        self,
+        almacen: str,
+        root: str,
+        extensiones: FrozenSet[str],
+        url_prefix: Optional[str] = None,
+        tmp_dir: Optional[str] = None,
+        chunk_size: int = 64 * 1024
+    ):
+        self.almacen = almacen
+        self.root = root
+        self.extensiones = extensiones
+        self.url_prefix = url_prefix
+        # Temporales fuera de root (y de /media) en el mismo sistema de archivos
+        self.tmp_dir = tmp_dir or settings.BLOB_TMP_DIR
+        self.chunk_size = chunk_size
+        self._gc_task: Optional[asyncio.Task] = None
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    # Rutas y nombres
+    def path_for(self, clave: str) -> str:
+        return os.path.join(self.root, clave[:2], clave[2:4], clave)
+
+    def url_for(self, clave: str) -> str:
+        """URL pública (solo almacenes montados bajo /media)"""
+        return f"{self.url_prefix}/{clave[:2]}/{clave[2:4]}/{clave}"
+
+    def path_from_name(self, name: str) -> Optional[str]:
+        """Ruta de un blob o derivado a partir de su nombre (None si no es válido)"""
+        if not NOMBRE_CONTENIDO.match(name):
+            return None
+        return os.path.join(self.root, name[:2], name[2:4], name)
+
+    def es_clave(self, name: Optional[str]) -> bool:
+        match = NOMBRE_BLOB.match(name or "")
+        return match is not None and match.group(2) in self.extensiones
+
+    def clave_from_url(self, url: Optional[str]) -> Optional[str]:
+        """Clave del blob al que apunta una URL pública generada por url_for"""
+        name = (url or "").rsplit("/", 1)[-1]
+        if self.url_prefix is None or not self.es_clave(name):
+            return None
+        return name if url.lstrip("/") == self.url_for(name) else None
+
+    def es_url(self, url: Optional[str]) -> bool:
+        """True si la URL apunta a este almacén (aunque no sea una clave válida)"""
+        return self.url_prefix is not None and (url or "").lstrip("/").startswith(f"{self.url_prefix}/")
+
+    # Escritura y referencias
+    async def store(self, db: AsyncSession, file: UploadFile, extension: str, max_size: int) -> StoredBlob:
+        """
+        Guardar el archivo subido (por bloques, con tope de tamaño y SHA-256
+        incremental) y sumar una referencia. No hace commit: la referencia se
+        confirma junto con el registro que la usa.
+        """
+        extension = (extension or "").lower()
+        if extension not in self.extensiones:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Tipo de archivo no permitido. Permitidos: {', '.join(sorted(self.extensiones))}"
+            )
+        if file.size is not None and file.size > max_size:
+            raise self._too_large(max_size)
+
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        tamano = 0
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    tamano += len(chunk)
+                    if tamano > max_size:
+                        raise self._too_large(max_size)
+                    digest.update(chunk)
+                    await f.write(chunk)
+
+            sha256 = digest.hexdigest()
+            clave = f"{sha256}{extension}"
+            path = self.path_for(clave)
+            nuevo = await run_in_threadpool(self._publish, tmp_path, path)
+        except BaseException:
+            await run_in_threadpool(self._discard, tmp_path)
+            raise
+
+        await self._incref(db, clave, sha256, tamano)
+        return StoredBlob(clave, sha256, tamano, path, nuevo)
+
+    def _publish(self, tmp_path: str, path: str) -> bool:
+        """Mover el temporal a su ruta definitiva; False si el contenido ya existía"""
+        if os.path.exists(path):
+            # Contenido repetido: se reutiliza y se marca como recién usado para la recolección
+            os.remove(tmp_path)
+            os.utime(path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    def _discard(self, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    async def _incref(self, db: AsyncSession, clave: str, sha256: str, tamano: int):
+        for _ in range(2):
+            result = await db.execute(
+                update(Blob)
+                .where(Blob.almacen == self.almacen, Blob.clave == clave)
+                .values(referencias=Blob.referencias + 1)
+            )
+            if result.rowcount:
+                return
+            try:
+                async with db.begin_nested():
+                    db.add(Blob(almacen=self.almacen, clave=clave, sha256=sha256, tamano=tamano, referencias=1))
+                return
+            except IntegrityError:
+                # Otro proceso insertó la misma clave: reintentar como incremento
+                continue
+        raise HTTPException(status_code=500, detail="No se pudo registrar el archivo")
+
+    async def release(self, db: AsyncSession, clave: Optional[str]):
+        """
+        Quitar una referencia (no hace commit). El llamador debe haber
+        comprobado que su registro tenía esa referencia.
+        """
+        if not self.es_clave(clave):
+            return
+        await db.execute(
+            update(Blob)
+            .where(Blob.almacen == self.almacen, Blob.clave == clave, Blob.referencias > 0)
+            .values(referencias=Blob.referencias - 1)
+        )
+
+    # Recolección de basura
+    async def collect_garbage(self, grace_seconds: float = None) -> int:
+        """
+        Borrar los blobs sin referencias desde hace más de grace_seconds, los
+        archivos sin fila (subidas cuya transacción no se confirmó) y los
+        temporales abandonados.
+        """
+        grace_seconds = settings.BLOB_GC_GRACE if grace_seconds is None else grace_seconds
+        limite_ts = time.time() - grace_seconds
+        limite = datetime.now() - timedelta(seconds=grace_seconds)
+        borrados = 0
+
+        async with AsyncSessionLocal() as db:
+            claves = list(await db.scalars(
+                select(Blob.clave).where(
+                    Blob.almacen == self.almacen,
+                    Blob.referencias <= 0,
+                    Blob.updated_at < limite
+                ).limit(1000)
+            ))
+            for clave in claves:
+                result = await db.execute(
+                    delete(Blob).where(Blob.almacen == self.almacen, Blob.clave == clave, Blob.referencias <= 0)
+                )
+                if result.rowcount:
+                    borrados += 1
+            await db.commit()
+            await run_in_threadpool(self._remove_files, [clave[:64] for clave in claves], limite_ts)
+
+            # Archivos sin fila en la tabla
+            huerfanos = await run_in_threadpool(self._scan_old_files, limite_ts)
+            for inicio in range(0, len(huerfanos), 500):
+                lote = huerfanos[inicio:inicio + 500]
+                existentes = set(await db.scalars(
+                    select(Blob.sha256).where(Blob.almacen == self.almacen, Blob.sha256.in_(lote))
+                ))
+                sin_fila = [sha256 for sha256 in lote if sha256 not in existentes]
+                await run_in_threadpool(self._remove_files, sin_fila, limite_ts)
+                borrados += len(sin_fila)
+
+        await run_in_threadpool(self._remove_old_tmp_files, limite_ts)
+
+        if borrados:
+            logger.info(f"Recolección de blobs ({self.almacen}): {borrados} eliminados")
+        return borrados
+
+    def _scan_old_files(self, limite_ts: float) -> List[str]:
+        """sha256 de los blobs en disco sin modificar desde limite_ts"""
+        shas = set()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                match = NOMBRE_ARCHIVO.match(name)
+                if match and os.path.getmtime(os.path.join(dirpath, name)) < limite_ts:
+                    shas.add(match.group(1))
+        return list(shas)
+
+    def _remove_files(self, shas: List[str], limite_ts: float):
+        """Borrar cada contenido con sus derivados, salvo que se haya reutilizado hace poco"""
+        for sha256 in shas:
+            directorio = os.path.join(self.root, sha256[:2], sha256[2:4])
+            if not os.path.isdir(directorio):
+                continue
+            for name in os.listdir(directorio):
+                if name.startswith(sha256):
+                    path = os.path.join(directorio, name)
+                    if os.path.getmtime(path) < limite_ts:
+                        os.remove(path)
+
+    def _remove_old_tmp_files(self, limite_ts: float):
+        """Borrar los temporales de subidas abandonadas"""
+        for name in os.listdir(self.tmp_dir):
+            tmp_path = os.path.join(self.tmp_dir, name)
+            try:
+                if os.path.getmtime(tmp_path) < limite_ts:
+                    os.remove(tmp_path)
+            except FileNotFoundError:
+                # Lo recogió la recolección del otro almacén
+                pass
+
+    async def start(self):
+        self._gc_task = asyncio.create_task(self._gc_loop())
+
+    async def stop(self):
+        if self._gc_task:
+            self._gc_task.cancel()
+
+    async def _gc_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(settings.BLOB_GC_INTERVAL)
+                await self.collect_garbage()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en la recolección de blobs ({self.almacen}): {e}")
+
+    def _too_large(self, max_size: int) -> HTTPException:
+        return HTTPException(
+            status_code=413,
+            detail=f"Archivo muy grande. Máximo {max_size // (1024*1024)}MB"
+        )
+
+
+# Chat y adjuntos de reportes: fuera de /media, solo por rutas autenticadas
+blob_store = BlobStore(
+    almacen="privado",
+    root=settings.BLOB_DIR,
+    extensiones=EXTENSIONES_IMAGEN | EXTENSIONES_DOCUMENTO
+)
+# Fotos de perfil: públicas bajo /media/fotos
+public_blob_store = BlobStore(
+    almacen="publico",
+    root=os.path.join(settings.MEDIA_DIR, "fotos"),
+    extensiones=frozenset({".jpg", ".jpeg", ".png", ".webp"}),
+    url_prefix="media/fotos"
+)
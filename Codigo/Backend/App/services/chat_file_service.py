@@ -1,49 +1,60 @@
 # app/services/chat_file_service.py
 import os
-import uuid
-import aiofiles
-from typing import Optional, Tuple
+import asyncio
+from typing import Dict, Optional, Set, Tuple
 from fastapi import UploadFile, HTTPException
-from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
-from app.config import settings
+from app.models.chat import MensajeChat
+from app.services.blob_store import blob_store
+from app.services.image_pipeline import (
+    image_pipeline, DERIVADOS, ESTADO_LISTO, ruta_derivado
+)
+from app.services.websocket_service import websocket_manager
 
 logger = logging.getLogger(__name__)
 
+# Prefijo de las URLs de archivos del chat (solo se sirven por la ruta autenticada)
+CHAT_FILES_PREFIX = "/api/v1/chat/files"
+
 class ChatFileService:
     """Servicio para gestionar archivos en el chat"""
     
     def __init__(self):
         # Configuración de archivos
+        # Subidas anteriores al almacén por contenido (solo lectura)
         self.upload_dir = "uploads/chat"
         self.max_file_size = 10 * 1024 * 1024  # 10MB
-        self.allowed_image_types = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+        # content-type permitido -> extensión con la que se guarda (no se usa la del cliente)
+        self.allowed_image_types = {
+            "image/jpeg": ".jpg",
+            "image/png": ".png",
+            "image/gif": ".gif",
+            "image/webp": ".webp"
+        }
         self.allowed_file_types = {
-            "application/pdf",
-            "application/msword",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "text/plain",
-            "application/zip",
-            "application/x-zip-compressed"
+            "application/pdf": ".pdf",
+            "application/msword": ".doc",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+            "text/plain": ".txt",
+            "application/zip": ".zip",
+            "application/x-zip-compressed": ".zip"
         }
         
-        # Crear directorio si no existe
-        os.makedirs(self.upload_dir, exist_ok=True)
+        # Tareas que avisan al chat cuando los derivados están listos
+        self._notify_tasks: Set[asyncio.Task] = set()
         
-    async def upload_chat_file(self, file: UploadFile, chat_id: int, user_id: int) -> Tuple[str, str]:
+    async def upload_chat_file(self, db: AsyncSession, file: UploadFile, chat_id: int, user_id: int) -> Tuple[str, str, str]:
         """
-        Subir archivo al chat
-        Returns: (file_url, file_type)
+        Subir archivo al chat. El contenido se guarda en el almacén por
+        contenido (un archivo repetido no ocupa espacio de nuevo) y la
+        referencia se confirma con el commit del llamador, que debe guardar
+        file_url en el archivo_url de un mensaje del chat. Las imágenes quedan
+        en estado "pendiente" hasta que el pool de procesos genera sus derivados.
+        Returns: (file_url, file_type, estado)
         """
         try:
-            # Validar tamaño
-            content = await file.read()
-            if len(content) > self.max_file_size:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"Archivo muy grande. Máximo {self.max_file_size // (1024*1024)}MB"
-                )
-            
             # Validar tipo de archivo
             file_type = self._determine_file_type(file.content_type)
             if not file_type:
@@ -52,60 +63,95 @@ class ChatFileService:
                     detail="Tipo de archivo no permitido"
                 )
             
-            # Generar nombre único
-            file_extension = self._get_file_extension(file.filename)
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            
-            # Crear subdirectorio por chat
-            chat_dir = os.path.join(self.upload_dir, str(chat_id))
-            os.makedirs(chat_dir, exist_ok=True)
+            # Guardar por bloques (tamaño acotado y hash incremental)
+            file_extension = {**self.allowed_image_types, **self.allowed_file_types}[file.content_type]
+            blob = await blob_store.store(db, file, file_extension, self.max_file_size)
             
-            file_path = os.path.join(chat_dir, unique_filename)
-            
-            # Guardar archivo
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(content)
+            # Generar URL
+            file_url = self.file_url(chat_id, blob.clave)
             
-            # Procesar imagen si es necesario
+            # Procesar imagen en segundo plano (no bloquea la respuesta); los
+            # derivados se comparten entre las copias del mismo contenido
+            estado = ESTADO_LISTO
             if file_type == "IMAGEN":
-                await self._process_image(file_path)
-            
-            # Generar URL
-            file_url = f"/api/v1/chat/files/{chat_id}/{unique_filename}"
+                estado = image_pipeline.status(blob.path)
+                if blob.nuevo or estado != ESTADO_LISTO:
+                    estado = self._start_image_processing(blob.path, chat_id, file_url)
             
-            logger.info(f"Archivo subido: {file_url} por usuario {user_id}")
+            logger.info(
+                f"Archivo subido: {file_url} ({blob.tamano} bytes, "
+                f"{'nuevo' if blob.nuevo else 'deduplicado'}) por usuario {user_id}"
+            )
             
-            return file_url, file_type
+            return file_url, file_type, estado
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error subiendo archivo: {e}")
             raise HTTPException(status_code=500, detail="Error interno subiendo archivo")
             
-    async def get_chat_file(self, chat_id: int, filename: str) -> Optional[str]:
-        """Obtener ruta del archivo del chat"""
+    def file_url(self, chat_id: int, filename: str) -> str:
+        return f"{CHAT_FILES_PREFIX}/{chat_id}/{filename}"
+    
+    def es_url_de_archivo(self, url: Optional[str]) -> bool:
+        """True si la URL apunta a un archivo del chat (solo la genera upload_chat_file)"""
+        return bool(url) and url.startswith(f"{CHAT_FILES_PREFIX}/")
+    
+    async def get_chat_file(self, db: AsyncSession, chat_id: int, filename: str) -> Optional[str]:
+        """
+        Obtener ruta del archivo del chat (almacén por contenido o subida
+        anterior). Solo se sirve si un mensaje de este chat lo referencia; los
+        derivados de una imagen se sirven si el chat referencia la original.
+        """
         try:
-            file_path = os.path.join(self.upload_dir, str(chat_id), filename)
+            file_path = blob_store.path_from_name(filename)
+            if file_path is not None:
+                referencia = MensajeChat.archivo_url.startswith(
+                    self.file_url(chat_id, f"{filename[:64]}."), autoescape=True
+                )
+            else:
+                file_path = os.path.join(self.upload_dir, str(chat_id), os.path.basename(filename))
+                referencia = MensajeChat.archivo_url == self.file_url(chat_id, filename)
             
-            if os.path.exists(file_path):
-                return file_path
-            return None
+            mensaje_id = await db.scalar(
+                select(MensajeChat.id).where(MensajeChat.chat_id == chat_id, referencia).limit(1)
+            )
+            if mensaje_id is None or not os.path.exists(file_path):
+                return None
+            return file_path
             
         except Exception as e:
             logger.error(f"Error obteniendo archivo: {e}")
             return None
             
-    async def delete_chat_file(self, chat_id: int, filename: str) -> bool:
-        """Eliminar archivo del chat"""
+    async def delete_chat_file(self, db: AsyncSession, chat_id: int, filename: str, usuario_id: int) -> bool:
+        """
+        Quitar un archivo de un mensaje propio del chat y su referencia en el
+        almacén. El contenido y sus derivados se borran en la recolección,
+        cuando ya nadie lo referencia.
+        """
         try:
-            file_path = os.path.join(self.upload_dir, str(chat_id), filename)
-            
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Archivo eliminado: {file_path}")
-                return True
-            return False
+            clave = filename if blob_store.es_clave(filename) else None
+            mensaje = await db.scalar(
+                select(MensajeChat).where(
+                    MensajeChat.chat_id == chat_id,
+                    MensajeChat.remitente_id == usuario_id,
+                    MensajeChat.archivo_url == self.file_url(chat_id, filename)
+                ).limit(1).with_for_update()
+            )
+            if mensaje is None:
+                return False
+            
+            # El mensaje deja de referenciarlo: repetir la llamada no descuenta de nuevo
+            mensaje.archivo_url = None
+            await blob_store.release(db, clave)
+            await db.commit()
+            logger.info(f"Referencia a archivo liberada: chat {chat_id}, {filename}")
+            return True
             
         except Exception as e:
+            await db.rollback()
             logger.error(f"Error eliminando archivo: {e}")
             return False
             
@@ -124,24 +170,36 @@ class ChatFileService:
             return ""
         return os.path.splitext(filename)[1].lower()
         
-    async def _process_image(self, file_path: str):
-        """Procesar imagen (redimensionar, optimizar)"""
+    def _start_image_processing(self, file_path: str, chat_id: int, file_url: str) -> str:
+        """Enviar la imagen al pool de procesos y avisar al chat cuando termine"""
+        future = image_pipeline.submit(file_path)
+        task = asyncio.create_task(self._notify_when_processed(future, file_path, chat_id, file_url))
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+        return image_pipeline.status(file_path)
+    
+    async def _notify_when_processed(self, future, file_path: str, chat_id: int, file_url: str):
         try:
-            with Image.open(file_path) as img:
-                # Convertir a RGB si es necesario
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                
-                # Redimensionar si es muy grande
-                max_size = (1920, 1080)
-                if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    
-                # Guardar optimizada
-                img.save(file_path, optimize=True, quality=85)
-                
-        except Exception as e:
-            logger.warning(f"Error procesando imagen {file_path}: {e}")
+            await future
+        except Exception:
+            pass
+        await websocket_manager.broadcast_to_chat(chat_id, {
+            "tipo": "archivo_procesado",
+            "archivo_url": file_url,
+            **self.get_file_status(chat_id, os.path.basename(file_path))
+        })
+    
+    def get_file_status(self, chat_id: int, filename: str) -> Dict:
+        """Estado del procesamiento de un archivo y URLs de sus derivados"""
+        file_path = blob_store.path_from_name(filename) or os.path.join(self.upload_dir, str(chat_id), filename)
+        estado = image_pipeline.status(file_path)
+        derivados = {}
+        if estado == ESTADO_LISTO:
+            derivados = {
+                nombre: self.file_url(chat_id, os.path.basename(ruta_derivado(file_path, nombre)))
+                for nombre in DERIVADOS
+            }
+        return {"estado": estado, "derivados": derivados}
             
     def get_file_info(self, file_path: str) -> dict:
         """Obtener información del archivo"""
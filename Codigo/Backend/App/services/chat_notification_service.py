@@ -203,15 +203,8 @@ class ChatNotificationService:
         try:
             # Verificar qué usuarios están desconectados
             for user_id in destinatarios:
-                # Verificar si el usuario está conectado
-                is_online = False
-                for chat_id, connections in websocket_manager.active_connections.items():
-                    if any(conn["user_id"] == user_id for conn in connections):
-                        is_online = True
-                        break
-                
                 # Si no está conectado, enviar notificación push/email
-                if not is_online:
+                if not websocket_manager.is_user_online(user_id):
                     user = db.query(User).filter(User.id == user_id).first()
                     if user:
                         await self._send_push_notification(user, chat, mensaje, remitente)
@@ -0,0 +1,211 @@
+# app/services/file_delivery.py
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Mapping, Optional, Tuple
+import aiofiles
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from app.config import settings
+from app.services.blob_store import NOMBRE_CONTENIDO
+
+logger = logging.getLogger(__name__)
+
+# Extensión ASGI de envío sin copia (el servidor hace sendfile del descriptor)
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+RANGO_BYTES = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def es_nombre_por_contenido(path: str) -> bool:
+    """Blobs y derivados se nombran por su SHA-256: su contenido nunca cambia"""
+    return NOMBRE_CONTENIDO.match(os.path.basename(path)) is not None
+
+
+def cache_control(path: str, privado: bool = False) -> str:
+    """Inmutable para nombres por contenido; el resto se revalida con el ETag"""
+    alcance = "private" if privado else "public"
+    if es_nombre_por_contenido(path):
+        return f"{alcance}, max-age={settings.FILE_CACHE_MAX_AGE}, immutable"
+    return f"{alcance}, no-cache"
+
+
+class ContentHashCache:
+    """
+    SHA-256 de los archivos que no se nombran por contenido (subidas
+    anteriores al almacén), con clave (ruta, tamaño, mtime) para que un
+    archivo reescrito se vuelva a calcular. LRU acotado por proceso.
+    """
+
+    def __init__(self, max_size: int = 2048, chunk_size: int = 1024 * 1024):
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self._hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+    async def get(self, path: str, stat_result: os.stat_result) -> str:
+        key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is not None:
+            self._hashes.move_to_end(key)
+            return digest
+
+        digest = await run_in_threadpool(self._hash_file, path)
+        self._hashes[key] = digest
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+        return digest
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+content_hash_cache = ContentHashCache()
+
+
+class FileDeliveryResponse(Response):
+    """
+    Respuesta de archivo con ETag fuerte derivado del contenido, 304 para
+    If-None-Match, un rango de bytes (206/416, respetando If-Range) y envío
+    sin copia cuando el servidor ASGI ofrece la extensión zerocopysend; si no,
+    se lee por bloques sin cargar el archivo en memoria.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        request_headers: Mapping[str, str],
+        cache_control: str,
+        method: str = "GET"
+    ):
+        self.path = path
+        self.stat_result = stat_result
+        self.request_headers = request_headers
+        self.method = method
+        self.background = None
+        self.body = b""
+        self.status_code = 200
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self._base_headers = {
+            "cache-control": cache_control,
+            "accept-ranges": "bytes",
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        self.init_headers(self._base_headers)
+
+    async def etag(self) -> str:
+        name = os.path.basename(self.path)
+        if es_nombre_por_contenido(name):
+            return f'"{os.path.splitext(name)[0]}"'
+        return f'"{await content_hash_cache.get(self.path, self.stat_result)}"'
+
+    @staticmethod
+    def _etag_coincide(etag: str, if_none_match: str) -> bool:
+        candidatos = [tag.strip() for tag in if_none_match.split(",")]
+        # Comparación débil (RFC 9110): W/"x" equivale a "x"
+        return "*" in candidatos or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidatos]
+
+    def _parse_range(self, etag: str) -> Optional[Tuple[int, int]]:
+        """
+        (inicio, fin) inclusivos del rango pedido, None para enviar el archivo
+        completo o (-1, -1) si el rango no se puede satisfacer. Varios rangos
+        se responden con el archivo completo, como permite la RFC.
+        """
+        header = self.request_headers.get("range")
+        if not header:
+            return None
+        if_range = self.request_headers.get("if-range")
+        if if_range and if_range.strip() != etag:
+            return None
+        match = RANGO_BYTES.match(header.strip())
+        if not match or match.group(1) == match.group(2) == "":
+            return None
+
+        size = self.stat_result.st_size
+        inicio, fin = match.groups()
+        if inicio == "":
+            # Sufijo: los últimos N bytes
+            largo = int(fin)
+            if largo == 0:
+                return -1, -1
+            return max(0, size - largo), size - 1
+        inicio = int(inicio)
+        fin = size - 1 if fin == "" else min(int(fin), size - 1)
+        if inicio >= size or inicio > fin:
+            return -1, -1
+        return inicio, fin
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        etag = await self.etag()
+        headers = {**self._base_headers, "etag": etag}
+        size = self.stat_result.st_size
+        inicio, fin = 0, size - 1
+
+        if_none_match = self.request_headers.get("if-none-match")
+        no_modificado = bool(if_none_match) and self._etag_coincide(etag, if_none_match)
+        rango = None if no_modificado else self._parse_range(etag)
+        if no_modificado:
+            self.status_code = 304
+        elif rango == (-1, -1):
+            self.status_code = 416
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+        elif rango is not None:
+            self.status_code = 206
+            inicio, fin = rango
+            headers["content-range"] = f"bytes {inicio}-{fin}/{size}"
+            headers["content-length"] = str(fin - inicio + 1)
+        else:
+            headers["content-length"] = str(size)
+        self.init_headers(headers)
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        enviar_cuerpo = self.method != "HEAD" and self.status_code in (200, 206) and size > 0
+        if not enviar_cuerpo:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        count = fin - inicio + 1
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({"type": ZEROCOPY_EXTENSION, "file": f, "offset": inicio, "count": count, "more_body": False})
+            return
+
+        async with aiofiles.open(self.path, "rb") as f:
+            await f.seek(inicio)
+            restante = count
+            while restante > 0:
+                chunk = await f.read(min(self.chunk_size, restante))
+                if not chunk:
+                    break
+                restante -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": restante > 0})
+        if restante > 0:
+            # El archivo se truncó mientras se enviaba: cerrar el cuerpo igualmente
+            logger.warning(f"Archivo truncado durante el envío: {self.path}")
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class MediaFiles(StaticFiles):
+    """StaticFiles que entrega con FileDeliveryResponse (ETag, rangos y caché)"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        return FileDeliveryResponse(
+            str(full_path),
+            stat_result,
+            Headers(scope=scope),
+            cache_control(str(full_path)),
+            method=scope["method"]
+        )
@@ -0,0 +1,121 @@
+# app/services/image_pipeline.py
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from PIL import Image, ImageOps, features
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Derivados por imagen: nombre -> tamaño máximo (ancho, alto)
+DERIVADOS: Dict[str, Tuple[int, int]] = {
+    "thumb": (320, 320),
+    "preview": (1024, 1024),
+    "full": (1920, 1080),
+}
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_LISTO = "listo"
+ESTADO_ERROR = "error"
+
+
+def formato_derivados() -> Tuple[str, str]:
+    """(formato de Pillow, extensión): WebP si Pillow lo soporta, si no JPEG"""
+    if features.check("webp"):
+        return "WEBP", ".webp"
+    return "JPEG", ".jpg"
+
+
+def ruta_derivado(file_path: str, nombre: str) -> str:
+    base, _ = os.path.splitext(file_path)
+    return f"{base}_{nombre}{formato_derivados()[1]}"
+
+
+def ruta_error(file_path: str) -> str:
+    return f"{os.path.splitext(file_path)[0]}.failed"
+
+
+def generar_derivados(file_path: str) -> Dict[str, str]:
+    """
+    Generar los derivados de una imagen (se ejecuta en un proceso del pool).
+    La imagen se decodifica una sola vez; cada derivado se escribe en un
+    temporal y se renombra para que nunca se sirva a medio escribir.
+    """
+    formato, _ = formato_derivados()
+    mayor = max(DERIVADOS.values())
+    generados = {}
+
+    with Image.open(file_path) as img:
+        # JPEG: decodificar ya reducido cuando el original es mucho mayor
+        img.draft("RGB", mayor)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        # De mayor a menor: cada derivado se reduce a partir del anterior
+        actual = img
+        for nombre, max_size in sorted(DERIVADOS.items(), key=lambda item: item[1], reverse=True):
+            derivado = actual.copy()
+            derivado.thumbnail(max_size, Image.Resampling.LANCZOS)
+            destino = ruta_derivado(file_path, nombre)
+            tmp_path = f"{destino}.part"
+            derivado.save(tmp_path, format=formato, quality=82, optimize=True)
+            os.replace(tmp_path, destino)
+            generados[nombre] = destino
+            actual = derivado
+
+    return generados
+
+
+class ImagePipeline:
+    """
+    Procesamiento de imágenes fuera del event loop en un ProcessPoolExecutor.
+    El estado (pendiente/listo/error) se deduce de los archivos en disco, así
+    que cualquier worker de la API puede consultarlo.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: no hereda hilos ni el event loop del proceso de la API
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, file_path: str) -> "asyncio.Future":
+        """Encolar la generación de derivados y devolver un futuro awaitable"""
+        future = self._get_executor().submit(generar_derivados, file_path)
+
+        def _done(fut: Future):
+            if fut.cancelled():
+                return
+            error = fut.exception()
+            if error is not None:
+                logger.warning(f"Error procesando imagen {file_path}: {error}")
+                with open(ruta_error(file_path), "w") as marker:
+                    marker.write(str(error))
+
+        future.add_done_callback(_done)
+        return asyncio.wrap_future(future)
+
+    def status(self, file_path: str) -> str:
+        if all(os.path.exists(ruta_derivado(file_path, nombre)) for nombre in DERIVADOS):
+            return ESTADO_LISTO
+        if os.path.exists(ruta_error(file_path)):
+            return ESTADO_ERROR
+        return ESTADO_PENDIENTE
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_pipeline = ImagePipeline(max_workers=settings.IMAGE_PROCESS_WORKERS)
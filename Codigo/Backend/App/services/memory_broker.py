@@ -0,0 +1,92 @@
+# app/services/memory_broker.py
+import asyncio
+import logging
+from fnmatch import fnmatchcase
+from typing import AsyncIterator, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+class InMemoryBroker:
+    """
+    Broker pub/sub en memoria con la misma interfaz que usa WebSocketManager
+    de redis.asyncio (ping, publish, pubsub, close y los conjuntos ordenados
+    de usuarios conectados). Permite probar la difusión entre varias
+    instancias del gestor dentro de un solo proceso, sin Redis.
+    """
+
+    def __init__(self):
+        self._subscribers: Set["InMemoryPubSub"] = set()
+        self._sorted_sets: Dict[str, Dict[str, float]] = {}
+
+    async def ping(self) -> bool:
+        return True
+
+    async def publish(self, channel: str, message) -> int:
+        """Entregar el mensaje a cada suscriptor cuyo patrón coincida"""
+        receptores = 0
+        for pubsub in list(self._subscribers):
+            pattern = pubsub.match(channel)
+            if pattern is not None:
+                pubsub.deliver({
+                    "type": "pmessage",
+                    "pattern": pattern,
+                    "channel": channel,
+                    "data": message
+                })
+                receptores += 1
+        return receptores
+
+    def pubsub(self) -> "InMemoryPubSub":
+        return InMemoryPubSub(self)
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        zset = self._sorted_sets.setdefault(key, {})
+        nuevos = len(mapping.keys() - zset.keys())
+        zset.update(mapping)
+        return nuevos
+
+    async def zrem(self, key: str, *members: str) -> int:
+        zset = self._sorted_sets.get(key, {})
+        return sum(zset.pop(member, None) is not None for member in members)
+
+    async def zrangebyscore(self, key: str, min_score, max_score) -> List[str]:
+        lo, hi = float(min_score), float(max_score)
+        zset = self._sorted_sets.get(key, {})
+        return [member for member, score in sorted(zset.items(), key=lambda item: item[1]) if lo <= score <= hi]
+
+    async def zremrangebyscore(self, key: str, min_score, max_score) -> int:
+        vencidos = await self.zrangebyscore(key, min_score, max_score)
+        return await self.zrem(key, *vencidos)
+
+    async def close(self):
+        self._subscribers.clear()
+        self._sorted_sets.clear()
+
+class InMemoryPubSub:
+    """Suscripción por patrones sobre InMemoryBroker"""
+
+    def __init__(self, broker: InMemoryBroker):
+        self._broker = broker
+        self._patterns: Set[str] = set()
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def psubscribe(self, *patterns: str):
+        self._patterns.update(patterns)
+        self._broker._subscribers.add(self)
+
+    def match(self, channel: str):
+        for pattern in self._patterns:
+            if fnmatchcase(channel, pattern):
+                return pattern
+        return None
+
+    def deliver(self, message: Dict):
+        self._queue.put_nowait(message)
+
+    async def listen(self) -> AsyncIterator[Dict]:
+        while True:
+            yield await self._queue.get()
+
+    async def close(self):
+        self._broker._subscribers.discard(self)
+        self._patterns.clear()
@@ -0,0 +1,185 @@
+# app/services/presence_service.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.chat import ConexionChat
+
+logger = logging.getLogger(__name__)
+
+# Filas por sentencia al persistir
+FLUSH_CHUNK_SIZE = 500
+
+
+class PresenceEntry:
+    """Sesión de un usuario en un chat"""
+
+    __slots__ = ("session_id", "usuario_id", "chat_id", "last_activity", "activa", "persistida")
+
+    def __init__(self, session_id: str, usuario_id: int, chat_id: int):
+        self.session_id = session_id
+        self.usuario_id = usuario_id
+        self.chat_id = chat_id
+        self.last_activity = datetime.now()
+        self.activa = True
+        self.persistida = False
+
+
+class PresenceTracker:
+    """
+    Presencia de usuarios en los chats. La memoria del proceso es la fuente de
+    verdad; conexiones_chat se actualiza por escritura diferida: cada
+    PRESENCE_FLUSH_SECONDS se insertan las sesiones nuevas y las demás se
+    actualizan con un UPDATE por bloque, en lugar de un commit por latido.
+    """
+
+    def __init__(self, flush_interval: float, session_factory=None):
+        self.flush_interval = flush_interval
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._sessions: Dict[str, PresenceEntry] = {}
+        self._dirty: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def connect(self, session_id: str, usuario_id: int, chat_id: int):
+        self._sessions[session_id] = PresenceEntry(session_id, usuario_id, chat_id)
+        self._dirty.add(session_id)
+
+    def touch(self, session_id: str):
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry.activa:
+            entry.last_activity = datetime.now()
+            self._dirty.add(session_id)
+
+    def disconnect(self, session_id: str):
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry.activa:
+            entry.activa = False
+            entry.last_activity = datetime.now()
+            self._dirty.add(session_id)
+
+    def active_entries(self, chat_id: Optional[int] = None, timeout: Optional[timedelta] = None) -> List[PresenceEntry]:
+        """Sesiones activas (de un chat, si se indica) con actividad dentro del timeout"""
+        limite = datetime.now() - timeout if timeout else None
+        return [
+            entry for entry in self._sessions.values()
+            if entry.activa
+            and (chat_id is None or entry.chat_id == chat_id)
+            and (limite is None or entry.last_activity >= limite)
+        ]
+
+    async def active_users(self, db: AsyncSession, chat_id: int, timeout: timedelta) -> Dict[int, datetime]:
+        """
+        Última actividad por usuario conectado a un chat en cualquier worker.
+        Las sesiones de otros workers se leen de conexiones_chat (cada uno las
+        persiste cada PRESENCE_FLUSH_SECONDS); las de este proceso se toman de
+        memoria, que ya incluye conexiones y cierres aún sin persistir.
+        """
+        limite = datetime.now() - timeout
+        filas = (await db.execute(
+            select(ConexionChat.session_id, ConexionChat.usuario_id, ConexionChat.last_activity).where(
+                ConexionChat.chat_id == chat_id,
+                ConexionChat.activa == True,
+                ConexionChat.last_activity >= limite
+            )
+        )).all()
+
+        sesiones = [
+            (usuario_id, last_activity.replace(tzinfo=None))
+            for session_id, usuario_id, last_activity in filas
+            if session_id not in self._sessions
+        ]
+        sesiones.extend((entry.usuario_id, entry.last_activity) for entry in self.active_entries(chat_id, timeout))
+
+        # Un usuario puede tener varias sesiones abiertas
+        ultima_actividad: Dict[int, datetime] = {}
+        for usuario_id, last_activity in sesiones:
+            anterior = ultima_actividad.get(usuario_id)
+            if anterior is None or last_activity > anterior:
+                ultima_actividad[usuario_id] = last_activity
+        return ultima_actividad
+
+    async def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Cerrar las sesiones abiertas y persistir lo pendiente"""
+        if self._task:
+            self._task.cancel()
+        for entry in self._sessions.values():
+            if entry.activa:
+                entry.activa = False
+                self._dirty.add(entry.session_id)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Persistir en lote las sesiones modificadas desde el último flush"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            entries = [self._sessions[session_id] for session_id in dirty if session_id in self._sessions]
+            nuevas = [entry for entry in entries if not entry.persistida]
+            existentes = [entry for entry in entries if entry.persistida]
+
+            try:
+                async with self._session_factory() as db:
+                    for inicio in range(0, len(nuevas), FLUSH_CHUNK_SIZE):
+                        await db.execute(insert(ConexionChat), [
+                            {
+                                "usuario_id": entry.usuario_id,
+                                "chat_id": entry.chat_id,
+                                "session_id": entry.session_id,
+                                "activa": entry.activa,
+                                "last_activity": entry.last_activity,
+                            }
+                            for entry in nuevas[inicio:inicio + FLUSH_CHUNK_SIZE]
+                        ])
+                    for inicio in range(0, len(existentes), FLUSH_CHUNK_SIZE):
+                        lote = existentes[inicio:inicio + FLUSH_CHUNK_SIZE]
+                        await db.execute(
+                            update(ConexionChat)
+                            .where(ConexionChat.session_id.in_([entry.session_id for entry in lote]))
+                            .values(
+                                last_activity=case(
+                                    {entry.session_id: entry.last_activity for entry in lote},
+                                    value=ConexionChat.session_id
+                                ),
+                                activa=case(
+                                    {entry.session_id: entry.activa for entry in lote},
+                                    value=ConexionChat.session_id
+                                )
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                    await db.commit()
+            except Exception as e:
+                # Se reintenta en el siguiente ciclo
+                self._dirty |= dirty
+                logger.error(f"Error persistiendo presencia de chat: {e}")
+                return 0
+
+            for entry in nuevas:
+                entry.persistida = True
+            # Las sesiones cerradas ya persistidas salen de memoria
+            for entry in entries:
+                if not entry.activa and entry.session_id not in self._dirty:
+                    self._sessions.pop(entry.session_id, None)
+            return len(entries)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el ciclo de presencia: {e}")
+
+
+presence_tracker = PresenceTracker(flush_interval=settings.PRESENCE_FLUSH_SECONDS)
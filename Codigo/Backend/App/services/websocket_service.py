@@ -2,27 +2,110 @@
 import asyncio
 import json
 import logging
+import time
+import uuid
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 import redis.asyncio as redis
 from app.config import settings
+from app.services.presence_service import presence_tracker
 
 logger = logging.getLogger(__name__)
 
+# Eventos efímeros que se pueden descartar si el cliente no alcanza a leer
+DROPPABLE_EVENTS = {"user_typing", "user_stop_typing"}
+
+# Canales pub/sub para difundir entre workers
+CHAT_CHANNEL = "chat:events:{}"
+USER_CHANNEL = "chat:users:{}"
+
+# Conjunto ordenado "{user_id}:{instance_id}" -> vencimiento, con los usuarios
+# conectados en cada worker; cada worker renueva los suyos en la limpieza
+ONLINE_KEY = "chat:online_users"
+ONLINE_TTL = 180  # segundos (tres ciclos de limpieza)
+
+class WebSocketConnection:
+    """Registro de una conexión WebSocket activa con su cola de salida"""
+    
+    __slots__ = (
+        "websocket", "session_id", "chat_id", "user_id", "user_name", "user_role",
+        "connected_at", "last_activity", "is_active",
+        "queue", "queue_ready", "writer_task"
+    )
+    
+    def __init__(self, websocket: WebSocket, chat_id: int, user_id: int, user_name: str, user_role: str):
+        now = datetime.now()
+        self.websocket = websocket
+        self.session_id = uuid.uuid4().hex
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.user_role = user_role
+        self.connected_at = now
+        self.last_activity = now
+        self.is_active = True
+        
+        # Cola acotada (texto, descartable) que vacía la tarea escritora
+        self.queue: deque = deque()
+        self.queue_ready = asyncio.Event()
+        self.writer_task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, message_str: str, droppable: bool = False) -> bool:
+        """
+        Encolar un mensaje sin esperar al socket. Devuelve False si la cola
+        está llena y la conexión debe cerrarse por lenta.
+        """
+        if len(self.queue) >= settings.WS_SEND_QUEUE_SIZE:
+            if droppable:
+                return True
+            if settings.WS_OVERFLOW_POLICY != "drop_typing" or not self._drop_oldest_droppable():
+                return False
+        
+        self.queue.append((message_str, droppable))
+        self.queue_ready.set()
+        return True
+    
+    def _drop_oldest_droppable(self) -> bool:
+        """Liberar espacio descartando el evento efímero más antiguo"""
+        for item in self.queue:
+            if item[1]:
+                self.queue.remove(item)
+                return True
+        return False
+    
+    def to_dict(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "user_name": self.user_name,
+            "user_role": self.user_role,
+            "connected_at": self.connected_at.isoformat(),
+            "last_activity": self.last_activity.isoformat(),
+            "is_active": self.is_active
+        }
+
 class WebSocketManager:
     """Gestor avanzado de conexiones WebSocket con soporte para Redis"""
     
-    def __init__(self, redis_url: Optional[str] = None):
-        # Conexiones locales
-        self.active_connections: Dict[int, List[Dict]] = {}
-        self.connection_info: Dict[WebSocket, Dict] = {}
-        
-        # Redis para escalabilidad (opcional)
-        self.redis_client = None
-        if redis_url:
+    def __init__(self, redis_url: Optional[str] = None, broker=None):
+        # Conexiones locales indexadas por chat, por usuario y por socket
+        self.active_connections: Dict[int, Dict[WebSocket, WebSocketConnection]] = {}
+        self.user_connections: Dict[int, Set[WebSocket]] = {}
+        self.connection_info: Dict[WebSocket, WebSocketConnection] = {}
+        
+        # Redis para escalabilidad (opcional). `broker` permite inyectar otro
+        # cliente compatible, p. ej. InMemoryBroker en pruebas
+        self.redis_client = broker
+        if broker is None and redis_url:
             self.redis_client = redis.from_url(redis_url)
         
+        # Identificador de esta instancia para ignorar sus propios eventos
+        self.instance_id = uuid.uuid4().hex
+        
+        # Estado de escritura por (chat_id, user_id): [último envío, última señal]
+        self.typing_states: Dict[Tuple[int, int], List[float]] = {}
+        
         # Tareas de limpieza
         self.cleanup_tasks: Set[asyncio.Task] = set()
         
@@ -40,9 +123,16 @@ class WebSocketManager:
                 logger.warning(f"No se pudo conectar a Redis: {e}")
                 self.redis_client = None
         
-        # Iniciar tarea de limpieza
+        # Escuchar eventos publicados por otros workers
+        if self.redis_client:
+            listener_task = asyncio.create_task(self._listen_redis_events())
+            self.cleanup_tasks.add(listener_task)
+        
+        # Iniciar tareas de limpieza
         cleanup_task = asyncio.create_task(self._cleanup_connections())
         self.cleanup_tasks.add(cleanup_task)
+        typing_task = asyncio.create_task(self._expire_typing_states())
+        self.cleanup_tasks.add(typing_task)
         
     async def shutdown(self):
         """Cerrar todas las conexiones y limpiar recursos"""
@@ -51,12 +141,13 @@ class WebSocketManager:
             task.cancel()
         
         # Cerrar todas las conexiones WebSocket
-        for chat_id, connections in self.active_connections.items():
-            for conn_data in connections:
-                try:
-                    await conn_data["websocket"].close()
-                except:
-                    pass
+        for websocket, connection in list(self.connection_info.items()):
+            if connection.writer_task:
+                connection.writer_task.cancel()
+            try:
+                await websocket.close()
+            except:
+                pass
         
         # Cerrar Redis
         if self.redis_client:
@@ -67,44 +158,29 @@ class WebSocketManager:
         await websocket.accept()
         
         # Preparar datos de conexión
-        connection_data = {
-            "websocket": websocket,
-            "user_id": user_id,
-            "user_name": user_data.get("nombre", "Usuario"),
-            "user_role": user_data.get("role", "cliente"),
-            "connected_at": datetime.now(),
-            "last_activity": datetime.now(),
-            "is_active": True
-        }
-        
-        # Agregar a conexiones locales
-        if chat_id not in self.active_connections:
-            self.active_connections[chat_id] = []
-        
-        self.active_connections[chat_id].append(connection_data)
-        
-        # Mapear websocket a información
-        self.connection_info[websocket] = {
-            "chat_id": chat_id,
-            "user_id": user_id,
-            "user_name": user_data.get("nombre", "Usuario"),
-            "user_role": user_data.get("role", "cliente"),
-            "connected_at": datetime.now()
-        }
+        connection = WebSocketConnection(
+            websocket,
+            chat_id,
+            user_id,
+            user_data.get("nombre", "Usuario"),
+            user_data.get("role", "cliente")
+        )
+        
+        # Tarea escritora propia: un cliente lento no retrasa a los demás
+        connection.writer_task = asyncio.create_task(self._writer(connection))
+        
+        # Agregar a los índices locales
+        self.active_connections.setdefault(chat_id, {})[websocket] = connection
+        user_sockets = self.user_connections.setdefault(user_id, set())
+        user_sockets.add(websocket)
+        self.connection_info[websocket] = connection
+        presence_tracker.connect(connection.session_id, user_id, chat_id)
+        if len(user_sockets) == 1:
+            await self._mark_online([user_id])
         
         logger.info(f"Usuario {user_data.get('nombre')} conectado al chat {chat_id}")
         
-        # Publicar conexión en Redis (si está disponible)
-        if self.redis_client:
-            await self._publish_redis_event({
-                "tipo": "user_connected",
-                "chat_id": chat_id,
-                "user_id": user_id,
-                "user_name": user_data.get("nombre"),
-                "timestamp": datetime.now().isoformat()
-            })
-        
-        # Notificar a otros usuarios
+        # Notificar a otros usuarios (también en otros workers)
         await self.broadcast_to_chat(chat_id, {
             "tipo": "user_connected",
             "user_id": user_id,
@@ -123,42 +199,40 @@ class WebSocketManager:
         
     async def disconnect(self, websocket: WebSocket, reason: str = "normal"):
         """Desconectar un usuario"""
-        if websocket not in self.connection_info:
+        connection = self.connection_info.pop(websocket, None)
+        if connection is None:
             return
             
-        info = self.connection_info[websocket]
-        chat_id = info["chat_id"]
-        user_id = info["user_id"]
-        user_name = info["user_name"]
-        
-        # Remover de conexiones activas
-        if chat_id in self.active_connections:
-            self.active_connections[chat_id] = [
-                conn for conn in self.active_connections[chat_id] 
-                if conn["websocket"] != websocket
-            ]
-            
-            # Limpiar chat vacío
-            if not self.active_connections[chat_id]:
+        chat_id = connection.chat_id
+        user_id = connection.user_id
+        user_name = connection.user_name
+        
+        # Detener la tarea escritora (salvo que sea ella quien desconecta)
+        connection.is_active = False
+        presence_tracker.disconnect(connection.session_id)
+        if connection.writer_task and connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+        
+        # Remover de los índices, limpiando chats y usuarios sin conexiones
+        chat_connections = self.active_connections.get(chat_id)
+        if chat_connections is not None:
+            chat_connections.pop(websocket, None)
+            if not chat_connections:
                 del self.active_connections[chat_id]
         
-        # Remover mapeo
-        del self.connection_info[websocket]
+        user_sockets = self.user_connections.get(user_id)
+        if user_sockets is not None:
+            user_sockets.discard(websocket)
+            if not user_sockets:
+                del self.user_connections[user_id]
+                await self._mark_offline(user_id)
         
         logger.info(f"Usuario {user_name} desconectado del chat {chat_id} - Razón: {reason}")
         
-        # Publicar desconexión en Redis
-        if self.redis_client:
-            await self._publish_redis_event({
-                "tipo": "user_disconnected",
-                "chat_id": chat_id,
-                "user_id": user_id,
-                "user_name": user_name,
-                "reason": reason,
-                "timestamp": datetime.now().isoformat()
-            })
+        # Quien se desconecta deja de escribir
+        self.typing_states.pop((chat_id, user_id), None)
         
-        # Notificar a otros usuarios
+        # Notificar a otros usuarios (también en otros workers)
         await self.broadcast_to_chat(chat_id, {
             "tipo": "user_disconnected",
             "user_id": user_id,
@@ -169,94 +243,152 @@ class WebSocketManager:
         
     async def send_personal_message(self, message: Dict, websocket: WebSocket):
         """Enviar mensaje personal a una conexión específica"""
-        try:
-            await websocket.send_text(json.dumps(message, default=str))
-            
-            # Actualizar última actividad
-            if websocket in self.connection_info:
-                # Buscar y actualizar en active_connections
-                info = self.connection_info[websocket]
-                chat_id = info["chat_id"]
-                
-                if chat_id in self.active_connections:
-                    for conn in self.active_connections[chat_id]:
-                        if conn["websocket"] == websocket:
-                            conn["last_activity"] = datetime.now()
-                            break
-                            
-        except Exception as e:
-            logger.error(f"Error enviando mensaje personal: {e}")
-            await self.disconnect(websocket, "error_sending")
+        connection = self.connection_info.get(websocket)
+        if connection is None:
+            # Conexión aún no registrada: envío directo
+            try:
+                await websocket.send_text(json.dumps(message, default=str))
+            except Exception as e:
+                logger.error(f"Error enviando mensaje personal: {e}")
+            return
+        
+        await self._enqueue_many([connection], message)
             
     async def broadcast_to_chat(self, chat_id: int, message: Dict, exclude_user: Optional[int] = None):
-        """Enviar mensaje a todos los usuarios de un chat"""
+        """Encolar mensaje para todos los usuarios de un chat, en este y los demás workers"""
+        await self._deliver_to_chat(chat_id, message, exclude_user)
+        await self._publish_redis_event(CHAT_CHANNEL.format(chat_id), {
+            "chat_id": chat_id,
+            "exclude_user": exclude_user,
+            "message": message
+        })
+            
+    async def broadcast_to_user(self, user_id: int, message: Dict):
+        """Encolar mensaje para todas las conexiones de un usuario, en cualquier worker"""
+        await self._deliver_to_user(user_id, message)
+        await self._publish_redis_event(USER_CHANNEL.format(user_id), {
+            "user_id": user_id,
+            "message": message
+        })
+        
+    async def _deliver_to_chat(self, chat_id: int, message: Dict, exclude_user: Optional[int] = None):
+        """Encolar mensaje para las conexiones locales de un chat"""
         if chat_id not in self.active_connections:
             return
             
-        # Preparar mensaje
-        message_str = json.dumps(message, default=str)
-        
-        # Lista de conexiones a remover (conexiones rotas)
-        broken_connections = []
-        
-        for conn_data in self.active_connections[chat_id]:
+        connections = [
+            connection for connection in self.active_connections[chat_id].values()
             # Excluir usuario si se especifica
-            if exclude_user and conn_data["user_id"] == exclude_user:
-                continue
+            if not (exclude_user and connection.user_id == exclude_user)
+        ]
+        await self._enqueue_many(connections, message)
+            
+    async def _deliver_to_user(self, user_id: int, message: Dict):
+        """Encolar mensaje para las conexiones locales de un usuario"""
+        connections = [self.connection_info[ws] for ws in self.user_connections.get(user_id, ())]
+        await self._enqueue_many(connections, message)
+        
+    async def _enqueue_many(self, connections: List[WebSocketConnection], message: Dict):
+        """Serializar una vez y encolar en cada conexión; cerrar las que se desbordan"""
+        if not connections:
+            return
+            
+        message_str = json.dumps(message, default=str)
+        droppable = message.get("tipo") in DROPPABLE_EVENTS
+        
+        # Conexiones cuya cola se desbordó
+        slow_connections = [
+            connection for connection in connections
+            if not connection.enqueue(message_str, droppable)
+        ]
+        
+        for connection in slow_connections:
+            logger.warning(f"Cola de salida llena para usuario {connection.user_id} en chat {connection.chat_id}")
+            await self.disconnect(connection.websocket, "slow_consumer")
+            asyncio.create_task(self._close_quietly(connection.websocket))
+            
+    async def _writer(self, connection: WebSocketConnection):
+        """Vaciar la cola de salida de una conexión"""
+        try:
+            while connection.is_active:
+                if not connection.queue:
+                    connection.queue_ready.clear()
+                    await connection.queue_ready.wait()
+                    continue
                 
-            try:
-                await conn_data["websocket"].send_text(message_str)
-                # Actualizar última actividad
-                conn_data["last_activity"] = datetime.now()
+                message_str, _ = connection.queue.popleft()
+                await asyncio.wait_for(
+                    connection.websocket.send_text(message_str),
+                    timeout=settings.WS_SEND_TIMEOUT
+                )
+                connection.last_activity = datetime.now()
                 
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Conexión rota detectada: {e}")
+            await self.disconnect(connection.websocket, "connection_broken")
+            
+    async def _close_quietly(self, websocket: WebSocket):
+        """Cerrar un socket sin propagar errores"""
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=settings.WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+            
+    def is_user_online(self, user_id: int) -> bool:
+        """Indicar si el usuario tiene al menos una conexión activa"""
+        return user_id in self.user_connections
+        
+    async def count_online_users(self) -> int:
+        """
+        Usuarios distintos conectados en todos los workers. Con Redis se leen
+        las entradas vigentes de ONLINE_KEY; sin Redis (o si falla) solo se
+        conocen las conexiones de este worker.
+        """
+        if self.redis_client:
+            try:
+                now = time.time()
+                await self.redis_client.zremrangebyscore(ONLINE_KEY, "-inf", now)
+                members = await self.redis_client.zrangebyscore(ONLINE_KEY, now, "+inf")
+                return len({
+                    (member.decode() if isinstance(member, bytes) else member).split(":", 1)[0]
+                    for member in members
+                })
             except Exception as e:
-                logger.warning(f"Conexión rota detectada: {e}")
-                broken_connections.append(conn_data["websocket"])
+                logger.error(f"Error contando usuarios conectados en Redis: {e}")
+        return len(self.user_connections)
         
-        # Limpiar conexiones rotas
-        for broken_ws in broken_connections:
-            await self.disconnect(broken_ws, "connection_broken")
-            
-    async def broadcast_to_user(self, user_id: int, message: Dict):
-        """Enviar mensaje a todas las conexiones de un usuario específico"""
-        message_str = json.dumps(message, default=str)
-        broken_connections = []
-        
-        for chat_id, connections in self.active_connections.items():
-            for conn_data in connections:
-                if conn_data["user_id"] == user_id:
-                    try:
-                        await conn_data["websocket"].send_text(message_str)
-                        conn_data["last_activity"] = datetime.now()
-                    except Exception as e:
-                        logger.warning(f"Conexión rota para usuario {user_id}: {e}")
-                        broken_connections.append(conn_data["websocket"])
-        
-        # Limpiar conexiones rotas
-        for broken_ws in broken_connections:
-            await self.disconnect(broken_ws, "connection_broken")
+    async def _mark_online(self, user_ids: List[int]):
+        """Registrar (o renovar) en Redis los usuarios conectados a este worker"""
+        if not self.redis_client or not user_ids:
+            return
+        try:
+            expires = time.time() + ONLINE_TTL
+            await self.redis_client.zadd(ONLINE_KEY, {
+                f"{user_id}:{self.instance_id}": expires for user_id in user_ids
+            })
+        except Exception as e:
+            logger.error(f"Error registrando usuarios conectados en Redis: {e}")
             
+    async def _mark_offline(self, user_id: int):
+        if not self.redis_client:
+            return
+        try:
+            await self.redis_client.zrem(ONLINE_KEY, f"{user_id}:{self.instance_id}")
+        except Exception as e:
+            logger.error(f"Error quitando usuario conectado en Redis: {e}")
+        
     def get_chat_users(self, chat_id: int) -> List[Dict]:
         """Obtener lista de usuarios activos en un chat"""
-        if chat_id not in self.active_connections:
-            return []
-            
-        users = []
-        for conn_data in self.active_connections[chat_id]:
-            users.append({
-                "user_id": conn_data["user_id"],
-                "user_name": conn_data["user_name"],
-                "user_role": conn_data["user_role"],
-                "connected_at": conn_data["connected_at"].isoformat(),
-                "last_activity": conn_data["last_activity"].isoformat(),
-                "is_active": conn_data["is_active"]
-            })
-        
-        return users
+        return [
+            connection.to_dict()
+            for connection in self.active_connections.get(chat_id, {}).values()
+        ]
         
     def get_connection_stats(self) -> Dict:
         """Obtener estadísticas de conexiones"""
-        total_connections = sum(len(conns) for conns in self.active_connections.values())
+        total_connections = len(self.connection_info)
         active_chats = len(self.active_connections)
         
         return {
@@ -274,16 +406,18 @@ class WebSocketManager:
             data = json.loads(message)
             message_type = data.get("tipo")
             
-            if websocket not in self.connection_info:
+            connection = self.connection_info.get(websocket)
+            if connection is None:
                 await websocket.send_text(json.dumps({
                     "tipo": "error",
                     "mensaje": "Conexión no autorizada"
                 }))
                 return
                 
-            info = self.connection_info[websocket]
-            chat_id = info["chat_id"]
-            user_id = info["user_id"]
+            chat_id = connection.chat_id
+            user_id = connection.user_id
+            connection.last_activity = datetime.now()
+            presence_tracker.touch(connection.session_id)
             
             # Manejar diferentes tipos de mensajes
             if message_type == "ping":
@@ -293,20 +427,10 @@ class WebSocketManager:
                 }, websocket)
                 
             elif message_type == "typing":
-                await self.broadcast_to_chat(chat_id, {
-                    "tipo": "user_typing",
-                    "user_id": user_id,
-                    "user_name": info["user_name"],
-                    "timestamp": datetime.now().isoformat()
-                }, exclude_user=user_id)
+                await self._set_typing(connection, True)
                 
             elif message_type == "stop_typing":
-                await self.broadcast_to_chat(chat_id, {
-                    "tipo": "user_stop_typing",
-                    "user_id": user_id,
-                    "user_name": info["user_name"],
-                    "timestamp": datetime.now().isoformat()
-                }, exclude_user=user_id)
+                await self._set_typing(connection, False)
                 
             elif message_type == "message_read":
                 mensaje_id = data.get("mensaje_id")
@@ -319,17 +443,68 @@ class WebSocketManager:
                     }, exclude_user=user_id)
                     
         except json.JSONDecodeError:
-            await websocket.send_text(json.dumps({
+            await self.send_personal_message({
                 "tipo": "error",
                 "mensaje": "Formato de mensaje inválido"
-            }))
+            }, websocket)
         except Exception as e:
             logger.error(f"Error manejando mensaje WebSocket: {e}")
-            await websocket.send_text(json.dumps({
+            await self.send_personal_message({
                 "tipo": "error",
                 "mensaje": "Error interno del servidor"
-            }))
+            }, websocket)
             
+    async def _set_typing(self, connection: WebSocketConnection, is_typing: bool):
+        """
+        Aplicar un cambio de estado de escritura con debounce por (chat, usuario):
+        se difunde al iniciar, se repite como máximo una vez por ventana mientras
+        siga escribiendo y stop_typing solo se envía si había estado activo.
+        """
+        key = (connection.chat_id, connection.user_id)
+        now = time.monotonic()
+        state = self.typing_states.get(key)
+        
+        if is_typing:
+            if state is not None:
+                state[1] = now
+                if now - state[0] < settings.WS_TYPING_WINDOW:
+                    return
+                state[0] = now
+            else:
+                self.typing_states[key] = [now, now]
+        else:
+            if self.typing_states.pop(key, None) is None:
+                return
+        
+        await self.broadcast_to_chat(connection.chat_id, {
+            "tipo": "user_typing" if is_typing else "user_stop_typing",
+            "chat_id": connection.chat_id,
+            "user_id": connection.user_id,
+            "user_name": connection.user_name,
+            "timestamp": datetime.now().isoformat()
+        }, exclude_user=connection.user_id)
+        
+    async def _expire_typing_states(self):
+        """Enviar stop_typing por los usuarios que dejaron de señalar escritura"""
+        while True:
+            try:
+                await asyncio.sleep(settings.WS_TYPING_WINDOW)
+                
+                limit = time.monotonic() - settings.WS_TYPING_EXPIRY
+                expired = [key for key, state in self.typing_states.items() if state[1] < limit]
+                
+                for chat_id, user_id in expired:
+                    del self.typing_states[(chat_id, user_id)]
+                    await self.broadcast_to_chat(chat_id, {
+                        "tipo": "user_stop_typing",
+                        "chat_id": chat_id,
+                        "user_id": user_id,
+                        "timestamp": datetime.now().isoformat()
+                    }, exclude_user=user_id)
+                    
+            except Exception as e:
+                logger.error(f"Error expirando estados de escritura: {e}")
+                
     async def _cleanup_connections(self):
         """Tarea de limpieza de conexiones inactivas"""
         while True:
@@ -339,16 +514,18 @@ class WebSocketManager:
                 current_time = datetime.now()
                 expired_connections = []
                 
-                for chat_id, connections in self.active_connections.items():
-                    for conn_data in connections:
-                        # Verificar timeout
-                        time_diff = current_time - conn_data["last_activity"]
-                        if time_diff.total_seconds() > self.connection_timeout:
-                            expired_connections.append(conn_data["websocket"])
+                for websocket, connection in self.connection_info.items():
+                    # Verificar timeout
+                    time_diff = current_time - connection.last_activity
+                    if time_diff.total_seconds() > self.connection_timeout:
+                        expired_connections.append(websocket)
                 
                 # Desconectar conexiones expiradas
                 for expired_ws in expired_connections:
                     await self.disconnect(expired_ws, "timeout")
+                
+                # Renovar en Redis los usuarios que siguen conectados aquí
+                await self._mark_online(list(self.user_connections))
                     
                 if expired_connections:
                     logger.info(f"Limpiadas {len(expired_connections)} conexiones expiradas")
@@ -356,17 +533,49 @@ class WebSocketManager:
             except Exception as e:
                 logger.error(f"Error en limpieza de conexiones: {e}")
                 
-    async def _publish_redis_event(self, event: Dict):
+    async def _publish_redis_event(self, channel: str, event: Dict):
         """Publicar evento en Redis para escalabilidad"""
         if not self.redis_client:
             return
             
         try:
-            channel = f"chat:events:{event.get('chat_id', 'global')}"
+            event["origin"] = self.instance_id
             await self.redis_client.publish(channel, json.dumps(event, default=str))
         except Exception as e:
             logger.error(f"Error publicando evento Redis: {e}")
             
+    async def _listen_redis_events(self):
+        """Reenviar a los sockets locales los eventos publicados por otros workers"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(CHAT_CHANNEL.format("*"), USER_CHANNEL.format("*"))
+                
+                async for raw in pubsub.listen():
+                    if raw.get("type") not in ("message", "pmessage"):
+                        continue
+                    
+                    event = json.loads(raw["data"])
+                    # Los eventos propios ya se entregaron localmente
+                    if event.get("origin") == self.instance_id:
+                        continue
+                    
+                    if "chat_id" in event:
+                        await self._deliver_to_chat(event["chat_id"], event["message"], event.get("exclude_user"))
+                    elif "user_id" in event:
+                        await self._deliver_to_user(event["user_id"], event["message"])
+                        
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error escuchando eventos Redis: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            
     async def send_notification_message(self, chat_id: int, message: str, notification_type: str = "info"):
         """Enviar mensaje de notificación del sistema"""
         await self.broadcast_to_chat(chat_id, {
@@ -378,5 +587,5 @@ class WebSocketManager:
 
 # Instancia global del gestor WebSocket
 websocket_manager = WebSocketManager(
-    redis_url=getattr(settings, 'REDIS_URL', None)
+    redis_url=settings.REDIS_URL or None
 )
\ No newline at end of file
@@ -104,17 +104,55 @@ CREATE TABLE usuarios (
     foto_perfil VARCHAR(255) DEFAULT 'static/img/default-profile.png',
     fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- Nombre, correo y documento en minúsculas y sin tildes (lo mantiene la API)
+    busqueda VARCHAR(255),
     
     -- Índices y restricciones
     UNIQUE KEY unique_identificacion (tipo_identificacion, numero_identificacion),
     INDEX idx_correo (correo),
     INDEX idx_estado (estado),
+    INDEX idx_usuarios_busqueda (busqueda),
+    FULLTEXT INDEX ft_usuarios_busqueda (busqueda),
     
     -- Claves foráneas
     FOREIGN KEY (rol_id) REFERENCES roles(id) ON DELETE SET NULL,
     FOREIGN KEY (tipo_identificacion) REFERENCES tipos_identificacion(tipo_id)
 );
 
+-- Tokens de renovación rotativos (solo se guarda el SHA-256 del token)
+CREATE TABLE refresh_tokens (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    usuario_id INT NOT NULL,
+    token_hash CHAR(64) UNIQUE NOT NULL,
+    familia CHAR(32) NOT NULL,
+    expira_en TIMESTAMP NOT NULL,
+    usado_en TIMESTAMP NULL,
+    revocado BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    INDEX idx_refresh_usuario (usuario_id),
+    INDEX idx_refresh_familia (familia),
+    
+    FOREIGN KEY (usuario_id) REFERENCES usuarios(usuario_id) ON DELETE CASCADE
+);
+
+-- Almacén de archivos por contenido: una fila por archivo (sha256 + extensión)
+-- con el número de registros que lo usan; los que quedan en 0 se recolectan.
+-- almacen separa el privado (chat y reportes) del público (fotos de perfil)
+CREATE TABLE blobs (
+    almacen VARCHAR(20) NOT NULL,
+    clave VARCHAR(80) NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    tamano BIGINT NOT NULL,
+    referencias INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (almacen, clave),
+    INDEX idx_blobs_sha256 (almacen, sha256),
+    INDEX idx_blobs_referencias (almacen, referencias, updated_at)
+);
+
 -- ========================================
 -- 🚗 GESTIÓN DE VEHÍCULOS
 -- ========================================
@@ -495,6 +533,16 @@ CREATE TABLE chats (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
+    -- Resumen de la bandeja (se actualiza junto con cada mensaje)
+    total_mensajes INT NOT NULL DEFAULT 0,
+    no_leidos_cliente INT NOT NULL DEFAULT 0,
+    no_leidos_mecanico INT NOT NULL DEFAULT 0,
+    ultimo_mensaje VARCHAR(100) NULL,
+    ultimo_mensaje_fecha TIMESTAMP NULL,
+    ultimo_remitente_id INT NULL,
+    total_respuestas INT NOT NULL DEFAULT 0,
+    minutos_respuesta DOUBLE NOT NULL DEFAULT 0,
+    
     -- Índices
     INDEX idx_proceso (proceso_id),
     INDEX idx_cliente (cliente_id),
@@ -520,7 +568,7 @@ CREATE TABLE mensajes_chat (
     leido_at TIMESTAMP NULL,
     
     -- Índices
-    INDEX idx_chat (chat_id),
+    INDEX idx_chat_mensaje (chat_id, id),  -- paginación por cursor
     INDEX idx_remitente (remitente_id),
     INDEX idx_estado (estado),
     INDEX idx_fecha (created_at),
@@ -531,6 +579,40 @@ CREATE TABLE mensajes_chat (
     FOREIGN KEY (respuesta_a) REFERENCES mensajes_chat(id)
 );
 
+-- Recalcular el resumen de los chats a partir de sus mensajes
+-- (bases existentes: agregar antes las columnas de resumen a chats)
+UPDATE chats c
+SET total_mensajes = (SELECT COUNT(*) FROM mensajes_chat m WHERE m.chat_id = c.id),
+    no_leidos_cliente = (SELECT COUNT(*) FROM mensajes_chat m
+                         WHERE m.chat_id = c.id AND m.remitente_id <> c.cliente_id AND m.estado <> 'LEIDO'),
+    no_leidos_mecanico = (SELECT COUNT(*) FROM mensajes_chat m
+                          WHERE m.chat_id = c.id AND m.remitente_id = c.cliente_id AND m.estado <> 'LEIDO'),
+    ultimo_mensaje = (SELECT LEFT(m.contenido, 100) FROM mensajes_chat m
+                      WHERE m.chat_id = c.id ORDER BY m.created_at DESC, m.id DESC LIMIT 1),
+    ultimo_mensaje_fecha = (SELECT MAX(m.created_at) FROM mensajes_chat m WHERE m.chat_id = c.id),
+    ultimo_remitente_id = (SELECT m.remitente_id FROM mensajes_chat m
+                           WHERE m.chat_id = c.id ORDER BY m.created_at DESC, m.id DESC LIMIT 1);
+
+-- Recalcular los tiempos de respuesta con LAG() sobre el historial
+UPDATE chats c
+JOIN (
+    SELECT chat_id,
+           COUNT(*) AS total_respuestas,
+           SUM(minutos) AS minutos_respuesta
+    FROM (
+        SELECT chat_id,
+               remitente_id,
+               LAG(remitente_id) OVER w AS remitente_anterior,
+               TIMESTAMPDIFF(SECOND, LAG(created_at) OVER w, created_at) / 60 AS minutos
+        FROM mensajes_chat
+        WINDOW w AS (PARTITION BY chat_id ORDER BY created_at, id)
+    ) t
+    WHERE remitente_anterior <> remitente_id AND minutos <= 60
+    GROUP BY chat_id
+) r ON r.chat_id = c.id
+SET c.total_respuestas = r.total_respuestas,
+    c.minutos_respuesta = r.minutos_respuesta;
+
 -- Conexiones activas de chat
 CREATE TABLE conexiones_chat (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -953,6 +1035,11 @@ INSERT INTO usuarios (
     2
 );
 
+-- La columna busqueda de los usuarios insertados por SQL queda en NULL: la
+-- API la completa al iniciar (UserController.backfill_search_column) con el
+-- mismo texto sin tildes que guarda al crear o editar un usuario.
+-- Bases existentes: agregar antes la columna busqueda y sus índices.
+
 -- ========================================
 -- ✅ VERIFICACIÓN DE INTEGRIDAD
 -- ========================================
@@ -0,0 +1,33 @@
+# tests/conftest.py
+import importlib
+import importlib.util
+import os
+import pkgutil
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sin Redis (limitador y chat en memoria) y con el almacén de archivos en un
+# directorio temporal: las pruebas no dependen de servicios externos
+_tmp_dir = tempfile.mkdtemp(prefix="fullpaint-tests-")
+os.environ["REDIS_URL"] = ""
+os.environ["BLOB_DIR"] = os.path.join(_tmp_dir, "blobs")
+os.environ["BLOB_TMP_DIR"] = os.path.join(_tmp_dir, "tmp")
+
+# El paquete vive en App/ y se importa como "app" (en Windows no distingue
+# mayúsculas; en los demás sistemas se registra el alias)
+if "app" not in sys.modules:
+    app_dir = os.path.join(BACKEND_DIR, "App")
+    spec = importlib.util.spec_from_file_location(
+        "app", os.path.join(app_dir, "__init__.py"), submodule_search_locations=[app_dir]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["app"] = module
+    spec.loader.exec_module(module)
+
+# Registrar todos los modelos para que las relaciones entre ellos se resuelvan
+import app.models  # noqa: E402
+
+for _modulo in pkgutil.iter_modules(app.models.__path__):
+    importlib.import_module(f"app.models.{_modulo.name}")
@@ -0,0 +1,381 @@
+# tests/test_chat.py
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.auth.password_handler import auth_handler
+from app.auth.permissions import permission_registry
+from app.controllers.chat_controller import ChatController
+from app.database import Base, get_async_db
+from app.models.automovil import Automovil
+from app.models.chat import Chat
+from app.models.proceso import Proceso
+from app.models.role import Role
+from app.models.user import EstadoUsuario, User
+from app.routes import chat_routes
+from app.schemas.chat import ChatCreate, ChatFiltros, MensajeChatCreate
+from app.services.presence_service import PresenceTracker
+
+ADMIN, MECANICO, CLIENTE, OTRO_CLIENTE = 1, 2, 3, 4
+USUARIOS = {
+    ADMIN: ("Admin General", "admin@example.com", 1),
+    MECANICO: ("Mario Gómez", "mario@example.com", 2),
+    CLIENTE: ("Ana Pérez", "ana@example.com", 3),
+    OTRO_CLIENTE: ("Luis Díaz", "luis@example.com", 3),
+}
+
+Entorno = namedtuple("Entorno", "client sesion")
+
+
+async def _crear_datos(sesion):
+    """Roles, usuarios y un proceso del cliente sobre su automóvil"""
+    async with sesion() as db:
+        roles = [Role(id=1, nombre="admin"), Role(id=2, nombre="mecanico"), Role(id=3, nombre="cliente")]
+        db.add_all(roles)
+        for usuario_id, (nombre, correo, rol_id) in USUARIOS.items():
+            db.add(User(
+                usuario_id=usuario_id,
+                nombre_completo=nombre,
+                correo=correo,
+                tipo_identificacion="CC",
+                numero_identificacion=f"1000{usuario_id}",
+                password_hash="x",
+                estado=EstadoUsuario.ACTIVO,
+                rol_id=rol_id
+            ))
+        db.add(Automovil(id=1, placa="ABC123", marca="Mazda", modelo="3", año=2020, color="Rojo", propietario_id=CLIENTE))
+        db.add(Proceso(
+            id=1,
+            codigo_proceso="PRO-1",
+            nombre="Mantenimiento",
+            descripcion="Cambio de aceite",
+            fecha_inicio_programada=datetime.now(),
+            automovil_id=1,
+            cliente_id=CLIENTE
+        ))
+        await db.commit()
+        permission_registry.load(roles)
+
+
+@pytest.fixture
+def entorno():
+    """Rutas del chat sobre SQLite en memoria, en un solo event loop"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    sesion = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with sesion() as db:
+            yield db
+
+    async def crear_tablas():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await _crear_datos(sesion)
+
+    app = FastAPI()
+    app.include_router(chat_routes.router)
+    app.dependency_overrides[get_async_db] = get_db
+    with TestClient(app) as client:
+        client.portal.call(crear_tablas)
+        yield Entorno(client, sesion)
+        client.portal.call(engine.dispose)
+
+
+def _en_sesion(entorno, funcion):
+    """Ejecutar funcion(db) en el loop del cliente con una sesión nueva"""
+    async def ejecutar():
+        async with entorno.sesion() as db:
+            return await funcion(db)
+    return entorno.client.portal.call(ejecutar)
+
+
+def _auth(usuario_id: int) -> dict:
+    nombre, correo, rol_id = USUARIOS[usuario_id]
+    rol = {1: "admin", 2: "mecanico", 3: "cliente"}[rol_id]
+    token = auth_handler.create_user_token(usuario_id, correo, rol, permission_registry.permisos_de(rol_id, rol))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _asignar_mecanico(entorno, chat_id):
+    async def asignar(db):
+        await db.execute(update(Chat).where(Chat.id == chat_id).values(mecanico_id=MECANICO))
+        await db.commit()
+    _en_sesion(entorno, asignar)
+
+
+def _crear_chat(entorno, **datos):
+    chat_data = ChatCreate(titulo="Cambio de aceite", proceso_id=1, **datos)
+    return _en_sesion(entorno, lambda db: ChatController.crear_chat(db, chat_data, CLIENTE))
+
+
+def test_listar_chats_con_nombres_de_participantes(entorno):
+    creado = _crear_chat(entorno)
+    assert creado.cliente_nombre == "Ana Pérez"
+    assert creado.cliente_email == "ana@example.com"
+
+    resultado = _en_sesion(entorno, lambda db: ChatController.obtener_chats(db, ChatFiltros(), CLIENTE))
+    assert resultado["total"] == 1
+    chat = resultado["chats"][0]
+    assert chat.cliente_nombre == "Ana Pérez"
+    assert chat.proceso_descripcion == "Cambio de aceite"
+    assert chat.automovil_placa == "ABC123"
+    # El mensaje de bienvenida queda en los contadores
+    assert chat.total_mensajes == 1
+    assert chat.mensajes_no_leidos == 0
+
+    # Otro cliente no ve el chat
+    resultado = _en_sesion(entorno, lambda db: ChatController.obtener_chats(db, ChatFiltros(), OTRO_CLIENTE))
+    assert resultado["total"] == 0
+
+
+def test_enviar_y_responder_mensaje(entorno):
+    chat = _crear_chat(entorno)
+    url = f"/api/v1/chat/{chat.id}/mensajes"
+
+    respuesta = entorno.client.post(url, json={"chat_id": chat.id, "contenido": "¿Cuándo está listo?"}, headers=_auth(CLIENTE))
+    assert respuesta.status_code == 201
+    mensaje = respuesta.json()
+    assert mensaje["remitente_nombre"] == "Ana Pérez"
+    assert mensaje["remitente_email"] == "ana@example.com"
+    assert mensaje["remitente_rol"] == "cliente"
+
+    # La respuesta trae el mensaje al que contesta sin lazy load en la sesión async
+    respuesta = entorno.client.post(
+        url,
+        json={"chat_id": chat.id, "contenido": "Mañana", "respuesta_a": mensaje["id"]},
+        headers=_auth(CLIENTE)
+    )
+    assert respuesta.status_code == 201
+    assert respuesta.json()["mensaje_padre_contenido"] == "¿Cuándo está listo?"
+    assert respuesta.json()["mensaje_padre_remitente"] == "Ana Pérez"
+
+    # Sin acceso al chat
+    respuesta = entorno.client.post(url, json={"chat_id": chat.id, "contenido": "Hola"}, headers=_auth(OTRO_CLIENTE))
+    assert respuesta.status_code == 404
+
+
+def test_enviar_archivo(entorno):
+    chat = _crear_chat(entorno)
+
+    respuesta = entorno.client.post(
+        f"/api/v1/chat/{chat.id}/archivos",
+        files={"file": ("factura.txt", b"total: 120000", "text/plain")},
+        headers=_auth(CLIENTE)
+    )
+    assert respuesta.status_code == 201
+    mensaje = respuesta.json()["mensaje"]
+    assert mensaje["contenido"] == "factura.txt"
+    assert mensaje["remitente_nombre"] == "Ana Pérez"
+    assert mensaje["archivo_url"].startswith(f"/api/v1/chat/files/{chat.id}/")
+
+    # El mismo contenido se reutiliza en el almacén y sigue descargándose
+    respuesta = entorno.client.post(
+        f"/api/v1/chat/{chat.id}/archivos",
+        files={"file": ("copia.txt", b"total: 120000", "text/plain")},
+        headers=_auth(CLIENTE)
+    )
+    assert respuesta.json()["mensaje"]["archivo_url"] == mensaje["archivo_url"]
+    descarga = entorno.client.get(mensaje["archivo_url"], headers=_auth(CLIENTE))
+    assert descarga.status_code == 200 and descarga.content == b"total: 120000"
+
+
+def test_paginar_mensajes_por_cursor(entorno):
+    chat = _crear_chat(entorno)
+    for numero in range(4):
+        mensaje_data = MensajeChatCreate(chat_id=chat.id, contenido=f"Mensaje {numero}")
+        _en_sesion(entorno, lambda db: ChatController.enviar_mensaje(db, mensaje_data, CLIENTE))
+    url = f"/api/v1/chat/{chat.id}/mensajes"
+
+    def pagina(usuario_id=CLIENTE, **params):
+        respuesta = entorno.client.get(url, params={"per_page": 2, **params}, headers=_auth(usuario_id))
+        assert respuesta.status_code == 200
+        datos = respuesta.json()
+        return [m["id"] for m in datos["mensajes"]], datos
+
+    # Sin cursor: los más recientes en orden cronológico (el 1 es la bienvenida)
+    ids, datos = pagina()
+    assert ids == [4, 5] and datos["has_more"] and datos["before_id"] == 4
+
+    ids, datos = pagina(before_id=datos["before_id"])
+    assert ids == [2, 3] and datos["has_more"]
+
+    ids, datos = pagina(before_id=datos["before_id"])
+    assert ids == [1] and not datos["has_more"]
+
+    # Polling desde el último visto
+    ids, datos = pagina(after_id=1)
+    assert ids == [2, 3] and datos["has_more"] and datos["after_id"] == 3
+
+    ids, datos = pagina(after_id=datos["after_id"])
+    assert ids == [4, 5] and not datos["has_more"]
+
+    ids, datos = pagina(after_id=5)
+    assert ids == [] and not datos["has_more"] and datos["after_id"] == 5
+
+    # El administrador ve cualquier chat; otro cliente no
+    ids, _ = pagina(usuario_id=ADMIN)
+    assert ids == [4, 5]
+    assert entorno.client.get(url, headers=_auth(OTRO_CLIENTE)).status_code == 404
+    assert entorno.client.get(url, params={"before_id": 3, "after_id": 1}, headers=_auth(CLIENTE)).status_code == 400
+
+
+def test_rutas_de_chat(entorno):
+    client = entorno.client
+
+    respuesta = client.post("/api/v1/chat/", json={"titulo": "Cambio de aceite", "proceso_id": 1}, headers=_auth(CLIENTE))
+    assert respuesta.status_code == 201
+    chat_id = respuesta.json()["id"]
+    # Solo un chat activo por proceso
+    respuesta = client.post("/api/v1/chat/", json={"titulo": "Otro", "proceso_id": 1}, headers=_auth(CLIENTE))
+    assert respuesta.status_code == 400
+
+    listado = client.get("/api/v1/chat/", headers=_auth(CLIENTE)).json()
+    assert listado["total"] == 1 and listado["chats"][0]["cliente_nombre"] == "Ana Pérez"
+    assert client.get("/api/v1/chat/", headers=_auth(OTRO_CLIENTE)).json()["total"] == 0
+    assert client.get("/api/v1/chat/", headers=_auth(ADMIN)).json()["total"] == 1
+
+    detalle = client.get(f"/api/v1/chat/{chat_id}", headers=_auth(CLIENTE))
+    assert detalle.status_code == 200
+    assert len(detalle.json()["mensajes_recientes"]) == 1
+    assert client.get(f"/api/v1/chat/{chat_id}", headers=_auth(OTRO_CLIENTE)).status_code == 404
+
+    respuesta = client.put(f"/api/v1/chat/{chat_id}", json={"titulo": "Cambio de aceite y filtro"}, headers=_auth(CLIENTE))
+    assert respuesta.status_code == 200 and respuesta.json()["titulo"] == "Cambio de aceite y filtro"
+    assert client.get(f"/api/v1/chat/{chat_id}/participantes", headers=_auth(CLIENTE)).status_code == 200
+    assert client.get(f"/api/v1/chat/{chat_id}/participantes", headers=_auth(OTRO_CLIENTE)).status_code == 404
+
+    estadisticas = client.get("/api/v1/chat/estadisticas/generales", headers=_auth(CLIENTE))
+    assert estadisticas.status_code == 200
+    assert estadisticas.json()["total_chats"] == 1 and estadisticas.json()["total_mensajes"] == 1
+
+    assert client.delete(f"/api/v1/chat/{chat_id}", headers=_auth(OTRO_CLIENTE)).status_code == 404
+    assert client.delete(f"/api/v1/chat/{chat_id}", headers=_auth(CLIENTE)).status_code == 204
+    assert client.get("/api/v1/chat/", params={"activo": True}, headers=_auth(CLIENTE)).json()["total"] == 0
+
+
+def test_actualizar_y_marcar_mensaje(entorno):
+    chat = _crear_chat(entorno)
+    _asignar_mecanico(entorno, chat.id)
+    mensaje = _en_sesion(entorno, lambda db: ChatController.enviar_mensaje(db, MensajeChatCreate(chat_id=chat.id, contenido="Listo mañana"), MECANICO))
+    client = entorno.client
+
+    def no_leidos_cliente():
+        return client.get("/api/v1/chat/", headers=_auth(CLIENTE)).json()["chats"][0]["mensajes_no_leidos"]
+
+    assert no_leidos_cliente() == 1
+
+    # Solo el remitente edita el contenido
+    url = f"/api/v1/chat/mensajes/{mensaje.id}"
+    assert client.put(url, json={"contenido": "Editado"}, headers=_auth(CLIENTE)).status_code == 403
+    respuesta = client.put(url, json={"contenido": "Listo pasado mañana"}, headers=_auth(MECANICO))
+    assert respuesta.status_code == 200 and respuesta.json()["contenido"] == "Listo pasado mañana"
+    assert client.put(url, json={"contenido": "Hola"}, headers=_auth(OTRO_CLIENTE)).status_code == 404
+
+    # El destinatario lo marca como leído una sola vez
+    for _ in range(2):
+        respuesta = client.post(f"{url}/marcar-leido", headers=_auth(CLIENTE))
+        assert respuesta.status_code == 200
+    assert no_leidos_cliente() == 0
+    respuesta = client.get(f"/api/v1/chat/{chat.id}/mensajes", headers=_auth(CLIENTE)).json()
+    assert respuesta["mensajes"][-1]["estado"] == "LEIDO"
+    assert client.post(f"{url}/marcar-leido", headers=_auth(OTRO_CLIENTE)).status_code == 404
+
+
+def test_websocket_de_extremo_a_extremo(entorno):
+    chat = _crear_chat(entorno)
+    client = entorno.client
+    url = f"/api/v1/chat/{chat.id}/ws?token="
+
+    def token(usuario_id):
+        return _auth(usuario_id)["Authorization"].split()[1]
+
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect(url + "no-es-un-token"):
+            pass
+    assert error.value.code == 4001
+
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect(url + token(OTRO_CLIENTE)):
+            pass
+    assert error.value.code == 4003
+
+    with client.websocket_connect(url + token(CLIENTE)) as cliente:
+        usuarios = cliente.receive_json()
+        assert usuarios["tipo"] == "active_users"
+        assert [u["user_id"] for u in usuarios["usuarios"]] == [CLIENTE]
+
+        # El administrador entra a cualquier chat y el cliente se entera
+        with client.websocket_connect(url + token(ADMIN)) as admin:
+            assert admin.receive_json()["tipo"] == "active_users"
+            conectado = cliente.receive_json()
+            assert conectado["tipo"] == "user_connected"
+            assert conectado["user_name"] == "Admin General" and conectado["user_role"] == "admin"
+
+            # Un mensaje por REST llega al resto del chat por el socket
+            respuesta = client.post(
+                f"/api/v1/chat/{chat.id}/mensajes",
+                json={"chat_id": chat.id, "contenido": "¿Hay novedades?"},
+                headers=_auth(CLIENTE)
+            )
+            assert respuesta.status_code == 201
+            nuevo = admin.receive_json()
+            assert nuevo["tipo"] == "nuevo_mensaje"
+            assert nuevo["mensaje"]["contenido"] == "¿Hay novedades?"
+            assert nuevo["mensaje"]["remitente_nombre"] == "Ana Pérez"
+
+            admin.send_json({"tipo": "ping"})
+            assert admin.receive_json()["tipo"] == "pong"
+
+        assert cliente.receive_json()["tipo"] == "user_disconnected"
+
+
+def test_crear_chat_con_mecanico(entorno):
+    respuesta = entorno.client.post(
+        "/api/v1/chat/",
+        json={"titulo": "Cambio de aceite", "proceso_id": 1, "mecanico_id": OTRO_CLIENTE},
+        headers=_auth(CLIENTE)
+    )
+    # Solo roles que atienden procesos pueden ser el mecánico del chat
+    assert respuesta.status_code == 404
+
+    chat = _crear_chat(entorno, mecanico_id=MECANICO)
+    assert chat.mecanico_id == MECANICO
+    assert chat.mecanico_nombre == "Mario Gómez"
+    assert chat.mecanico_email == "mario@example.com"
+
+    respuesta = entorno.client.put(f"/api/v1/chat/{chat.id}", json={"mecanico_id": ADMIN}, headers=_auth(CLIENTE))
+    assert respuesta.status_code == 200 and respuesta.json()["mecanico_nombre"] == "Admin General"
+    assert entorno.client.get("/api/v1/chat/", headers=_auth(ADMIN)).json()["total"] == 1
+
+
+def test_participantes_activos_de_todos_los_workers(entorno):
+    chat = _crear_chat(entorno, mecanico_id=MECANICO)
+    otro_worker = PresenceTracker(flush_interval=60, session_factory=entorno.sesion)
+    este_worker = PresenceTracker(flush_interval=60, session_factory=entorno.sesion)
+    portal = entorno.client.portal
+
+    def activos():
+        return set(_en_sesion(entorno, lambda db: este_worker.active_users(db, chat.id, timedelta(minutes=5))))
+
+    # El mecánico está conectado en otro worker: se ve cuando ese worker persiste
+    otro_worker.connect("sesion-mecanico", MECANICO, chat.id)
+    assert activos() == set()
+    portal.call(otro_worker.flush)
+    assert activos() == {MECANICO}
+
+    # Las sesiones propias se ven al momento, también al cerrarse
+    este_worker.connect("sesion-cliente", CLIENTE, chat.id)
+    portal.call(este_worker.flush)
+    assert activos() == {MECANICO, CLIENTE}
+    este_worker.disconnect("sesion-cliente")
+    assert activos() == {MECANICO}
+
+    otro_worker.disconnect("sesion-mecanico")
+    portal.call(otro_worker.flush)
+    assert activos() == set()
@@ -0,0 +1,95 @@
+# tests/test_file_delivery.py
+import asyncio
+import hashlib
+import os
+
+from app.services.file_delivery import FileDeliveryResponse, cache_control
+
+CONTENIDO = bytes(range(256)) * 40  # 10240 bytes
+
+
+def _entregar(path: str, headers: dict, method: str = "GET"):
+    """Ejecutar la respuesta como ASGI y devolver (estado, cabeceras, cuerpo)"""
+    mensajes = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        mensajes.append(message)
+
+    response = FileDeliveryResponse(path, os.stat(path), headers, cache_control(path), method=method)
+    asyncio.run(response({"type": "http", "method": method, "headers": []}, receive, send))
+    inicio = mensajes[0]
+    cabeceras = {k.decode(): v.decode() for k, v in inicio["headers"]}
+    cuerpo = b"".join(m.get("body", b"") for m in mensajes[1:])
+    return inicio["status"], cabeceras, cuerpo
+
+
+def _archivo(tmp_path, nombre: str = "foto.jpg") -> str:
+    path = tmp_path / nombre
+    path.write_bytes(CONTENIDO)
+    return str(path)
+
+
+def test_archivo_completo_con_etag(tmp_path):
+    status, headers, body = _entregar(_archivo(tmp_path), {})
+    assert status == 200
+    assert body == CONTENIDO
+    assert headers["content-length"] == str(len(CONTENIDO))
+    assert headers["accept-ranges"] == "bytes"
+    assert headers["etag"].startswith('"')
+
+
+def test_if_none_match_responde_304_sin_cuerpo(tmp_path):
+    path = _archivo(tmp_path)
+    _, headers, _ = _entregar(path, {})
+    status, _, body = _entregar(path, {"if-none-match": f'W/{headers["etag"]}'})
+    assert status == 304
+    assert body == b""
+
+
+def test_rango_parcial(tmp_path):
+    status, headers, body = _entregar(_archivo(tmp_path), {"range": "bytes=100-199"})
+    assert status == 206
+    assert body == CONTENIDO[100:200]
+    assert headers["content-range"] == f"bytes 100-199/{len(CONTENIDO)}"
+    assert headers["content-length"] == "100"
+
+
+def test_rango_sufijo_y_abierto(tmp_path):
+    path = _archivo(tmp_path)
+    _, _, body = _entregar(path, {"range": "bytes=-10"})
+    assert body == CONTENIDO[-10:]
+    _, _, body = _entregar(path, {"range": "bytes=10000-"})
+    assert body == CONTENIDO[10000:]
+
+
+def test_rango_fuera_del_archivo_responde_416(tmp_path):
+    status, headers, body = _entregar(_archivo(tmp_path), {"range": f"bytes={len(CONTENIDO)}-"})
+    assert status == 416
+    assert headers["content-range"] == f"bytes */{len(CONTENIDO)}"
+    assert body == b""
+
+
+def test_if_range_con_etag_viejo_envia_el_archivo_completo(tmp_path):
+    status, _, body = _entregar(_archivo(tmp_path), {"range": "bytes=0-9", "if-range": '"otro"'})
+    assert status == 200
+    assert body == CONTENIDO
+
+
+def test_head_no_envia_cuerpo(tmp_path):
+    status, headers, body = _entregar(_archivo(tmp_path), {}, method="HEAD")
+    assert status == 200
+    assert headers["content-length"] == str(len(CONTENIDO))
+    assert body == b""
+
+
+def test_nombre_por_contenido_es_inmutable(tmp_path):
+    sha256 = hashlib.sha256(CONTENIDO).hexdigest()
+    path = _archivo(tmp_path, f"{sha256}.jpg")
+    _, headers, _ = _entregar(path, {})
+    assert headers["etag"] == f'"{sha256}"'
+    assert "immutable" in headers["cache-control"]
+    assert "immutable" not in cache_control(_archivo(tmp_path))
+    assert cache_control(path, privado=True).startswith("private")
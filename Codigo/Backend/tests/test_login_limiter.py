@@ -0,0 +1,78 @@
+# tests/test_login_limiter.py
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.auth.login_limiter import LoginLimiter, MemoryWindowStore
+from app.config import settings
+
+
+def test_bloquea_la_cuenta_tras_los_fallos_permitidos():
+    async def escenario():
+        limiter = LoginLimiter()
+        for _ in range(settings.LOGIN_ACCOUNT_LIMIT):
+            await limiter.check("10.0.0.1", "Ana@Example.com")
+            await limiter.register_failure("ana@example.com")
+        with pytest.raises(HTTPException) as error:
+            await limiter.check("10.0.0.2", "ana@example.com")
+        return error.value
+
+    error = asyncio.run(escenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_login_correcto_reinicia_la_cuenta():
+    async def escenario():
+        limiter = LoginLimiter()
+        for _ in range(settings.LOGIN_ACCOUNT_LIMIT):
+            await limiter.register_failure("ana@example.com")
+        await limiter.register_success("ana@example.com")
+        await limiter.check(None, "ana@example.com")
+
+    asyncio.run(escenario())
+
+
+def test_bloquea_la_ip_con_cualquier_cuenta():
+    async def escenario():
+        limiter = LoginLimiter()
+        for _ in range(settings.LOGIN_IP_LIMIT):
+            await limiter.register_attempt("10.0.0.1")
+        with pytest.raises(HTTPException) as error:
+            await limiter.check("10.0.0.1", "otra@example.com")
+        await limiter.check("10.0.0.2", "otra@example.com")
+        return error.value
+
+    assert asyncio.run(escenario()).status_code == 429
+
+
+def test_intentos_fuera_de_la_ventana_no_cuentan():
+    async def escenario():
+        store = MemoryWindowStore()
+        await store.add("k", 60)
+        store._hits["k"][1][0] = time.time() - 61
+        await store.add("k", 60)
+        return await store.count("k", 60)
+
+    total, _ = asyncio.run(escenario())
+    assert total == 1
+
+
+def test_limpieza_usa_la_ventana_de_cada_clave(monkeypatch):
+    async def escenario():
+        store = MemoryWindowStore()
+        monkeypatch.setattr(MemoryWindowStore, "MAX_KEYS", 2)
+        # Fallo de cuenta de hace dos minutos: vencido para la ventana de IP, no para la de cuenta
+        await store.add("login:account:ana@example.com", 900)
+        store._hits["login:account:ana@example.com"][1][0] = time.time() - 120
+        await store.add("login:ip:10.0.0.1", 60)
+        store._hits["login:ip:10.0.0.1"][1][0] = time.time() - 120
+        # Superar MAX_KEYS dispara la limpieza
+        await store.add("login:ip:10.0.0.2", 60)
+        return store
+
+    store = asyncio.run(escenario())
+    assert "login:account:ana@example.com" in store._hits
+    assert "login:ip:10.0.0.1" not in store._hits
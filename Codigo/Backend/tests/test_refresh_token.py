@@ -0,0 +1,88 @@
+# tests/test_refresh_token.py
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.controllers.auth_controller import AuthController
+from app.database import Base
+from app.models.refresh_token import RefreshToken
+from app.models.role import Role
+from app.models.user import EstadoUsuario, User
+
+
+@asynccontextmanager
+async def _sesion():
+    """Base SQLite en memoria con un usuario"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Role.__table__, User.__table__, RefreshToken.__table__]
+        )
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        db.add(Role(id=3, nombre="cliente"))
+        db.add(User(
+            usuario_id=1,
+            nombre_completo="Ana Pérez",
+            correo="ana@example.com",
+            tipo_identificacion="CC",
+            numero_identificacion="12345678",
+            password_hash="x",
+            estado=EstadoUsuario.ACTIVO,
+            rol_id=3
+        ))
+        await db.commit()
+        yield db
+    await engine.dispose()
+
+
+async def _familia_revocada(db: AsyncSession) -> bool:
+    return all(await db.scalars(select(RefreshToken.revocado)))
+
+
+def test_rotacion_emite_un_token_nuevo():
+    async def escenario():
+        async with _sesion() as db:
+            primero = await AuthController._issue_refresh_token(db, 1)
+            respuesta = await AuthController.refresh_session(db, primero)
+            segundo = await AuthController.refresh_session(db, respuesta.refresh_token)
+            return primero, respuesta, segundo, await _familia_revocada(db)
+
+    primero, respuesta, segundo, revocada = asyncio.run(escenario())
+    assert respuesta.access_token
+    assert respuesta.refresh_token != primero
+    assert segundo.refresh_token not in (primero, respuesta.refresh_token)
+    assert not revocada
+
+
+def test_reutilizar_un_token_revoca_la_familia():
+    async def escenario():
+        async with _sesion() as db:
+            robado = await AuthController._issue_refresh_token(db, 1)
+            legitimo = (await AuthController.refresh_session(db, robado)).refresh_token
+
+            with pytest.raises(HTTPException) as reuso:
+                await AuthController.refresh_session(db, robado)
+            # El token emitido en la rotación también queda invalidado
+            with pytest.raises(HTTPException) as despues:
+                await AuthController.refresh_session(db, legitimo)
+            return reuso.value, despues.value, await _familia_revocada(db)
+
+    reuso, despues, revocada = asyncio.run(escenario())
+    assert reuso.status_code == 401
+    assert despues.status_code == 401
+    assert revocada
+
+
+def test_token_desconocido_es_invalido():
+    async def escenario():
+        async with _sesion() as db:
+            with pytest.raises(HTTPException) as error:
+                await AuthController.refresh_session(db, "no-existe")
+            return error.value
+
+    assert asyncio.run(escenario()).status_code == 401
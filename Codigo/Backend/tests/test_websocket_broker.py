@@ -0,0 +1,88 @@
+# tests/test_websocket_broker.py
+import asyncio
+import json
+
+from app.services.memory_broker import InMemoryBroker
+from app.services.websocket_service import WebSocketManager
+
+
+class FakeWebSocket:
+    """WebSocket mínimo que guarda los mensajes enviados"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+    def tipos(self, tipo: str):
+        return [message for message in self.sent if message.get("tipo") == tipo]
+
+
+async def _dos_instancias():
+    broker = InMemoryBroker()
+    a = WebSocketManager(broker=broker)
+    b = WebSocketManager(broker=broker)
+    await a.initialize()
+    await b.initialize()
+    # Dejar que los listeners se suscriban antes de publicar
+    await asyncio.sleep(0)
+    return a, b
+
+
+def test_broadcast_llega_una_vez_a_cada_instancia():
+    async def escenario():
+        a, b = await _dos_instancias()
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await a.connect(ws_a, 1, 10, {"nombre": "Cliente"})
+        await b.connect(ws_b, 1, 20, {"nombre": "Mecánico"})
+
+        await a.broadcast_to_chat(1, {"tipo": "nuevo_mensaje", "contenido": "hola"})
+        await asyncio.sleep(0.05)
+        await a.shutdown()
+        await b.shutdown()
+        return ws_a, ws_b
+
+    ws_a, ws_b = asyncio.run(escenario())
+    # El evento propio que vuelve por el broker se ignora (origin): sin duplicados
+    assert len(ws_a.tipos("nuevo_mensaje")) == 1
+    assert len(ws_b.tipos("nuevo_mensaje")) == 1
+
+
+def test_broadcast_respeta_exclude_user_en_otra_instancia():
+    async def escenario():
+        a, b = await _dos_instancias()
+        ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+        await a.connect(ws_a, 1, 10, {"nombre": "Cliente"})
+        await b.connect(ws_b, 1, 20, {"nombre": "Mecánico"})
+
+        await a.broadcast_to_chat(1, {"tipo": "nuevo_mensaje"}, exclude_user=20)
+        await asyncio.sleep(0.05)
+        await a.shutdown()
+        await b.shutdown()
+        return ws_a, ws_b
+
+    ws_a, ws_b = asyncio.run(escenario())
+    assert len(ws_a.tipos("nuevo_mensaje")) == 1
+    assert ws_b.tipos("nuevo_mensaje") == []
+
+
+def test_usuarios_conectados_suma_todas_las_instancias():
+    async def escenario():
+        a, b = await _dos_instancias()
+        await a.connect(FakeWebSocket(), 1, 10, {"nombre": "Cliente"})
+        await b.connect(FakeWebSocket(), 1, 20, {"nombre": "Mecánico"})
+        # El mismo usuario en dos instancias cuenta una vez
+        await b.connect(FakeWebSocket(), 2, 10, {"nombre": "Cliente"})
+        total = await a.count_online_users()
+        await a.shutdown()
+        await b.shutdown()
+        return total
+
+    assert asyncio.run(escenario()) == 2